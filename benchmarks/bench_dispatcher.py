@@ -0,0 +1,239 @@
+"""
+Бенчмарк диспетчера: синтетические апдейты через Dispatcher.feed_update без сети.
+
+Роутеры action_handlers и user_handlers подключаются как в main.py, запросы к Bot API
+обрабатывает заглушка сессии с готовыми ответами и настраиваемой задержкой.
+Для каждого сценария выводятся пропускная способность, p50/p99 латентности апдейта,
+число запросов к API на апдейт и память (tracemalloc, отдельный прогон).
+
+Сценарии:
+    start         - /start
+    menu_project  - кнопка "Наш проект"
+    back_to_menu  - кнопка "Назад в меню"
+    registration  - регистрация целиком: кнопка, ФИО, телефон, email (4 апдейта)
+    chat_member   - вступление и выход участника канала
+
+Запуск из корня проекта:
+    python benchmarks/bench_dispatcher.py
+    python benchmarks/bench_dispatcher.py -n 2000 --latency 0.005 --concurrency 50 -s start registration
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# conf читает обязательные переменные при импорте: для бенчмарка хватает заглушек
+for name, value in {
+    'BOT_TOKEN': '42:TEST',
+    'ADMIN_IDS': '1',
+    'GROUP_ID': '-100500',
+    'TIMEZONE': 'Europe/Moscow',
+    'POSTGRES_DB': 'bench',
+    'POSTGRES_USER': 'bench',
+    'POSTGRES_PASSWORD': 'bench',
+    'DB_HOST': 'localhost',
+    'DB_PORT': '5432',
+}.items():
+    os.environ.setdefault(name, value)
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import (CallbackQuery, Chat, ChatMemberLeft, ChatMemberMember, ChatMemberUpdated,
+                           Message, Update, User)
+
+from config_data.conf import conf
+from handlers import action_handlers, user_handlers
+from services.dispatch_index import install_dispatch_index
+from services.fsm_storage import create_storage, setup_storage_batching
+
+BOT_USER = User(id=42, is_bot=True, first_name='Bot', username='clinic_bot')
+CHANNEL = Chat(id=-100777, type='channel', title='Канал')
+
+
+class MockSession(BaseSession):
+    """Сессия без сети: отвечает готовыми объектами через latency секунд"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None) -> Any:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if 'Message' in str(method.__returning__):
+            chat_id = getattr(method, 'chat_id', None) or 1
+            return Message(
+                message_id=self.calls,
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id, type='private' if chat_id > 0 else 'supergroup'),
+                from_user=BOT_USER,
+                text=getattr(method, 'text', None),
+            )
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+
+class UpdateFactory:
+    def __init__(self):
+        self.update_id = 0
+
+    def _next_id(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def message(self, user_id: int, text: str) -> Update:
+        user = User(id=user_id, is_bot=False, first_name='Иван', username=f'user{user_id}')
+        return Update(update_id=self._next_id(), message=Message(
+            message_id=self.update_id,
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=user,
+            text=text,
+        ))
+
+    def callback(self, user_id: int, data: str) -> Update:
+        user = User(id=user_id, is_bot=False, first_name='Иван', username=f'user{user_id}')
+        bot_message = Message(
+            message_id=self.update_id,
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=BOT_USER,
+            text='Главное меню:',
+        )
+        return Update(update_id=self._next_id(), callback_query=CallbackQuery(
+            id=str(self.update_id), from_user=user, chat_instance='bench', data=data, message=bot_message,
+        ))
+
+    def chat_member(self, user_id: int, joined: bool) -> Update:
+        user = User(id=user_id, is_bot=False, first_name='Иван', username=f'user{user_id}')
+        left, member = ChatMemberLeft(user=user), ChatMemberMember(user=user)
+        return Update(update_id=self._next_id(), chat_member=ChatMemberUpdated(
+            chat=CHANNEL,
+            from_user=user,
+            date=datetime.datetime.now(),
+            old_chat_member=left if joined else member,
+            new_chat_member=member if joined else left,
+        ))
+
+
+# Сценарий: по номеру пользователя возвращает апдейты, которые отправляются по порядку
+SCENARIOS: Dict[str, Callable[[UpdateFactory, int], List[Update]]] = {
+    'start': lambda f, uid: [f.message(uid, '/start')],
+    'menu_project': lambda f, uid: [f.callback(uid, 'menu_project')],
+    'back_to_menu': lambda f, uid: [f.callback(uid, 'back_to_menu')],
+    'registration': lambda f, uid: [
+        f.callback(uid, 'menu_registration'),
+        f.message(uid, 'Иванов Иван Иванович'),
+        f.message(uid, '+7 (999) 123-45-67'),
+        f.message(uid, f'user{uid}@example.com'),
+    ],
+    'chat_member': lambda f, uid: [f.chat_member(uid, joined=True), f.chat_member(uid, joined=False)],
+}
+
+
+def build_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=create_storage(conf.redis))
+    setup_storage_batching(dp)
+    dp.include_router(action_handlers.router)
+    dp.include_router(user_handlers.router)
+    if conf.logic.dispatch_index:
+        install_dispatch_index(dp)
+    return dp
+
+
+async def run_user(dp: Dispatcher, bot: Bot, updates: List[Update], latencies: List[float]) -> None:
+    for update in updates:
+        start = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_scenario(dp: Dispatcher, bot: Bot, name: str, iterations: int, concurrency: int,
+                       first_user: int) -> Dict[str, float]:
+    factory = UpdateFactory()
+    # Апдейты готовятся заранее, чтобы не мерить создание pydantic-моделей
+    users = [SCENARIOS[name](factory, first_user + i) for i in range(iterations)]
+    latencies: List[float] = []
+    calls_before = bot.session.calls
+    started = time.perf_counter()
+    for offset in range(0, iterations, concurrency):
+        await asyncio.gather(*(run_user(dp, bot, updates, latencies)
+                               for updates in users[offset:offset + concurrency]))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'updates': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'api_calls': (bot.session.calls - calls_before) / len(latencies),
+    }
+
+
+async def measure_memory(dp: Dispatcher, bot: Bot, name: str, iterations: int, first_user: int) -> Dict[str, float]:
+    factory = UpdateFactory()
+    users = [SCENARIOS[name](factory, first_user + i) for i in range(iterations)]
+    count = sum(len(updates) for updates in users)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for updates in users:
+        await run_user(dp, bot, updates, [])
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_kb': (peak - before) / 1024, 'retained_b': (current - before) / count}
+
+
+async def main(args: argparse.Namespace) -> None:
+    bot = Bot(token=conf.tg_bot.token, session=MockSession(args.latency))
+    dp = build_dispatcher()
+    print(f'Итераций на сценарий: {args.iterations}, параллельно: {args.concurrency}, '
+          f'задержка API: {args.latency * 1000:.1f} мс')
+    print(f'{"Сценарий":<14} {"апдейтов":>9} {"апд/с":>9} {"p50, мс":>9} {"p99, мс":>9} '
+          f'{"API/апд":>8} {"пик, КБ":>9} {"удерж., Б/апд":>14}')
+    first_user = 1000
+    for name in args.scenarios:
+        # Прогрев: ленивые импорты, кеши фильтров и логгеров
+        await run_scenario(dp, bot, name, min(20, args.iterations), 1, first_user)
+        first_user += 1000
+        result = await run_scenario(dp, bot, name, args.iterations, args.concurrency, first_user)
+        first_user += args.iterations
+        memory = await measure_memory(dp, bot, name, min(200, args.iterations), first_user)
+        first_user += args.iterations
+        print(f'{name:<14} {result["updates"]:>9} {result["throughput"]:>9.0f} {result["p50"]:>9.2f} '
+              f'{result["p99"]:>9.2f} {result["api_calls"]:>8.1f} {memory["peak_kb"]:>9.0f} '
+              f'{memory["retained_b"]:>14.0f}')
+    await dp.storage.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--iterations', type=int, default=500, help='пользователей на сценарий')
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='пользователей одновременно')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа API, сек')
+    parser.add_argument('-s', '--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--console-logs', action='store_true',
+                        help='оставить вывод логов в консоль (файлы logs/ пишутся всегда)')
+    args = parser.parse_args()
+    if not args.console_logs:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if type(handler) is logging.StreamHandler:
+                root.removeHandler(handler)
+    asyncio.run(main(args))
@@ -0,0 +1,88 @@
+"""
+Микробенчмарк JSON-кодеков: стандартный json и orjson на данных бота.
+
+- сериализация клавиатур: главное меню (inline) и запрос телефона (reply);
+- разбор ответа getUpdates на 100 апдейтов (/start, кнопки меню, регистрация, chat_member);
+- разбор ответа getUpdates вместе с валидацией в модели aiogram (то, что делает сессия);
+- сборка запроса sendMessage с клавиатурой, собранной в обработчике.
+
+Запуск из корня проекта:
+    python benchmarks/bench_json.py
+"""
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import GetUpdates, SendMessage
+from aiogram.types import (CallbackQuery, Chat, ChatMemberLeft, ChatMemberMember, ChatMemberUpdated, Message,
+                           Update, User)
+
+from keyboards.keyboards import get_main_menu_kb, get_phone_kb
+from keyboards.screens import _strip_none, screens
+from services.json_codec import ORJSON_CODEC, STDLIB_CODEC
+
+NUMBER = 2000
+
+
+def build_updates_response() -> str:
+    user = User(id=123456789, is_bot=False, first_name='Иван', last_name='Петров', username='ivan_petrov')
+    chat = Chat(id=123456789, type='private', first_name='Иван', username='ivan_petrov')
+    channel = Chat(id=-1001234567890, type='channel', title='Клиника')
+    now = datetime.datetime(2026, 3, 14, 12, 0)
+    bot_message = Message(message_id=10, date=now, chat=chat, text=screens.main_menu.text,
+                          reply_markup=screens.main_menu.reply_markup)
+    updates = []
+    for i in range(25):
+        updates.append(Update(update_id=4 * i, message=Message(
+            message_id=4 * i, date=now, chat=chat, from_user=user, text='/start')))
+        updates.append(Update(update_id=4 * i + 1, callback_query=CallbackQuery(
+            id=str(i), from_user=user, chat_instance='1', data='menu_project', message=bot_message)))
+        updates.append(Update(update_id=4 * i + 2, message=Message(
+            message_id=4 * i + 2, date=now, chat=chat, from_user=user, text='Петров Иван Сергеевич')))
+        updates.append(Update(update_id=4 * i + 3, chat_member=ChatMemberUpdated(
+            chat=channel, from_user=user, date=now,
+            old_chat_member=ChatMemberLeft(user=user), new_chat_member=ChatMemberMember(user=user))))
+    result = [_strip_none(update.model_dump(mode='json', by_alias=True, exclude_unset=True)) for update in updates]
+    return STDLIB_CODEC.dumps({'ok': True, 'result': result}, ensure_ascii=False)
+
+
+def run(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    per_call = seconds / number * 1e6
+    print(f'{name:<58} {per_call:9.1f} мкс/вызов')
+    return per_call
+
+
+if __name__ == '__main__':
+    if ORJSON_CODEC is None:
+        print('orjson не установлен: сравнивать не с чем (pip install orjson)')
+        sys.exit(1)
+
+    bot = Bot(token='42:TEST')
+    main_menu = _strip_none(get_main_menu_kb().model_dump())
+    phone_kb = _strip_none(get_phone_kb().model_dump())
+    updates_response = build_updates_response()
+    get_updates = GetUpdates()
+
+    send_message = SendMessage(chat_id=1, text='Главное меню:', reply_markup=get_main_menu_kb())
+
+    print(f'Лучший из 5 повторов; ответ getUpdates: {len(updates_response)} символов, 100 апдейтов')
+    sessions = {codec: AiohttpSession(json_loads=codec.loads, json_dumps=codec.dumps)
+                for codec in (STDLIB_CODEC, ORJSON_CODEC)}
+    for title, number, make_func in (
+        ('dumps: главное меню', NUMBER, lambda codec: lambda: codec.dumps(main_menu)),
+        ('dumps: клавиатура телефона', NUMBER, lambda codec: lambda: codec.dumps(phone_kb)),
+        ('loads: getUpdates', NUMBER // 10, lambda codec: lambda: codec.loads(updates_response)),
+        ('loads + модели aiogram: getUpdates', NUMBER // 10,
+         lambda codec: lambda: sessions[codec].check_response(bot, get_updates, 200, updates_response)),
+        ('запрос sendMessage с клавиатурой из обработчика', NUMBER // 10,
+         lambda codec: lambda: sessions[codec].build_form_data(bot, send_message)),
+    ):
+        before = run(f'{title} [json]', make_func(STDLIB_CODEC), number)
+        after = run(f'{title} [orjson]', make_func(ORJSON_CODEC), number)
+        print(f'{"":<58} x{before / after:.1f}')
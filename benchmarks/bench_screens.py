@@ -0,0 +1,65 @@
+"""
+Микробенчмарк: стоимость подготовки экрана на один апдейт.
+
+До: сборка клавиатуры через InlineKeyboardBuilder + model_dump/json.dumps в сессии.
+После: готовый экран из реестра + сериализованный заранее JSON клавиатуры.
+
+Запуск из корня проекта:
+    python benchmarks/bench_screens.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+from aiogram.methods import SendMessage
+
+from data.project_data import WELCOME_MESSAGE
+from keyboards.keyboards import get_main_menu_kb
+from keyboards.screens import screens
+from services.bot_session import ClinicSession
+
+NUMBER = 5000
+
+bot = Bot(token='42:TEST')
+plain_session = AiohttpSession()
+clinic_session = ClinicSession()
+
+
+def before():
+    method = SendMessage(chat_id=1, text=WELCOME_MESSAGE, reply_markup=get_main_menu_kb(), parse_mode=ParseMode.HTML)
+    plain_session.build_form_data(bot, method)
+
+
+def after():
+    method = SendMessage(chat_id=1, **screens.main_menu.as_kwargs())
+    clinic_session.build_form_data(bot, method)
+
+
+def build_only_before():
+    get_main_menu_kb()
+
+
+def build_only_after():
+    screens.main_menu.as_kwargs()
+
+
+def run(name, func):
+    seconds = min(timeit.repeat(func, number=NUMBER, repeat=5))
+    per_call = seconds / NUMBER * 1e6
+    print(f'{name:<45} {per_call:8.1f} мкс/вызов')
+    return per_call
+
+
+if __name__ == '__main__':
+    print(f'Главное меню, {NUMBER} вызовов, лучший из 5 повторов')
+    b = run('Клавиатура: InlineKeyboardBuilder', build_only_before)
+    a = run('Клавиатура: реестр экранов', build_only_after)
+    print(f'{"":<45} x{b / a:.0f}')
+    b = run('Клавиатура + запрос: до', before)
+    a = run('Клавиатура + запрос: после', after)
+    print(f'{"":<45} x{b / a:.1f}')
@@ -0,0 +1,74 @@
+"""
+Время импорта main.py по пакетам (python -X importtime в отдельном процессе).
+
+Собственное время модулей суммируется по пакету верхнего уровня (aiogram, pydantic, handlers, ...),
+поэтому видно, какие зависимости занимают запуск. Модули проекта выводятся отдельно.
+Сеть и .env не нужны: обязательные переменные окружения подставляются заглушками.
+
+Запуск из корня проекта:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --top 30 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_PACKAGES = {'main', 'config_data', 'database', 'handlers', 'keyboards', 'middlewares', 'services', 'data'}
+STUB_ENV = {
+    'BOT_TOKEN': '42:TEST',
+    'ADMIN_IDS': '1',
+    'GROUP_ID': '-100500',
+    'TIMEZONE': 'Europe/Moscow',
+    'POSTGRES_DB': 'bench',
+    'POSTGRES_USER': 'bench',
+    'POSTGRES_PASSWORD': 'bench',
+    'DB_HOST': 'localhost',
+    'DB_PORT': '5432',
+}
+
+
+def import_times() -> Tuple[int, Dict[str, int], Dict[str, int]]:
+    """Общее время импорта main и собственное время по пакетам и по модулям проекта, мкс"""
+    env = {**STUB_ENV, **os.environ}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    packages: Dict[str, int] = defaultdict(int)
+    project: Dict[str, int] = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        module = name.strip()
+        package = module.split('.')[0]
+        packages[package] += int(self_us)
+        if package in PROJECT_PACKAGES:
+            project[module] = int(self_us)
+        if module == 'main':
+            total = int(cumulative_us)
+    return total, packages, project
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15, help='сколько пакетов выводить')
+    parser.add_argument('--repeat', type=int, default=3, help='запусков (берется медиана)')
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.repeat)]
+    total = statistics.median(run[0] for run in runs)
+    packages = {name: statistics.median(run[1].get(name, 0) for run in runs) for name in runs[0][1]}
+    project = {name: statistics.median(run[2].get(name, 0) for run in runs) for name in runs[0][2]}
+
+    print(f'Импорт main: {total / 1e6:.2f} с (медиана {args.repeat} запусков)')
+    print(f'\n{"Пакет":<30} {"мс":>8} {"доля":>6}')
+    for name, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'{name:<30} {self_us / 1000:>8.1f} {self_us / total:>6.1%}')
+    print(f'\n{"Модуль проекта":<30} {"мс":>8}')
+    for name, self_us in sorted(project.items(), key=lambda item: item[1], reverse=True):
+        print(f'{name:<30} {self_us / 1000:>8.1f}')
@@ -1,5 +1,6 @@
 import logging.config
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict
 
 import pytz
 import structlog
@@ -8,9 +9,15 @@ from pathlib import Path
 
 from structlog.contextvars import merge_contextvars
 
+from config_data.log_control import LogSampler
+from config_data.log_queue import log_queue
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 LOG_PATH = BASE_DIR / 'logs'
 
+# Доли выборки и окно склейки задаются в setup_logging из LOG_SAMPLE_RATES и LOG_DEDUP_WINDOW
+log_sampler = LogSampler()
+
 timestamper = structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S", utc=False)
 pre_chain = [
     structlog.stdlib.add_log_level,
@@ -66,49 +73,47 @@ handlers = {
 }
 
 loggers = {"": {"handlers": ["console", "file", "file_color", "file_json"],
-                "level": f"DEBUG",
+                "level": "DEBUG",  # Заменяется на LOG_LEVEL в setup_logging
                 "propagate": False,
                 },
            }
 
-logging.config.dictConfig(
-    {
-        "version": 1,
-        "disable_existing_loggers": True,
-        "formatters": {
-            "plain": {
-                "()": structlog.stdlib.ProcessorFormatter,
-                "processors": [
-                    structlog.stdlib.ProcessorFormatter.remove_processors_meta,
-                    # structlog.dev.ConsoleRenderer(colors=False),
-                    structlog.dev.ConsoleRenderer(colors=False)
-                ],
-                "foreign_pre_chain": pre_chain,
-            },
-            "plain_json": {
-                "()": structlog.stdlib.ProcessorFormatter,
-                "processors": [
-                    structlog.stdlib.ProcessorFormatter.remove_processors_meta,
-                    # structlog.dev.ConsoleRenderer(colors=False),
-                    structlog.processors.JSONRenderer(ensure_ascii=False)
-                ],
-                "foreign_pre_chain": pre_chain,
-            },
-            "colored": {
-                "()": structlog.stdlib.ProcessorFormatter,
-                "processors": [
-                    extract_from_record,
-                    structlog.stdlib.ProcessorFormatter.remove_processors_meta,
-                    structlog.dev.ConsoleRenderer(colors=True),
-                ],
-                "foreign_pre_chain": pre_chain,
-            },
+LOGGING_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": True,
+    "formatters": {
+        "plain": {
+            "()": structlog.stdlib.ProcessorFormatter,
+            "processors": [
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                # structlog.dev.ConsoleRenderer(colors=False),
+                structlog.dev.ConsoleRenderer(colors=False)
+            ],
+            "foreign_pre_chain": pre_chain,
+        },
+        "plain_json": {
+            "()": structlog.stdlib.ProcessorFormatter,
+            "processors": [
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                # structlog.dev.ConsoleRenderer(colors=False),
+                structlog.processors.JSONRenderer(ensure_ascii=False)
+            ],
+            "foreign_pre_chain": pre_chain,
+        },
+        "colored": {
+            "()": structlog.stdlib.ProcessorFormatter,
+            "processors": [
+                extract_from_record,
+                structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                structlog.dev.ConsoleRenderer(colors=True),
+            ],
+            "foreign_pre_chain": pre_chain,
         },
-        "handlers": handlers,
-        "loggers": loggers,
+    },
+    "handlers": handlers,
+    "loggers": loggers,
 
-    }
-)
+}
 
 
 def add_phone_name(a, b, event_dict):
@@ -126,51 +131,83 @@ def filter_f(_, __, event_dict):
     return event_dict
 
 
-structlog.configure(
-    processors=[
-        merge_contextvars,
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        # structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        # structlog.processors.TimeStamper(fmt="iso"),
-        # If the "stack_info" key in the event dict is true, remove it and
-        # render the current stack trace in the "stack" key.
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        # If some value is in bytes, decode it to a Unicode str.
-        # structlog.processors.UnicodeDecoder(encoding='utf-8'),
-        # structlog.processors.UnicodeEncoder(encoding='utf-8'),
-        # Add callsite parameters.
-        filter_f,
-        structlog.processors.CallsiteParameterAdder(
-            {
-                structlog.processors.CallsiteParameter.FILENAME,
-                structlog.processors.CallsiteParameter.FUNC_NAME,
-                structlog.processors.CallsiteParameter.LINENO,
-                # structlog.processors.CallsiteParameter.PATHNAME ,
-                # structlog.processors.CallsiteParameter.MODULE,
-                # structlog.processors.CallsiteParameter.PROCESS,
-                # structlog.processors.CallsiteParameter.PROCESS_NAME,
-                # structlog.processors.CallsiteParameter.THREAD,
-                # structlog.processors.CallsiteParameter.THREAD_NAME
-            }
-        ),
-        # structlog.processors.JSONRenderer(),
-        structlog.stdlib.ExtraAdder(),
-        add_phone_name,
-        structlog.dev.ConsoleRenderer(colors=False),
-        # structlog.processors.JSONRenderer()
-    ],
-    wrapper_class=structlog.stdlib.BoundLogger,
-    # wrapper_class=AsyncBoundLogger,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    cache_logger_on_first_use=True,
-)
+_logging_ready = False
+
+
+def setup_logging() -> None:
+    """Настраивает logging и structlog. Вызывается один раз, при первом обращении к conf"""
+    global _logging_ready
+    if _logging_ready:
+        return
+    _logging_ready = True
+    log_env: Env = Env()
+    log_env.read_env('.env')
+    log_queue_enabled = log_env.bool('LOG_QUEUE', default=False)  # Писать логи в фоновом потоке через очередь
+    log_queue_size = log_env.int('LOG_QUEUE_SIZE', default=10000)  # Размер очереди логов
+    log_queue_policy = log_env('LOG_QUEUE_POLICY', default='drop')  # drop - отбрасывать, block - ждать
+    log_level = log_env('LOG_LEVEL', default='DEBUG').upper()  # Минимальный уровень логов
+    # Доля записываемых событий ниже WARNING по имени логгера: handlers=0.1,aiogram.event=0.05
+    sample_rates = log_env.dict('LOG_SAMPLE_RATES', subcast_values=float, default={})
+    dedup_window = log_env.float('LOG_DEDUP_WINDOW', default=60)  # Окно склейки одинаковых WARNING+, 0 - выкл.
+    log_sampler.configure(sample_rates, dedup_window)
+
+    LOGGING_CONFIG['loggers']['']['level'] = log_level
+    logging.config.dictConfig(LOGGING_CONFIG)
+    if log_queue_enabled:
+        log_queue.install(logging.getLogger(), maxsize=log_queue_size, policy=log_queue_policy)
+    # После установки очереди, чтобы лишние записи сторонних библиотек не попадали в очередь
+    log_sampler.attach(logging.getLogger())
+    # После очереди: при выходе повторы дописываются до ее остановки (atexit в обратном порядке)
+    log_sampler.start_flusher()
+
+    structlog.configure(
+        processors=[
+            merge_contextvars,
+            structlog.stdlib.filter_by_level,
+            structlog.stdlib.add_logger_name,
+            # Выборка и склейка повторов до подстановки аргументов: отброшенные события не форматируются
+            log_sampler.processor,
+            # structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            # structlog.processors.TimeStamper(fmt="iso"),
+            # If the "stack_info" key in the event dict is true, remove it and
+            # render the current stack trace in the "stack" key.
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            # If some value is in bytes, decode it to a Unicode str.
+            # structlog.processors.UnicodeDecoder(encoding='utf-8'),
+            # structlog.processors.UnicodeEncoder(encoding='utf-8'),
+            # Add callsite parameters.
+            filter_f,
+            structlog.processors.CallsiteParameterAdder(
+                {
+                    structlog.processors.CallsiteParameter.FILENAME,
+                    structlog.processors.CallsiteParameter.FUNC_NAME,
+                    structlog.processors.CallsiteParameter.LINENO,
+                    # structlog.processors.CallsiteParameter.PATHNAME ,
+                    # structlog.processors.CallsiteParameter.MODULE,
+                    # structlog.processors.CallsiteParameter.PROCESS,
+                    # structlog.processors.CallsiteParameter.PROCESS_NAME,
+                    # structlog.processors.CallsiteParameter.THREAD,
+                    # structlog.processors.CallsiteParameter.THREAD_NAME
+                }
+            ),
+            # structlog.processors.JSONRenderer(),
+            structlog.stdlib.ExtraAdder(),
+            add_phone_name,
+            structlog.stdlib.add_log_level,
+            timestamper,
+            # Рендеринг (консоль, файлы, JSON) выполняют ProcessorFormatter обработчиков,
+            # с LOG_QUEUE - в фоновом потоке очереди логов, а не в цикле событий
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        wrapper_class=structlog.stdlib.BoundLogger,
+        # wrapper_class=AsyncBoundLogger,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        cache_logger_on_first_use=True,
+    )
 
 logger: structlog.stdlib.BoundLogger = structlog.get_logger('file')
-logger.debug('Логгер debug')
-logger.info('Логгер OK')
 
 @dataclass
 class PostgresConfig:
@@ -179,6 +216,16 @@ class PostgresConfig:
     db_port: str  # URL-адрес базы данных
     db_user: str  # Username пользователя базы данных
     db_password: str  # Пароль к базе данных
+    use_db: bool = False  # Сохранять регистрации в БД (DB_ENABLED)
+    pool_size: int = 5  # Постоянных соединений в пуле
+    max_overflow: int = 5  # Дополнительных соединений сверх pool_size
+    pool_timeout: int = 30  # Ожидание свободного соединения, сек
+    batch_size: int = 100  # Максимум регистраций в одном INSERT
+    flush_interval: float = 1.0  # Максимальная задержка записи пачки, сек
+
+    @property
+    def async_db_url(self) -> str:
+        return f"postgresql+asyncpg://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.database}"
 
 
 @dataclass
@@ -187,6 +234,15 @@ class RedisConfig:
     redis_host: str  # URL-адрес базы данных
     REDIS_PORT: str  # URL-адрес базы данных
     REDIS_PASSWORD: str
+    use_redis: bool = False  # Хранить FSM в Redis (FSM_STORAGE=redis) вместо памяти процесса
+    prefix: str = 'fsm'  # Префикс ключей FSM
+    state_ttl: int = 0  # TTL ключа состояния, сек (0 - без TTL)
+    data_ttl: int = 0  # TTL ключа данных, сек (0 - без TTL)
+
+    @property
+    def url(self) -> str:
+        password = f":{self.REDIS_PASSWORD}@" if self.REDIS_PASSWORD else ''
+        return f"redis://{password}{self.redis_host}:{self.REDIS_PORT}/{self.redis_db_num}"
 
 
 @dataclass
@@ -197,17 +253,138 @@ class TgBot:
     TIMEZONE: pytz.timezone
     GROUP_ID: int  # ID канала для уведомлений о заявках
     price_file_id: str = None  # File ID прайса для отправки по ID
+    api_base_url: str = ''  # Адрес Bot API (пусто - api.telegram.org), например эмулятор tools/bot_api_emulator.py
+
+
+@dataclass
+class WebhookConfig:
+    use_webhook: bool  # Режим получения апдейтов: webhook (True) или polling (False)
+    base_url: str  # Внешний адрес бота, например https://bot.example.com
+    path: str  # Путь обработчика вебхука
+    secret: str  # Секретный токен для заголовка X-Telegram-Bot-Api-Secret-Token
+    host: str  # Адрес, на котором слушает встроенный web-сервер
+    port: int  # Порт встроенного web-сервера
+    max_connections: int  # Максимум одновременных соединений Telegram к вебхуку (1-100)
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url.rstrip('/')}{self.path}"
+
+
+@dataclass
+class SessionConfig:
+    pool_limit: int = 100  # Всего одновременных соединений к Bot API
+    pool_limit_per_host: int = 0  # Соединений к одному хосту (0 - без отдельного лимита)
+    keepalive_timeout: float = 30  # Сколько держать простаивающее соединение открытым, сек
+    dns_cache_ttl: int = 3600  # Время жизни кеша DNS, сек
+    timeout: float = 60  # Таймаут запроса по умолчанию, сек
+    method_timeouts: Dict[str, float] = field(default_factory=dict)  # Таймауты по методам: sendVideo=120
+    json_codec: str = 'auto'  # JSON для Bot API, апдейтов и FSM: auto (orjson, если установлен), orjson, json
+
+
+@dataclass
+class RateLimitConfig:
+    enabled: bool  # Ограничивать частоту исходящих запросов к Telegram
+    global_rate: float  # Сообщений в секунду на всего бота
+    private_rate: float  # Сообщений в секунду в один личный чат
+    private_burst: int  # Сколько сообщений подряд можно отправить в личный чат без ожидания
+    group_per_minute: float  # Сообщений в минуту в группу/канал
+    group_burst: int  # Сколько сообщений подряд можно отправить в группу без ожидания
+    max_retries: int  # Повторов после ответа 429 (retry_after)
+
+
+@dataclass
+class DigestConfig:
+    window: float  # Сколько секунд копить регистрации перед отправкой сводки в канал
+    max_items: int  # Отправить сводку сразу, если накопилось столько регистраций
+    csv_threshold: int  # С какого размера пачки отправлять CSV-файл вместо текста
+
+
+@dataclass
+class OutboxConfig:
+    enabled: bool = True  # Сначала сохранять регистрацию на диск, затем отправлять в канал (services/outbox.py)
+    path: str = 'data/outbox.sqlite3'  # Файл SQLite с неотправленными регистрациями
+    retry_delay: float = 10  # Первая пауза перед повтором отправки, дальше удваивается, сек
+    max_retry_delay: float = 600  # Максимальная пауза между повторами, сек
+    keep_days: float = 30  # Сколько дней хранить отправленные записи (0 - всегда)
+    max_attempts: int = 30  # После стольких неудачных попыток запись больше не отправляется
+
+
+@dataclass
+class JournalConfig:
+    enabled: bool = True  # Дописывать регистрации в локальный журнал для выгрузки /export
+    path: str = 'data/registrations.jsonl'  # Файл журнала, рядом индекс по дням (.idx)
+    check_duplicates: bool = True  # Искать прошлую регистрацию по телефону и email, предлагать обновить данные
+    duplicate_refresh_interval: float = 2.0  # Как часто дочитывать журналы других процессов, сек
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool  # Собирать метрики и отдавать их по HTTP в формате Prometheus
+    host: str  # Адрес HTTP-сервера метрик (по умолчанию только локально)
+    port: int  # Порт HTTP-сервера метрик
+    path: str  # Путь, по которому отдаются метрики
+
+
+@dataclass
+class SchedulerConfig:
+    enabled: bool = True  # Апдейты одного чата по порядку, разных чатов - параллельно (services/update_scheduler.py)
+    shards: int = 16  # Шардов (воркеров): сколько апдейтов разных чатов обрабатывается одновременно
+    queue_size: int = 100  # Очередь одного шарда; при переполнении прием апдейтов ждет
+
+
+@dataclass
+class WorkersConfig:
+    processes: int = 0  # Процессов-обработчиков апдейтов (0 - все в одном процессе, services/worker_pool.py)
+    queue: str = 'local'  # Очередь между приемом и воркерами: local (multiprocessing) или redis
+    queue_size: int = 1000  # Размер локальной очереди одного воркера
+    prefix: str = 'clinic_updates'  # Префикс списков Redis
+    report_interval: float = 60  # Как часто писать в лог пропускную способность воркеров, сек
+
+
+@dataclass
+class CatchUpConfig:
+    enabled: bool = True  # При старте обработать апдейты, накопившиеся за время простоя, а не сбрасывать их
+    callback_ttl: float = 30  # Нажатия кнопок старше стольких секунд пропускаются: ответить на них уже нельзя
+
+
+@dataclass
+class ThrottleConfig:
+    enabled: bool = True  # Отбрасывать повторные и слишком частые нажатия inline-кнопок
+    rate: float = 1.0  # Нажатий в секунду на пользователя
+    burst: int = 5  # Сколько нажатий подряд можно сделать без ожидания
+    cooldowns: Dict[str, float] = field(default_factory=dict)  # Пауза после кнопки, сек: project_archive=30
+    duplicate_window: float = 2.0  # Повтор той же кнопки столько секунд после завершения - дубликат, сек
+    cache_ttl: float = 600  # Сколько помнить пользователя после последнего нажатия, сек
+    cache_size: int = 10000  # Максимум запомненных пользователей и нажатий
 
 
 @dataclass
 class Logic:
-    pass
+    media_validate_interval: float = 21600  # Период фоновой проверки file_id каталога видео, сек (0 - выключено)
+    media_reload_interval: float = 5  # Период проверки изменений каталога видео другими процессами, сек (0 - выкл.)
+    dispatch_index: bool = True  # Искать обработчики кнопок и состояний FSM по словарю (services/dispatch_index.py)
+    message_cache: bool = True  # Помнить последнее сообщение бота в чате (middlewares/message_cache.py)
+    message_cache_size: int = 10000  # Максимум чатов в кэше сообщений
+    content_reload_interval: float = 5  # Период проверки изменений data/content.json, сек (0 - только при старте)
 
 
 @dataclass
 class Config:
     tg_bot: TgBot
     db: PostgresConfig
+    redis: RedisConfig
+    webhook: WebhookConfig
+    session: SessionConfig
+    rate_limit: RateLimitConfig
+    digest: DigestConfig
+    outbox: OutboxConfig
+    journal: JournalConfig
+    metrics: MetricsConfig
+    scheduler: SchedulerConfig
+    workers: WorkersConfig
+    catch_up: CatchUpConfig
+    throttle: ThrottleConfig
     logic: Logic
 
 
@@ -220,6 +397,7 @@ def load_config(path) -> Config:
                                TIMEZONE=pytz.timezone(env('TIMEZONE')),
                                GROUP_ID=int(env('GROUP_ID')),
                                price_file_id=env('PRICE_FILE_ID', default=None),
+                               api_base_url=env('TELEGRAM_API_URL', default=''),
                                ),
                   db=PostgresConfig(
                       database=env('POSTGRES_DB'),
@@ -227,14 +405,122 @@ def load_config(path) -> Config:
                       db_port=env('DB_PORT'),
                       db_user=env('POSTGRES_USER'),
                       db_password=env('POSTGRES_PASSWORD'),
+                      use_db=env.bool('DB_ENABLED', default=False),
+                      pool_size=env.int('DB_POOL_SIZE', default=5),
+                      max_overflow=env.int('DB_MAX_OVERFLOW', default=5),
+                      pool_timeout=env.int('DB_POOL_TIMEOUT', default=30),
+                      batch_size=env.int('DB_BATCH_SIZE', default=100),
+                      flush_interval=env.float('DB_FLUSH_INTERVAL', default=1.0),
+                      ),
+                  redis=RedisConfig(
+                      redis_db_num=env('REDIS_DB', default='0'),
+                      redis_host=env('REDIS_HOST', default='localhost'),
+                      REDIS_PORT=env('REDIS_PORT', default='6379'),
+                      REDIS_PASSWORD=env('REDIS_PASSWORD', default=''),
+                      use_redis=env('FSM_STORAGE', default='memory').lower() == 'redis',
+                      prefix=env('REDIS_PREFIX', default='clinic_fsm'),
+                      state_ttl=env.int('FSM_STATE_TTL', default=86400),
+                      data_ttl=env.int('FSM_DATA_TTL', default=86400),
+                      ),
+                  webhook=WebhookConfig(
+                      use_webhook=env('BOT_MODE', default='polling').lower() == 'webhook',
+                      base_url=env('WEBHOOK_BASE_URL', default=''),
+                      path=env('WEBHOOK_PATH', default='/webhook'),
+                      secret=env('WEBHOOK_SECRET', default=''),
+                      host=env('WEBAPP_HOST', default='0.0.0.0'),
+                      port=env.int('WEBAPP_PORT', default=8080),
+                      max_connections=env.int('WEBHOOK_MAX_CONNECTIONS', default=40),
+                      ),
+                  session=SessionConfig(
+                      pool_limit=env.int('TG_POOL_LIMIT', default=100),
+                      pool_limit_per_host=env.int('TG_POOL_LIMIT_PER_HOST', default=0),
+                      keepalive_timeout=env.float('TG_KEEPALIVE_TIMEOUT', default=30),
+                      dns_cache_ttl=env.int('TG_DNS_CACHE_TTL', default=3600),
+                      timeout=env.float('TG_TIMEOUT', default=60),
+                      method_timeouts=env.dict('TG_METHOD_TIMEOUTS', subcast_values=float,
+                                               default={'sendVideo': 120, 'sendDocument': 120}),
+                      json_codec=env('JSON_CODEC', default='auto'),
+                      ),
+                  rate_limit=RateLimitConfig(
+                      enabled=env.bool('TG_RATE_LIMIT', default=True),
+                      global_rate=env.float('TG_GLOBAL_RATE', default=30),
+                      private_rate=env.float('TG_PRIVATE_RATE', default=1),
+                      private_burst=env.int('TG_PRIVATE_BURST', default=3),
+                      group_per_minute=env.float('TG_GROUP_PER_MINUTE', default=20),
+                      group_burst=env.int('TG_GROUP_BURST', default=3),
+                      max_retries=env.int('TG_MAX_RETRIES', default=3),
+                      ),
+                  digest=DigestConfig(
+                      window=env.float('DIGEST_WINDOW', default=5),
+                      max_items=env.int('DIGEST_MAX_ITEMS', default=20),
+                      csv_threshold=env.int('DIGEST_CSV_THRESHOLD', default=50),
+                      ),
+                  outbox=OutboxConfig(
+                      enabled=env.bool('REGISTRATION_OUTBOX', default=True),
+                      path=env('OUTBOX_PATH', default='data/outbox.sqlite3'),
+                      retry_delay=env.float('OUTBOX_RETRY_DELAY', default=10),
+                      max_retry_delay=env.float('OUTBOX_MAX_RETRY_DELAY', default=600),
+                      keep_days=env.float('OUTBOX_KEEP_DAYS', default=30),
+                      max_attempts=env.int('OUTBOX_MAX_ATTEMPTS', default=30),
+                      ),
+                  journal=JournalConfig(
+                      enabled=env.bool('REGISTRATION_JOURNAL', default=True),
+                      path=env('JOURNAL_PATH', default='data/registrations.jsonl'),
+                      check_duplicates=env.bool('DUPLICATE_CHECK', default=True),
+                      duplicate_refresh_interval=env.float('DUPLICATE_REFRESH_INTERVAL', default=2.0),
+                      ),
+                  metrics=MetricsConfig(
+                      enabled=env.bool('METRICS_ENABLED', default=False),
+                      host=env('METRICS_HOST', default='127.0.0.1'),
+                      port=env.int('METRICS_PORT', default=9100),
+                      path=env('METRICS_PATH', default='/metrics'),
+                      ),
+                  scheduler=SchedulerConfig(
+                      enabled=env.bool('UPDATE_SCHEDULER', default=True),
+                      shards=env.int('UPDATE_SHARDS', default=16),
+                      queue_size=env.int('UPDATE_QUEUE_SIZE', default=100),
+                      ),
+                  workers=WorkersConfig(
+                      processes=env.int('BOT_WORKERS', default=0),
+                      queue=env('WORKER_QUEUE', default='local').lower(),
+                      queue_size=env.int('WORKER_QUEUE_SIZE', default=1000),
+                      prefix=env('WORKER_QUEUE_PREFIX', default='clinic_updates'),
+                      report_interval=env.float('WORKER_REPORT_INTERVAL', default=60),
+                      ),
+                  catch_up=CatchUpConfig(
+                      enabled=env.bool('CATCH_UP', default=True),
+                      callback_ttl=env.float('CATCH_UP_CALLBACK_TTL', default=30),
+                      ),
+                  throttle=ThrottleConfig(
+                      enabled=env.bool('CALLBACK_THROTTLE', default=True),
+                      rate=env.float('CALLBACK_RATE', default=1.0),
+                      burst=env.int('CALLBACK_BURST', default=5),
+                      cooldowns=env.dict('CALLBACK_COOLDOWNS', subcast_values=float,
+                                         default={'project_archive': 30, 'project_reviews': 30}),
+                      duplicate_window=env.float('CALLBACK_DUPLICATE_WINDOW', default=2.0),
+                      cache_ttl=env.float('CALLBACK_CACHE_TTL', default=600),
+                      cache_size=env.int('CALLBACK_CACHE_SIZE', default=10000),
+                      ),
+                  logic=Logic(
+                      media_validate_interval=env.float('MEDIA_VALIDATE_INTERVAL', default=21600),
+                      media_reload_interval=env.float('MEDIA_RELOAD_INTERVAL', default=5),
+                      dispatch_index=env.bool('DISPATCH_INDEX', default=True),
+                      message_cache=env.bool('MESSAGE_CACHE', default=True),
+                      message_cache_size=env.int('MESSAGE_CACHE_SIZE', default=10000),
+                      content_reload_interval=env.float('CONTENT_RELOAD_INTERVAL', default=5),
                       ),
-                  logic=Logic(),
                   )
 
 
-conf = load_config('.env')
-conf.db.db_url = f"postgresql+psycopg2://{conf.db.db_user}:{conf.db.db_password}@{conf.db.db_host}:{conf.db.db_port}/{conf.db.database}"
-
-tz = conf.tg_bot.TIMEZONE
+def __getattr__(name: str):
+    # conf и tz создаются при первом обращении: импорт модуля ради классов конфигурации
+    # (SessionConfig, RedisConfig, ...) не читает .env и не настраивает логирование
+    if name not in ('conf', 'tz'):
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    setup_logging()
+    conf = load_config('.env')
+    conf.db.db_url = f"postgresql+psycopg2://{conf.db.db_user}:{conf.db.db_password}@{conf.db.db_host}:{conf.db.db_port}/{conf.db.database}"
+    globals().update(conf=conf, tz=conf.tg_bot.TIMEZONE)
+    return globals()[name]
 
 
@@ -0,0 +1,182 @@
+"""
+Ограничение объема логов.
+
+- Выборка (sampling): частые события уровня ниже WARNING пишутся с долей rate,
+  доля задается по имени логгера (LOG_SAMPLE_RATES=handlers=0.1,aiogram.event=0.05).
+  Ключ события - логгер + шаблон сообщения, поэтому в горячих местах логируем
+  в %-стиле: logger.info('Пользователь %s', user_id). Аргументы подставляются
+  только если событие прошло фильтр уровня и выборку.
+- Дедупликация: одинаковые WARNING и выше в течение window секунд пишутся один раз,
+  следующее после окна сообщение получает число пропущенных повторов. Если повторы
+  прекратились, число пишется отдельной записью фоновым потоком после окна и при остановке.
+
+Для structlog работает как процессор, для логгеров сторонних библиотек
+(aiogram, aiohttp) - как logging.Filter.
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import structlog
+
+MAX_KEYS = 10000  # Защита от неограниченного роста при логах с f-строками
+STDLIB_LOGGERS = ('aiogram', 'aiohttp', 'asyncio', 'sqlalchemy')
+DEDUP_METHODS = {'warning', 'warn', 'error', 'exception', 'critical', 'fatal'}
+
+
+def _template(message) -> str:
+    # Ключ должен быть хешируемым: в лог иногда передают исключение или объект
+    return message if isinstance(message, str) else repr(message)
+
+
+class LogSampler:
+    def __init__(self, rates: Optional[Dict[str, float]] = None, dedup_window: float = 60.0):
+        self.configure(rates, dedup_window)
+        self.sampled_out = 0
+        self.deduplicated = 0
+        self._rate_cache: Dict[str, float] = {}
+        self._credit: Dict[Hashable, float] = {}
+        # Ключ -> (начало окна, пропущено повторов, логгер, шаблон, аргументы)
+        self._seen: Dict[Hashable, Tuple[float, int, str, Any, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def configure(self, rates: Optional[Dict[str, float]] = None, dedup_window: float = 60.0) -> None:
+        self.rates = {name: max(0.0, min(1.0, rate)) for name, rate in (rates or {}).items()}
+        self.dedup_window = dedup_window
+        self._rate_cache = {}
+
+    def rate_for(self, logger_name: str) -> float:
+        """Доля по самому длинному совпадающему префиксу имени логгера"""
+        rate = self._rate_cache.get(logger_name)
+        if rate is None:
+            rate, best = 1.0, -1
+            for name, value in self.rates.items():
+                if (logger_name == name or logger_name.startswith(f'{name}.')) and len(name) > best:
+                    rate, best = value, len(name)
+            self._rate_cache[logger_name] = rate
+        return rate
+
+    def sample(self, logger_name: str, key: Hashable) -> bool:
+        """True, если событие нужно записать. Первое событие ключа пишется всегда"""
+        rate = self.rate_for(logger_name)
+        if rate >= 1.0:
+            return True
+        with self._lock:
+            if len(self._credit) > MAX_KEYS:
+                self._credit.clear()
+            # Детерминированная выборка: накапливаем долю, пишем при накоплении 1
+            credit = self._credit.get(key, 1.0)
+            keep = credit >= 1.0
+            self._credit[key] = (credit - 1.0 if keep else credit) + rate
+        if not keep:
+            self.sampled_out += 1
+        return keep
+
+    def dedup(self, key: Hashable, logger_name: str = '', message: Any = None, args: Any = None) -> Optional[int]:
+        """None - повтор внутри окна, иначе число пропущенных повторов перед этим событием"""
+        if self.dedup_window <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            if len(self._seen) > MAX_KEYS:
+                self._seen.clear()
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.dedup_window:
+                self._seen[key] = (entry[0], entry[1] + 1, *entry[2:])
+                self.deduplicated += 1
+                return None
+            self._seen[key] = (now, 0, logger_name, message, args)
+        return entry[1] if entry is not None else 0
+
+    def flush_repeats(self, force: bool = False) -> int:
+        """
+        Пишет число повторов, пропущенных в закончившихся окнах (force - во всех), если после окна
+        такое же событие не пришло. Возвращает число записей
+        """
+        now = time.monotonic()
+        pending: List[Tuple[str, Any, Any, int]] = []
+        with self._lock:
+            for key, (started, repeated, logger_name, message, args) in list(self._seen.items()):
+                if force or now - started >= self.dedup_window:
+                    del self._seen[key]
+                    if repeated:
+                        pending.append((logger_name, message, args, repeated))
+        for logger_name, message, args, repeated in pending:
+            try:
+                text = message % args if args else message
+            except (TypeError, ValueError):
+                text = message
+            # Через logging: запись с новым текстом сама проходит дедупликацию и попадает во все обработчики
+            logging.getLogger(logger_name or __name__).warning('%s [повторов: %d]', text, repeated)
+        return len(pending)
+
+    def start_flusher(self) -> None:
+        """Фоновый поток, который раз в окно пишет повторы; при выходе пишутся оставшиеся"""
+        if self._flusher is not None or self.dedup_window <= 0:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='log-dedup', daemon=True)
+        self._flusher.start()
+        atexit.register(self.stop_flusher)
+
+    def stop_flusher(self) -> None:
+        if self._flusher is None:
+            return
+        self._stop.set()
+        self._flusher.join()
+        self._flusher = None
+        self.flush_repeats(force=True)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.dedup_window):
+            self.flush_repeats()
+
+    def processor(self, _, method_name: str, event_dict: dict) -> dict:
+        """Процессор structlog. Ставится до PositionalArgumentsFormatter"""
+        logger_name = event_dict.get('logger', '')
+        key = (logger_name, _template(event_dict.get('event')))
+        if method_name in DEDUP_METHODS:
+            args = event_dict.get('positional_args')
+            repeated = self.dedup((key, repr(args)), logger_name, event_dict.get('event'), args)
+            if repeated is None:
+                raise structlog.DropEvent
+            if repeated:
+                event_dict['repeated'] = repeated
+        elif not self.sample(logger_name, key):
+            raise structlog.DropEvent
+        return event_dict
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """logging.Filter для логгеров сторонних библиотек"""
+        if not record.name.startswith(STDLIB_LOGGERS):
+            return True  # События structlog уже прошли processor
+        # Фильтр стоит на нескольких обработчиках: решение принимается один раз на запись
+        last = getattr(self._local, 'last', None)
+        if last is not None and last[0] is record:
+            return last[1]
+        decision = self._decide(record)
+        self._local.last = (record, decision)
+        return decision
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        key = (record.name, _template(record.msg))
+        if record.levelno >= logging.WARNING:
+            repeated = self.dedup((key, repr(record.args)), record.name, record.msg, record.args)
+            if repeated is None:
+                return False
+            if repeated:
+                record.msg = f'{record.msg} [повторов: {repeated}]'
+            return True
+        return self.sample(record.name, key)
+
+    def attach(self, logger: logging.Logger) -> None:
+        """Подключает фильтр к обработчикам logger (фильтры логгера не действуют на дочерние логгеры)"""
+        for handler in logger.handlers:
+            handler.addFilter(self)
+
+    def stats(self) -> Dict[str, int]:
+        return {'sampled_out': self.sampled_out, 'deduplicated': self.deduplicated}
@@ -0,0 +1,100 @@
+"""
+Неблокирующее логирование: обработчики логов только кладут запись в очередь,
+а форматирование и запись в консоль/файлы выполняет фоновый поток.
+
+Очередь ограничена: при переполнении запись либо отбрасывается (policy='drop'),
+либо логгер ждет освобождения места до block_timeout секунд (policy='block').
+Число отброшенных записей считается и периодически попадает в лог.
+"""
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+
+class BoundedQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue, policy: str = 'drop', block_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Запись не форматируется в потоке вызывающего кода:
+        # structlog.ProcessorFormatter отработает в фоновом потоке
+        return record
+
+    def _put(self, record: logging.LogRecord) -> bool:
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported += 1
+            return False
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if not self._put(record) or not self._unreported:
+            return
+        with self._lock:
+            unreported, self._unreported = self._unreported, 0
+        report = logging.LogRecord(
+            name='log_queue', level=logging.WARNING, pathname=__file__, lineno=0,
+            msg='Очередь логов переполнена, пропущено записей: %d', args=(unreported,), exc_info=None,
+        )
+        self._put(report)
+
+
+class LogQueue:
+    def __init__(self):
+        self.handler: Optional[BoundedQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        self._logger: Optional[logging.Logger] = None
+
+    def install(self, logger: logging.Logger, maxsize: int = 10000, policy: str = 'drop',
+                block_timeout: float = 1.0) -> None:
+        """Переносит обработчики logger в фоновый поток, оставляя на logger только очередь"""
+        if self.listener is not None:
+            return
+        handlers: List[logging.Handler] = logger.handlers[:]
+        for handler in handlers:
+            logger.removeHandler(handler)
+        log_queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.handler = BoundedQueueHandler(log_queue, policy=policy, block_timeout=block_timeout)
+        logger.addHandler(self.handler)
+        self._logger = logger
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Дописывает все записи из очереди и останавливает фоновый поток"""
+        if self.listener is None:
+            return
+        listener, self.listener = self.listener, None
+        listener.stop()
+        # Логи после остановки пишутся напрямую, как без очереди
+        self._logger.removeHandler(self.handler)
+        for handler in listener.handlers:
+            handler.flush()
+            self._logger.addHandler(handler)
+
+    def stats(self) -> Dict[str, int]:
+        if self.handler is None:
+            return {'enabled': 0, 'queued': 0, 'dropped': 0}
+        return {
+            'enabled': 1,
+            'queued': self.handler.queue.qsize(),
+            'dropped': self.handler.dropped,
+        }
+
+
+log_queue = LogQueue()
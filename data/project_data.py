@@ -29,18 +29,23 @@ REGISTRATION_SUCCESS_MESSAGE = """Поздравляем! Вы успешно з
 
 Подписывайтесь на <a href="https://t.me/partnerroyal">канал</a>, чтобы получать актуальные новости о мероприятии и полезные материалы. До встречи на конференции!"""
 
+# Кнопка регистрации в главном меню
+REGISTRATION_BUTTON_TEXT = "🔸 Регистрация на 14 марта"
+
 # Ссылки
 CHANNEL_PARTNERROYAL_URL = "https://t.me/partnerroyal"
 ROYAL_CLINIC_SITE_URL = "https://royalclinicmoscow.ru/?ysclid=mltc5eh8ty205122993"
 ROYAL_CLINIC_CHANNEL_URL = "https://t.me/royalclinicmos"
 
 # Video IDs для архива прошедших мероприятий (2 видео)
+# Используются для начального заполнения каталога data/media_catalog.json
 ARCHIVE_VIDEOS = [
     "BAACAgIAAxkBAAMHaZmTX0EghXQYhmpwq-M1U5O-n50AAiiYAAKfH9FIgY-9rAVup2I6BA",  # TODO: Добавить video_id первого видео
     "BAACAgIAAxkBAAMLaZmTvzXkqwGXlX-bEMEO1HEvF-YAAimYAAKfH9FIziXPRTWWYyA6BA",  # TODO: Добавить video_id второго видео
 ]
 
 # Video IDs для отзывов участников (2 видео)
+# Используются для начального заполнения каталога data/media_catalog.json
 REVIEWS_VIDEOS = [
     "BAACAgIAAxkBAAMbaZmWeJFyhwJIwjuZoBHMGPTDDQkAAkWYAAKfH9FIwu0QmAEPly46BA",  # TODO: Добавить video_id первого видео
     "BAACAgIAAxkBAAMfaZmXaMfe6xy2lJAev8jE2gIoPuEAAkuYAAKfH9FIoZgDAAH510kkOgQ",  # TODO: Добавить video_id второго видео
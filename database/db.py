@@ -0,0 +1,28 @@
+"""
+Асинхронное подключение к PostgreSQL (SQLAlchemy + asyncpg) с ограниченным пулом соединений
+"""
+import structlog
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config_data.conf import PostgresConfig
+from database.models import Base
+
+logger = structlog.get_logger(__name__)
+
+
+def create_engine(config: PostgresConfig) -> AsyncEngine:
+    """Создает async engine. Пул: pool_size постоянных + max_overflow временных соединений"""
+    return create_async_engine(
+        config.async_db_url,
+        pool_size=config.pool_size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.pool_timeout,
+        pool_pre_ping=True,
+    )
+
+
+async def init_db(engine: AsyncEngine) -> None:
+    """Создает недостающие таблицы и индексы"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info('Таблицы БД проверены')
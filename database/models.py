@@ -0,0 +1,34 @@
+"""
+Модели базы данных
+"""
+import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, Index, String
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Registration(Base):
+    """Регистрация на конференцию"""
+    __tablename__ = 'registrations'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)  # Telegram ID пользователя
+    username: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    full_name: Mapped[str] = mapped_column(String(255))  # ФИО
+    phone: Mapped[str] = mapped_column(String(32))
+    email: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('ix_registrations_phone', 'phone'),
+        Index('ix_registrations_email', 'email'),
+        Index('ix_registrations_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'Registration({self.id}, {self.full_name}, {self.phone}, {self.email})'
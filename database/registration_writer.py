@@ -0,0 +1,161 @@
+"""
+Фоновая запись регистраций в БД пачками.
+
+Обработчик только кладет регистрацию в очередь (без ожидания БД),
+фоновая задача собирает пачку до batch_size записей или flush_interval секунд
+и вставляет ее одним INSERT в одной транзакции.
+Если пачку отклонила сама БД (слишком длинное значение, нарушение ограничения), строки
+вставляются по одной: отклоненная строка пишется в лог и пропускается (она остается в журнале
+регистраций), остальные сохраняются. Всю пачку повторяем только при ошибках соединения.
+"""
+import asyncio
+import datetime
+from typing import Any, Dict, List, Optional
+
+import structlog
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from database.models import Registration
+
+logger = structlog.get_logger(__name__)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Ошибка соединения с БД (повтор поможет), а не отказ БД принять данные"""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return True
+
+
+class RegistrationWriter:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        retry_delay: float = 5.0,
+        ready: Optional[asyncio.Event] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.ready = ready  # Если задано, запись начинается после того, как таблицы созданы
+        self._queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: List[Dict[str, Any]] = []  # Пачка, которая сейчас пишется в БД
+        self.rejected = 0  # Строк, которые БД отказалась принять
+
+    def add(
+        self,
+        user_id: int,
+        username: Optional[str],
+        full_name: str,
+        phone: str,
+        email: str,
+        created_at: datetime.datetime,
+    ) -> bool:
+        """Ставит регистрацию в очередь на запись. Не ждет БД"""
+        row = dict(
+            user_id=user_id,
+            username=username,
+            full_name=full_name,
+            phone=phone,
+            email=email,
+            created_at=created_at,
+        )
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            logger.error(f'Очередь записи регистраций переполнена, запись не сохранена в БД: {row}')
+            return False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='registration_writer')
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу, дописав все, что осталось в очереди"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        batch, self._inflight = self._inflight, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            try:
+                try:
+                    await self._insert(batch)
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    await self._insert_rows(batch)
+            except Exception as e:
+                logger.error(f'Не удалось записать {len(batch)} регистраций при остановке: {e}', exc_info=True)
+
+    async def _collect(self) -> List[Dict[str, Any]]:
+        # Пачка собирается прямо в _inflight, чтобы при остановке ничего не потерялось
+        batch = self._inflight
+        batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(Registration), batch)
+
+    async def _insert_rows(self, batch: List[Dict[str, Any]]) -> None:
+        """Вставка по одной строке. При ошибке соединения в batch остаются невставленные строки"""
+        for index, row in enumerate(batch):
+            try:
+                await self._insert([row])
+            except Exception as e:
+                if is_connection_error(e):
+                    del batch[:index]
+                    raise
+                self.rejected += 1
+                logger.critical('Регистрация не записана в БД, строка пропущена: %s. Ошибка: %s', row, e)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            if self.ready is not None and not self.ready.is_set():
+                # Пока таблиц нет, вставка заведомо падает: регистрации копятся в очереди
+                await self.ready.wait()
+            while True:
+                try:
+                    try:
+                        await self._insert(batch)
+                        logger.debug(f'Записано регистраций в БД: {len(batch)}')
+                    except Exception as e:
+                        if is_connection_error(e):
+                            raise
+                        logger.error('БД отклонила пачку из %d регистраций, запись по одной: %s', len(batch), e)
+                        await self._insert_rows(batch)
+                    self._inflight = []
+                    break
+                except Exception as e:
+                    logger.error(f'Ошибка записи {len(batch)} регистраций в БД, повтор через {self.retry_delay} с: {e}')
+                    await asyncio.sleep(self.retry_delay)
@@ -20,7 +20,7 @@ async def user_kick(event: ChatMemberUpdated, bot: Bot):
     try:
         chat = event.chat
         user = event.old_chat_member.user
-        logger.info(f'Юзер {user.username} {user.id} KICKED/LEFT с канала {chat.id} {chat.title} ')
+        logger.info('Юзер %s %s KICKED/LEFT с канала %s %s ', user.username, user.id, chat.id, chat.title)
 
 
     except Exception as err:
@@ -38,10 +38,10 @@ async def user_join(event: ChatMemberUpdated, bot: Bot):
         chat = event.chat
         if chat.id == -1001829561831:
             return
-        logger.debug(f'{chat.id} {chat.title}')
+        logger.debug('%s %s', chat.id, chat.title)
         member = event.new_chat_member.user
-        logger.debug(f'member: {member}')
-        logger.info(f'Юзер {member.username} {member.id} присоединился к каналу {chat.id} {chat.title} ')
+        logger.debug('member: %s', member)
+        logger.info('Юзер %s %s присоединился к каналу %s %s ', member.username, member.id, chat.id, chat.title)
 
     except Exception as err:
         logger.error(err)
@@ -55,7 +55,7 @@ async def as_member(event: ChatMemberUpdated, bot: Bot):
     try:
         chat = event.chat
         owner = event.from_user
-        logger.info(f'Бот добавлен в канал {chat.id} {chat.title} как MEMBER  пользователем {owner.username} {owner.id}')
+        logger.info('Бот добавлен в канал %s %s как MEMBER  пользователем %s %s', chat.id, chat.title, owner.username, owner.id)
         # await bot.send_message(chat_id=owner.id, text=f'Бот добавлен в канал {chat.id} {chat.title} как MEMBER  пользователем {owner.username} {owner.id}')
     except Exception as err:
         logger.error(err)
@@ -66,10 +66,10 @@ async def as_member(event: ChatMemberUpdated, bot: Bot):
 async def left(event: ChatMemberUpdated, bot: Bot):
     logger.debug('MY event LEFT')
     try:
-        logger.debug(event)
+        logger.debug('event: %s', event)
         chat = event.chat
         owner = event.from_user
-        logger.info(f'Бот удален с канала {chat.id} {chat.title} пользователем {owner.username} {owner.id}')
+        logger.info('Бот удален с канала %s %s пользователем %s %s', chat.id, chat.title, owner.username, owner.id)
     except Exception as err:
         logger.error(err)
         raise err
@@ -81,7 +81,7 @@ async def as_admin(event: ChatMemberUpdated, bot: Bot):
     try:
         chat = event.chat
         owner = event.from_user
-        logger.info(f'Бот добавлен в канал {chat.id} {chat.title} как ADMINISTRATOR пользователем {owner.username} {owner.id}')
+        logger.info('Бот добавлен в канал %s %s как ADMINISTRATOR пользователем %s %s', chat.id, chat.title, owner.username, owner.id)
 
     except Exception as err:
         logger.error(err)
@@ -9,3 +9,4 @@ class RegistrationStates(StatesGroup):
     waiting_for_name = State()  # Ожидание ввода ФИО
     waiting_for_phone = State()  # Ожидание ввода телефона
     waiting_for_email = State()  # Ожидание ввода email
+    waiting_for_update = State()  # Найдена прошлая регистрация: обновить данные или оставить
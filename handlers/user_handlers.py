@@ -1,123 +1,254 @@
+import asyncio
+import html
+import os
 import re
 import datetime
-from typing import Any
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, Optional
 
 import structlog
 from aiogram import Router, Bot, F
 from aiogram.enums import ParseMode
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     Message,
     CallbackQuery,
     Contact,
+    FSInputFile,
     ReplyKeyboardRemove,
+    User,
 )
 from aiogram.exceptions import TelegramBadRequest
 
-from config_data.conf import conf
+from config_data import conf as settings
+from config_data.log_queue import log_queue
 from handlers.states import RegistrationStates
-from keyboards.keyboards import (
-    get_main_menu_kb,
-    get_project_kb,
-    get_cancel_kb,
-    get_phone_kb
-)
-from data.project_data import (
-    WELCOME_MESSAGE,
-    PROJECT_DESCRIPTION,
-    REGISTRATION_SUCCESS_MESSAGE,
-    ARCHIVE_VIDEOS,
-    REVIEWS_VIDEOS,
-    CHANNEL_PARTNERROYAL_URL,
-)
+from middlewares.message_cache import MessageCacheMiddleware, show_screen
+from middlewares.rate_limiter import RateLimitMiddleware
+from middlewares.throttling import CallbackThrottleMiddleware
+from services.duplicate_index import DuplicateIndex
+from services.group_digest import GroupDigest, RegistrationNotice, build_messages, format_notice
+from services.media_catalog import COLLECTIONS, is_dead_file_error, media_catalog
+from services.outbox import RegistrationOutbox
+from services.registration_journal import DATE_FORMAT, RegistrationJournal, parse_period
+from services.update_scheduler import UpdateScheduler
+from keyboards.keyboards import get_media_collections_kb
+from keyboards.screens import screens
+from data.project_data import CHANNEL_PARTNERROYAL_URL
+
+if TYPE_CHECKING:
+    # Только для аннотации: SQLAlchemy не импортируется, если БД выключена
+    from database.registration_writer import RegistrationWriter
 
 logger = structlog.get_logger(__name__)
 router = Router()
 
+# Ограничения длины по размерам колонок database/models.py: более длинное значение БД не примет
+FULL_NAME_MAX_LENGTH = 255
+PHONE_MAX_LENGTH = 32
+EMAIL_MAX_LENGTH = 255
+
 
 # Админ-команда для получения video_id
 @router.message(Command("get_video_id"))
 async def cmd_get_video_id(message: Message):
     """Команда для админа: подсказка как получить file_id видео."""
-    if str(message.from_user.id) not in conf.tg_bot.admin_ids:
+    if str(message.from_user.id) not in settings.conf.tg_bot.admin_ids:
         await message.answer("❌ У вас нет прав для выполнения этой команды.")
         return
     await message.answer(
-        "📹 Отправьте видео следующим сообщением — в ответ пришлю <b>file_id</b>.\n\n"
-        "Этот ID впишите в <code>data/project_data.py</code> в массивы <code>ARCHIVE_VIDEOS</code> или <code>REVIEWS_VIDEOS</code>.",
+        "📹 Отправьте видео следующим сообщением — в ответ пришлю <b>file_id</b> "
+        "и кнопки для добавления видео в архив или отзывы.",
         parse_mode=ParseMode.HTML
     )
 
 
+# Админ-команда для просмотра статистики очереди исходящих сообщений
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, bot: Bot, rate_limiter: Optional[RateLimitMiddleware] = None,
+                    update_scheduler: Optional[UpdateScheduler] = None,
+                    callback_throttle: Optional[CallbackThrottleMiddleware] = None,
+                    registration_outbox: Optional[RegistrationOutbox] = None,
+                    message_cache: Optional[MessageCacheMiddleware] = None):
+    """Команда для админа: статистика лимитера, планировщика, нажатий кнопок, outbox, экранов, пула соединений и логов."""
+    if str(message.from_user.id) not in settings.conf.tg_bot.admin_ids:
+        await message.answer("❌ У вас нет прав для выполнения этой команды.")
+        return
+    lines = ["📊 <b>Статистика</b>"]
+    if rate_limiter:
+        stats = rate_limiter.stats()
+        lines.append(
+            f"\n<b>Очередь исходящих сообщений</b>\n"
+            f"Сейчас ждут: {stats['queue_depth']} (чатов: {stats['chats_waiting']})\n"
+            f"Запросов: {stats['requests']}, ждали токен: {stats['delayed']}\n"
+            f"Ответов 429: {stats['retry_after']}, не отправлено: {stats['failed']}"
+        )
+    if update_scheduler:
+        stats = update_scheduler.stats()
+        busiest = ", ".join(
+            f"#{shard['shard']}: {shard['depth']} (макс. {shard['max_depth']}, {shard['wait_max_ms']:.0f} мс)"
+            for shard in stats['busiest_shards']
+        )
+        lines.append(
+            f"\n<b>Планировщик апдейтов</b>\n"
+            f"Шардов: {stats['shards']}, в очередях: {stats['depth']}\n"
+            f"Обработано: {stats['processed']}, ошибок: {stats['errors']}\n"
+            f"Ожидание в очереди ср./макс.: {stats['wait_avg_ms']:.0f}/{stats['wait_max_ms']:.0f} мс\n"
+            f"Загруженные шарды: {busiest}"
+        )
+    if callback_throttle:
+        stats = callback_throttle.stats()
+        top = ", ".join(f"{data}: {count}" for data, count in stats['top_dropped']) or "нет"
+        lines.append(
+            f"\n<b>Нажатия кнопок</b>\n"
+            f"Обработано: {stats['passed']}, обрабатывается сейчас: {stats['in_flight']}\n"
+            f"Отброшено повторов: {stats['duplicate']}, до конца паузы: {stats['cooldown']}, "
+            f"слишком частых: {stats['throttled']}\n"
+            f"Чаще всего отброшены: {top}"
+        )
+    if registration_outbox:
+        lines.append(
+            f"\n<b>Регистрации для канала (outbox)</b>\n"
+            f"Ждут отправки: {await registration_outbox.pending()}\n"
+            f"Отправлено: {registration_outbox.sent}, неудачных попыток: {registration_outbox.failed}\n"
+            f"Не отправлено за все попытки: {await registration_outbox.dead()}"
+        )
+    if message_cache:
+        stats = message_cache.stats()
+        lines.append(
+            f"\n<b>Показ экранов</b>\n"
+            f"Чатов в кэше: {stats['chats']}, решений по кэшу: {stats['hits']}, без кэша: {stats['misses']}\n"
+            f"Без запроса (экран уже показан): {stats['skipped']}"
+        )
+    pool_stats = getattr(bot.session, 'pool_stats', None)
+    if pool_stats:
+        stats = pool_stats.as_dict()
+        lines.append(
+            f"\n<b>Соединения с Bot API</b>\n"
+            f"Запросов сейчас: {stats['in_flight']} (максимум: {stats['max_in_flight']}), "
+            f"всего: {stats['requests']}\n"
+            f"Соединений открыто: {stats['created']}, переиспользовано: {stats['reused']}\n"
+            f"Ждали свободного соединения: {stats['queued']} (сейчас: {stats['waiting']}), "
+            f"ожидание ср./макс.: {stats['wait_avg_ms']:.0f}/{stats['wait_max_ms']:.0f} мс"
+        )
+    log_stats = log_queue.stats()
+    if log_stats['enabled']:
+        lines.append(
+            f"\n<b>Очередь логов</b>\n"
+            f"В очереди: {log_stats['queued']}, отброшено: {log_stats['dropped']}"
+        )
+    sampler_stats = settings.log_sampler.stats()
+    lines.append(
+        f"\n<b>Логи</b>\n"
+        f"Пропущено выборкой: {sampler_stats['sampled_out']}, склеено повторов: {sampler_stats['deduplicated']}"
+    )
+    await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
+# Админ-команда выгрузки регистраций из журнала в CSV
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject,
+                     registration_journal: Optional[RegistrationJournal] = None):
+    """Команда для админа: /export [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ] - CSV-файл с регистрациями за период."""
+    if str(message.from_user.id) not in settings.conf.tg_bot.admin_ids:
+        await message.answer("❌ У вас нет прав для выполнения этой команды.")
+        return
+    if not registration_journal:
+        await message.answer("❌ Журнал регистраций выключен (REGISTRATION_JOURNAL).")
+        return
+    try:
+        date_from, date_to = parse_period(command.args)
+    except ValueError:
+        await message.answer(
+            "Формат: <code>/export</code> - все регистрации, <code>/export 01.03.2026</code> - с даты, "
+            "<code>/export 01.03.2026 31.03.2026</code> - за период.",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    # Файл собирается построчно в отдельном потоке и отправляется с диска, без загрузки в память
+    path, count = await asyncio.to_thread(registration_journal.export_csv, date_from, date_to)
+    try:
+        if date_to:
+            period = f"{date_from.strftime(DATE_FORMAT)} - {date_to.strftime(DATE_FORMAT)}"
+        else:
+            period = f"с {date_from.strftime(DATE_FORMAT)}" if date_from else "за все время"
+        logger.info('Админ %s выгрузил регистрации (%s): %d', message.from_user.id, period, count)
+        if not count:
+            await message.answer(f"Регистраций нет ({period}).")
+            return
+        now = datetime.datetime.now(settings.conf.tg_bot.TIMEZONE).strftime('%Y%m%d_%H%M%S')
+        await message.answer_document(
+            FSInputFile(path, filename=f'registrations_{now}.csv'),
+            caption=f"📋 Регистрации ({period}): {count}",
+        )
+    finally:
+        os.remove(path)
+
+
 @router.message(F.video)
 async def admin_reply_video_id(message: Message):
-    """Если админ отправил видео — отвечаем ему file_id для вставки в project_data."""
-    if str(message.from_user.id) not in conf.tg_bot.admin_ids:
+    """Если админ отправил видео — отвечаем ему file_id и кнопками добавления в каталог."""
+    if str(message.from_user.id) not in settings.conf.tg_bot.admin_ids:
         return
     file_id = message.video.file_id
-    logger.info(f"Админ {message.from_user.id} запросил file_id видео: {file_id[:40]}...")
-    await message.answer(
+    logger.info("Админ %s запросил file_id видео: %s...", message.from_user.id, file_id[:40])
+    # Ответ реплаем на видео: по нему обработчик кнопки найдет file_id
+    await message.reply(
         f"📋 <b>file_id видео:</b>\n<code>{file_id}</code>\n\n"
-        f"Впишите в <code>data/project_data.py</code> в массивы <code>ARCHIVE_VIDEOS</code> или <code>REVIEWS_VIDEOS</code>.",
+        f"Добавить видео в коллекцию:",
+        reply_markup=get_media_collections_kb(COLLECTIONS),
         parse_mode=ParseMode.HTML
     )
 
 
+@router.callback_query(F.data.startswith("media_add:"))
+async def admin_add_video(callback: CallbackQuery):
+    """Админ добавляет присланное видео в коллекцию каталога."""
+    if str(callback.from_user.id) not in settings.conf.tg_bot.admin_ids:
+        await callback.answer("❌ Нет прав", show_alert=True)
+        return
+    collection = callback.data.split(":", 1)[1]
+    source = callback.message.reply_to_message
+    if collection not in COLLECTIONS or not source or not source.video:
+        await callback.answer("Видео не найдено, отправьте его еще раз", show_alert=True)
+        return
+    file_id = source.video.file_id
+    added = media_catalog.add(collection, file_id)
+    title = COLLECTIONS[collection]
+    if added:
+        await callback.message.edit_text(
+            f"✅ Видео добавлено в «{title}». Всего видео: {len(media_catalog.videos(collection))}"
+        )
+    await callback.answer("Добавлено" if added else f"Уже есть в «{title}»")
+
+
 # Обработчик команды /start
 @router.message(Command("start"))
 async def cmd_start(message: Message, bot: Bot):
     """Обработчик команды /start с приветственным сообщением"""
     try:
-        logger.info(f'cmd_start: пользователь {message.from_user.id} ({message.from_user.username}) {message.chat.id}')
+        logger.info('cmd_start: пользователь %s (%s) %s', message.from_user.id, message.from_user.username, message.chat.id)
         
-        await message.answer(
-            WELCOME_MESSAGE,
-            reply_markup=get_main_menu_kb(),
-            parse_mode=ParseMode.HTML
-        )
-        logger.info(f'Приветственное сообщение отправлено пользователю {message.from_user.id}')
+        await message.answer(**screens.main_menu.as_kwargs())
+        logger.debug('Приветственное сообщение отправлено пользователю %s', message.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в cmd_start: {e}', exc_info=True)
 
 
 # Обработчик кнопки "Назад в меню"
 @router.callback_query(F.data == "back_to_menu")
-async def back_to_menu(callback: CallbackQuery, bot: Bot):
+async def back_to_menu(callback: CallbackQuery, bot: Bot,
+                      message_cache: Optional[MessageCacheMiddleware] = None):
     """Обработчик кнопки Назад в меню"""
     try:
-        logger.info(f'back_to_menu: пользователь {callback.from_user.id}')
-        
-        # Если сообщение содержит фото/видео, отправляем новое сообщение вместо редактирования
-        if callback.message.photo or callback.message.video:
-            try:
-                await callback.message.delete()
-            except Exception as delete_error:
-                logger.warning(f'Не удалось удалить сообщение с медиа: {delete_error}')
-            
-            await callback.message.answer(
-                WELCOME_MESSAGE,
-                reply_markup=get_main_menu_kb(),
-                parse_mode=ParseMode.HTML
-            )
-        else:
-            try:
-                await callback.message.edit_text(
-                    WELCOME_MESSAGE,
-                    reply_markup=get_main_menu_kb(),
-                    parse_mode=ParseMode.HTML
-                )
-            except Exception as edit_error:
-                # Если не удалось отредактировать, отправляем новое сообщение
-                logger.warning(f'Не удалось отредактировать сообщение, отправляем новое: {edit_error}')
-                await callback.message.answer(
-                    WELCOME_MESSAGE,
-                    reply_markup=get_main_menu_kb(),
-                    parse_mode=ParseMode.HTML
-                )
+        logger.info('back_to_menu: пользователь %s', callback.from_user.id)
+        
+        # Сообщение с фото/видео удаляется, меню приходит новым сообщением
+        await show_screen(callback.message, message_cache, delete_media=True, **screens.main_menu.as_kwargs())
         
         await callback.answer()
-        logger.info(f'Главное меню показано пользователю {callback.from_user.id}')
+        logger.debug('Главное меню показано пользователю %s', callback.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в back_to_menu: {e}', exc_info=True)
         try:
@@ -131,14 +262,10 @@ async def back_to_menu(callback: CallbackQuery, bot: Bot):
 async def menu_project(callback: CallbackQuery, bot: Bot):
     """Обработчик кнопки Наш проект - показывает текст о проекте"""
     try:
-        logger.info(f'menu_project: пользователь {callback.from_user.id}')
-        await callback.message.edit_text(
-            PROJECT_DESCRIPTION,
-            reply_markup=get_project_kb(),
-            parse_mode=ParseMode.HTML
-        )
+        logger.info('menu_project: пользователь %s', callback.from_user.id)
+        await callback.message.edit_text(**screens.project.as_kwargs())
         await callback.answer()
-        logger.info(f'Информация о проекте показана пользователю {callback.from_user.id}')
+        logger.debug('Информация о проекте показана пользователю %s', callback.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в menu_project: {e}', exc_info=True)
         try:
@@ -152,7 +279,7 @@ async def menu_project(callback: CallbackQuery, bot: Bot):
 async def project_archive(callback: CallbackQuery, bot: Bot):
     """Обработчик кнопки Архив прошедших мероприятий - отправляет 2 видео"""
     try:
-        logger.info(f'project_archive: пользователь {callback.from_user.id}')
+        logger.info('project_archive: пользователь %s', callback.from_user.id)
         await callback.answer("Загрузка архива...")
         
         # Удаляем сообщение с кнопками
@@ -163,7 +290,7 @@ async def project_archive(callback: CallbackQuery, bot: Bot):
         
         # Отправляем видео из архива
         videos_sent = 0
-        for video_id in ARCHIVE_VIDEOS:
+        for video_id in media_catalog.videos('archive'):
             if video_id:
                 try:
                     await bot.send_video(
@@ -171,25 +298,21 @@ async def project_archive(callback: CallbackQuery, bot: Bot):
                         video=video_id
                     )
                     videos_sent += 1
-                    logger.info(f'Видео из архива отправлено: {video_id[:40]}...')
+                    logger.debug('Видео из архива отправлено: %s...', video_id[:40])
                 except TelegramBadRequest as e:
-                    logger.warning(f'Ошибка отправки видео из архива: {e}')
+                    logger.warning('Ошибка отправки видео из архива: %s', e)
+                    if is_dead_file_error(e):
+                        media_catalog.mark_dead(video_id, e.message)
                 except Exception as e:
                     logger.error(f'Ошибка при отправке видео из архива: {e}', exc_info=True)
         
         if videos_sent == 0:
-            await callback.message.answer(
-                "❌ Видео из архива временно недоступны.",
-                reply_markup=get_project_kb()
-            )
+            await callback.message.answer(**screens.archive_unavailable.as_kwargs())
         else:
             # Отправляем меню проекта
-            await callback.message.answer(
-                "🔸 Наш проект\n\nВыберите раздел:",
-                reply_markup=get_project_kb()
-            )
+            await callback.message.answer(**screens.project_menu.as_kwargs())
         
-        logger.info(f'Архив отправлен пользователю {callback.from_user.id}, отправлено видео: {videos_sent}')
+        logger.info('Архив отправлен пользователю %s, отправлено видео: %s', callback.from_user.id, videos_sent)
     except Exception as e:
         logger.error(f'Ошибка в project_archive: {e}', exc_info=True)
         try:
@@ -203,7 +326,7 @@ async def project_archive(callback: CallbackQuery, bot: Bot):
 async def project_reviews(callback: CallbackQuery, bot: Bot):
     """Обработчик кнопки Отзывы участников - отправляет 2 видео"""
     try:
-        logger.info(f'project_reviews: пользователь {callback.from_user.id}')
+        logger.info('project_reviews: пользователь %s', callback.from_user.id)
         await callback.answer("Загрузка отзывов...")
         
         # Удаляем сообщение с кнопками
@@ -214,7 +337,7 @@ async def project_reviews(callback: CallbackQuery, bot: Bot):
         
         # Отправляем видео с отзывами
         videos_sent = 0
-        for video_id in REVIEWS_VIDEOS:
+        for video_id in media_catalog.videos('reviews'):
             if video_id:
                 try:
                     await bot.send_video(
@@ -222,25 +345,21 @@ async def project_reviews(callback: CallbackQuery, bot: Bot):
                         video=video_id
                     )
                     videos_sent += 1
-                    logger.info(f'Видео с отзывом отправлено: {video_id[:40]}...')
+                    logger.debug('Видео с отзывом отправлено: %s...', video_id[:40])
                 except TelegramBadRequest as e:
-                    logger.warning(f'Ошибка отправки видео с отзывом: {e}')
+                    logger.warning('Ошибка отправки видео с отзывом: %s', e)
+                    if is_dead_file_error(e):
+                        media_catalog.mark_dead(video_id, e.message)
                 except Exception as e:
                     logger.error(f'Ошибка при отправке видео с отзывом: {e}', exc_info=True)
         
         if videos_sent == 0:
-            await callback.message.answer(
-                "❌ Видео с отзывами временно недоступны.",
-                reply_markup=get_project_kb()
-            )
+            await callback.message.answer(**screens.reviews_unavailable.as_kwargs())
         else:
             # Отправляем меню проекта
-            await callback.message.answer(
-                "🔸 Наш проект\n\nВыберите раздел:",
-                reply_markup=get_project_kb()
-            )
+            await callback.message.answer(**screens.project_menu.as_kwargs())
         
-        logger.info(f'Отзывы отправлены пользователю {callback.from_user.id}, отправлено видео: {videos_sent}')
+        logger.info('Отзывы отправлены пользователю %s, отправлено видео: %s', callback.from_user.id, videos_sent)
     except Exception as e:
         logger.error(f'Ошибка в project_reviews: {e}', exc_info=True)
         try:
@@ -251,32 +370,18 @@ async def project_reviews(callback: CallbackQuery, bot: Bot):
 
 # Обработчик кнопки "Регистрация на 14 марта"
 @router.callback_query(F.data == "menu_registration")
-async def start_registration(callback: CallbackQuery, bot: Bot, state: FSMContext):
+async def start_registration(callback: CallbackQuery, bot: Bot, state: FSMContext,
+                             message_cache: Optional[MessageCacheMiddleware] = None):
     """Обработчик начала регистрации - запрашивает ФИО"""
     try:
-        logger.info(f'start_registration: пользователь {callback.from_user.id}')
+        logger.info('start_registration: пользователь %s', callback.from_user.id)
         
         await state.set_state(RegistrationStates.waiting_for_name)
         
-        text = "📝 Регистрация на конференцию \"Объединяем компетенции - искусство криоконсервации\"\n\n"
-        text += "Пожалуйста, введите ваше ФИО:"
-        
-        try:
-            await callback.message.edit_text(
-                text,
-                reply_markup=get_cancel_kb(),
-                parse_mode=ParseMode.HTML
-            )
-        except Exception as edit_error:
-            logger.warning(f'Не удалось отредактировать сообщение, отправляем новое: {edit_error}')
-            await callback.message.answer(
-                text,
-                reply_markup=get_cancel_kb(),
-                parse_mode=ParseMode.HTML
-            )
+        await show_screen(callback.message, message_cache, **screens.registration_start.as_kwargs())
         
         await callback.answer()
-        logger.info(f'Запрос ФИО отправлен пользователю {callback.from_user.id}')
+        logger.debug('Запрос ФИО отправлен пользователю %s', callback.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в start_registration: {e}', exc_info=True)
         try:
@@ -294,15 +399,20 @@ async def start_registration(callback: CallbackQuery, bot: Bot, state: FSMContex
 async def process_name(message: Message, bot: Bot, state: FSMContext):
     """Обработчик ввода ФИО - запрашивает телефон"""
     try:
-        logger.info(f'process_name: пользователь {message.from_user.id}, ФИО={message.text}')
+        logger.info('process_name: пользователь %s, ФИО=%s', message.from_user.id, message.text)
         name = message.text.strip()
         
         if len(name) < 3:
-            logger.warning(f'Слишком короткое ФИО от пользователя {message.from_user.id}: {name}')
-            await message.answer(
-                "❌ ФИО слишком короткое. Пожалуйста, введите ваше полное ФИО еще раз:",
-                reply_markup=get_cancel_kb()
-            )
+            logger.warning('Слишком короткое ФИО от пользователя %s: %s', message.from_user.id, name)
+            await message.answer(**screens.cancel_prompt.as_kwargs(
+                text="❌ ФИО слишком короткое. Пожалуйста, введите ваше полное ФИО еще раз:"))
+            return
+
+        if len(name) > FULL_NAME_MAX_LENGTH:
+            logger.warning('Слишком длинное ФИО от пользователя %s: %d символов', message.from_user.id, len(name))
+            await message.answer(**screens.cancel_prompt.as_kwargs(
+                text=f"❌ ФИО слишком длинное (не более {FULL_NAME_MAX_LENGTH} символов). "
+                     f"Пожалуйста, введите ваше ФИО еще раз:"))
             return
         
         await state.update_data(client_name=name)
@@ -311,12 +421,8 @@ async def process_name(message: Message, bot: Bot, state: FSMContext):
         text = f"✅ ФИО: <b>{name}</b>\n\n"
         text += "Теперь введите ваш номер телефона или нажмите кнопку ниже, чтобы поделиться номером:"
         
-        await message.answer(
-            text,
-            reply_markup=get_phone_kb(),
-            parse_mode=ParseMode.HTML
-        )
-        logger.info(f'ФИО принято: {name}, запрос телефона отправлен пользователю {message.from_user.id}')
+        await message.answer(**screens.phone_prompt.as_kwargs(text=text, parse_mode=ParseMode.HTML))
+        logger.info('ФИО принято: %s, запрос телефона отправлен пользователю %s', name, message.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в process_name: {e}', exc_info=True)
         try:
@@ -331,44 +437,44 @@ async def process_name(message: Message, bot: Bot, state: FSMContext):
 
 # Обработчик получения контакта (кнопка "Поделиться телефоном")
 @router.message(RegistrationStates.waiting_for_phone, F.contact)
-async def process_contact(message: Message, bot: Bot, state: FSMContext):
+async def process_contact(message: Message, bot: Bot, state: FSMContext,
+                          duplicate_index: Optional[DuplicateIndex] = None):
     """Обработчик получения контакта через кнопку"""
     try:
-        logger.info(f'process_contact: пользователь {message.from_user.id}, контакт получен')
+        logger.info('process_contact: пользователь %s, контакт получен', message.from_user.id)
         contact: Contact = message.contact
         
         if not contact.phone_number:
-            logger.warning(f'Контакт без номера телефона от пользователя {message.from_user.id}')
-            await message.answer(
-                "❌ Не удалось получить номер телефона. Пожалуйста, введите номер вручную:",
-                reply_markup=get_phone_kb()
-            )
+            logger.warning('Контакт без номера телефона от пользователя %s', message.from_user.id)
+            await message.answer(**screens.phone_prompt.as_kwargs(
+                text="❌ Не удалось получить номер телефона. Пожалуйста, введите номер вручную:"))
             return
         
         phone = contact.phone_number
-        logger.info(f'Номер телефона из контакта: {phone}')
+        logger.info('Номер телефона из контакта: %s', phone)
         
         # Используем тот же обработчик для продолжения регистрации
-        await process_phone_internal(message, bot, state, phone)
+        await process_phone_internal(message, bot, state, phone, duplicate_index)
         
     except Exception as e:
         logger.error(f'Ошибка в process_contact: {e}', exc_info=True)
         try:
-            await message.answer("Произошла ошибка. Попробуйте еще раз.", reply_markup=get_phone_kb())
+            await message.answer(**screens.phone_prompt.as_kwargs(text="Произошла ошибка. Попробуйте еще раз."))
         except:
             pass
 
 
 # Обработчик ввода телефона (текстовый ввод)
 @router.message(RegistrationStates.waiting_for_phone)
-async def process_phone(message: Message, bot: Bot, state: FSMContext):
+async def process_phone(message: Message, bot: Bot, state: FSMContext,
+                        duplicate_index: Optional[DuplicateIndex] = None):
     """Обработчик ввода телефона - запрашивает email"""
     try:
         # Проверяем, не является ли это контактом (обрабатывается отдельным обработчиком)
         if message.contact:
             return
         
-        logger.info(f'process_phone: пользователь {message.from_user.id}, телефон={message.text}')
+        logger.info('process_phone: пользователь %s, телефон=%s', message.from_user.id, message.text)
         phone = message.text.strip()
         
         # Обработка кнопки "Отменить" из ReplyKeyboard
@@ -378,20 +484,18 @@ async def process_phone(message: Message, bot: Bot, state: FSMContext):
         
         # Простая валидация телефона
         phone_clean = re.sub(r'[^\d+]', '', phone)
-        if len(phone_clean) < 10:
-            logger.warning(f'Некорректный телефон от пользователя {message.from_user.id}: {phone}')
-            await message.answer(
-                "❌ Номер телефона некорректный. Пожалуйста, введите номер еще раз или нажмите кнопку ниже:",
-                reply_markup=get_phone_kb()
-            )
+        if len(phone_clean) < 10 or len(phone) > PHONE_MAX_LENGTH:
+            logger.warning('Некорректный телефон от пользователя %s: %s', message.from_user.id, phone)
+            await message.answer(**screens.phone_prompt.as_kwargs(
+                text="❌ Номер телефона некорректный. Пожалуйста, введите номер еще раз или нажмите кнопку ниже:"))
             return
         
-        await process_phone_internal(message, bot, state, phone)
+        await process_phone_internal(message, bot, state, phone, duplicate_index)
         
     except Exception as e:
         logger.error(f'Ошибка в process_phone: {e}', exc_info=True)
         try:
-            await message.answer("Произошла ошибка. Попробуйте еще раз.", reply_markup=get_phone_kb())
+            await message.answer(**screens.phone_prompt.as_kwargs(text="Произошла ошибка. Попробуйте еще раз."))
         except:
             pass
         try:
@@ -401,26 +505,31 @@ async def process_phone(message: Message, bot: Bot, state: FSMContext):
 
 
 # Внутренняя функция для обработки телефона и запроса email
-async def process_phone_internal(message: Message, bot: Bot, state: FSMContext, phone: str):
+async def process_phone_internal(message: Message, bot: Bot, state: FSMContext, phone: str,
+                                 duplicate_index: Optional[DuplicateIndex] = None):
     """Внутренняя функция для обработки телефона и запроса email"""
     try:
         await state.update_data(client_phone=phone)
+        
+        # Телефон уже встречался в прошлой регистрации: предлагаем обновить данные вместо дубликата
+        if duplicate_index:
+            previous = duplicate_index.find(phone=phone)
+            if previous:
+                await ask_update_registration(message, state, previous)
+                return
+        
         await state.set_state(RegistrationStates.waiting_for_email)
         
         text = f"✅ Телефон: <b>{phone}</b>\n\n"
         text += "Теперь введите вашу электронную почту:"
         
-        await message.answer(
-            text,
-            reply_markup=get_cancel_kb(),
-            parse_mode=ParseMode.HTML
-        )
-        logger.info(f'Телефон принят: {phone}, запрос email отправлен пользователю {message.from_user.id}')
+        await message.answer(**screens.cancel_prompt.as_kwargs(text=text, parse_mode=ParseMode.HTML))
+        logger.info('Телефон принят: %s, запрос email отправлен пользователю %s', phone, message.from_user.id)
         
     except Exception as e:
         logger.error(f'Ошибка в process_phone_internal: {e}', exc_info=True)
         try:
-            await message.answer("Произошла ошибка. Попробуйте еще раз.", reply_markup=get_phone_kb())
+            await message.answer(**screens.phone_prompt.as_kwargs(text="Произошла ошибка. Попробуйте еще раз."))
         except:
             pass
         try:
@@ -431,10 +540,15 @@ async def process_phone_internal(message: Message, bot: Bot, state: FSMContext,
 
 # Обработчик ввода email
 @router.message(RegistrationStates.waiting_for_email)
-async def process_email(message: Message, bot: Bot, state: FSMContext):
+async def process_email(message: Message, bot: Bot, state: FSMContext,
+                        registration_writer: Optional['RegistrationWriter'] = None,
+                        group_digest: Optional[GroupDigest] = None,
+                        registration_outbox: Optional[RegistrationOutbox] = None,
+                        registration_journal: Optional[RegistrationJournal] = None,
+                        duplicate_index: Optional[DuplicateIndex] = None):
     """Обработчик ввода email - отправляет заявку в канал"""
     try:
-        logger.info(f'process_email: пользователь {message.from_user.id}, email={message.text}')
+        logger.info('process_email: пользователь %s, email=%s', message.from_user.id, message.text)
         email = message.text.strip()
         
         # Обработка кнопки "Отменить" из ReplyKeyboard
@@ -444,70 +558,157 @@ async def process_email(message: Message, bot: Bot, state: FSMContext):
         
         # Простая валидация email
         email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-        if not email_pattern.match(email):
-            logger.warning(f'Некорректный email от пользователя {message.from_user.id}: {email}')
-            await message.answer(
-                "❌ Электронная почта некорректная. Пожалуйста, введите email еще раз:",
-                reply_markup=get_cancel_kb()
-            )
+        if len(email) > EMAIL_MAX_LENGTH or not email_pattern.match(email):
+            logger.warning('Некорректный email от пользователя %s: %s', message.from_user.id, email)
+            await message.answer(**screens.cancel_prompt.as_kwargs(
+                text="❌ Электронная почта некорректная. Пожалуйста, введите email еще раз:"))
             return
         
-        # Получаем данные из состояния
+        # Email уже встречался в прошлой регистрации: предлагаем обновить данные вместо дубликата
         data = await state.get_data()
-        client_name = data.get('client_name', 'Не указано')
-        client_phone = data.get('client_phone', 'Не указан')
-        
-        logger.info(f'Данные регистрации: ФИО={client_name}, телефон={client_phone}, email={email}')
+        if duplicate_index and not data.get('update'):
+            previous = duplicate_index.find(email=email)
+            if previous:
+                await state.update_data(client_email=email)
+                await ask_update_registration(message, state, previous)
+                return
         
-        # Формируем сообщение для канала
-        registration_text = f"""📋 <b>Новая регистрация на конференцию</b>
-
-👤 ФИО: {client_name}
-📞 Телефон: {client_phone}
-📧 Email: {email}
-🕐 Время регистрации: {datetime.datetime.now().strftime('%d.%m.%Y %H:%M')}"""
+        await complete_registration(message, bot, message.from_user, state, email,
+                                    registration_writer, group_digest, registration_outbox, registration_journal,
+                                    duplicate_index)
         
-        # Отправляем заявку в канал (используем GROUP_ID из конфига)
+    except Exception as e:
+        logger.error(f'Ошибка в process_email: {e}', exc_info=True)
         try:
-            channel_id = conf.tg_bot.GROUP_ID
+            await message.answer(**screens.cancel_prompt.as_kwargs(text="Произошла ошибка. Попробуйте еще раз."))
+        except:
+            pass
+        try:
+            await state.clear()
+        except:
+            pass
+
+
+async def complete_registration(message: Message, bot: Bot, user: User, state: FSMContext, email: str,
+                                registration_writer: Optional['RegistrationWriter'] = None,
+                                group_digest: Optional[GroupDigest] = None,
+                                registration_outbox: Optional[RegistrationOutbox] = None,
+                                registration_journal: Optional[RegistrationJournal] = None,
+                                duplicate_index: Optional[DuplicateIndex] = None):
+    """Сохраняет регистрацию, отправляет ее в канал и подтверждает пользователю"""
+    # Получаем данные из состояния
+    data = await state.get_data()
+    client_name = data.get('client_name', 'Не указано')
+    client_phone = data.get('client_phone', 'Не указан')
+    
+    registered_at = datetime.datetime.now(settings.conf.tg_bot.TIMEZONE)
+    
+    logger.info('Данные регистрации: ФИО=%s, телефон=%s, email=%s', client_name, client_phone, email)
+    
+    # Сохраняем в БД (фоновая запись пачками, обработчик не ждет коммита)
+    if registration_writer:
+        registration_writer.add(
+            user_id=user.id,
+            username=user.username,
+            full_name=client_name,
+            phone=client_phone,
+            email=email,
+            created_at=registered_at,
+        )
+    
+    notice = RegistrationNotice(
+        full_name=client_name,
+        phone=client_phone,
+        email=email,
+        registered_at=registered_at,
+        user_id=user.id,
+        username=user.username,
+        updated=bool(data.get('update')),
+    )
+    
+    # Журнал для выгрузки /export (по нему же ищутся повторные регистрации)
+    if registration_journal:
+        registration_journal.append(notice)
+        if duplicate_index:
+            duplicate_index.add(notice)
+    
+    # Отправляем заявку в канал (используем GROUP_ID из конфига)
+    try:
+        if registration_outbox:
+            # Заявка сохранена на диск до подтверждения пользователю,
+            # в канал ее доставит outbox (с повторами, в том числе после перезапуска)
+            await registration_outbox.add(notice)
+        elif group_digest:
+            # Заявка уйдет в канал в составе сводки, пользователь не ждет отправки
+            group_digest.add(notice)
+        else:
             await bot.send_message(
-                chat_id=channel_id,
-                text=registration_text,
+                chat_id=settings.conf.tg_bot.GROUP_ID,
+                text=build_messages([notice])[0],
                 parse_mode=ParseMode.HTML
             )
-            
-            # Подтверждаем пользователю
-            await message.answer(
-                REGISTRATION_SUCCESS_MESSAGE,
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode=ParseMode.HTML
-            )
-            await message.answer(
-                "Главное меню:",
-                reply_markup=get_main_menu_kb()
-            )
-            
-            logger.info(f"Регистрация отправлена: ФИО={client_name}, телефон={client_phone}, email={email}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки регистрации в канал: {e}", exc_info=True)
-            await message.answer(
-                "❌ Произошла ошибка при отправке регистрации. Пожалуйста, попробуйте позже или свяжитесь с нами.",
-                reply_markup=ReplyKeyboardRemove()
-            )
-            await message.answer(
-                "Главное меню:",
-                reply_markup=get_main_menu_kb()
-            )
         
-        # Очищаем состояние
-        await state.clear()
-        logger.info(f'Состояние FSM очищено для пользователя {message.from_user.id}')
+        # Подтверждаем пользователю
+        await message.answer(**screens.registration_success.as_kwargs())
+        await message.answer(**screens.main_menu_short.as_kwargs())
+        
+        logger.info("Регистрация отправлена: ФИО=%s, телефон=%s, email=%s", client_name, client_phone, email)
         
     except Exception as e:
-        logger.error(f'Ошибка в process_email: {e}', exc_info=True)
+        logger.error(f"Ошибка отправки регистрации в канал: {e}", exc_info=True)
+        await message.answer(
+            "❌ Произошла ошибка при отправке регистрации. Пожалуйста, попробуйте позже или свяжитесь с нами.",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        await message.answer(**screens.main_menu_short.as_kwargs())
+    
+    # Очищаем состояние
+    await state.clear()
+    logger.debug('Состояние FSM очищено для пользователя %s', user.id)
+
+
+async def ask_update_registration(message: Message, state: FSMContext, previous: RegistrationNotice):
+    """Показывает найденную прошлую регистрацию и предлагает обновить данные"""
+    await state.set_state(RegistrationStates.waiting_for_update)
+    logger.info('Повторная регистрация пользователя %s: найдена регистрация от %s',
+                message.from_user.id, previous.registered_at.isoformat())
+    await message.answer(**screens.duplicate_prompt.as_kwargs(
+        text=f"ℹ️ Вы уже зарегистрированы на конференцию:\n\n{format_notice(replace(previous, updated=False))}\n\n"
+             f"Обновить данные регистрации?"))
+
+
+# Повторная регистрация: пользователь решил обновить данные
+@router.callback_query(RegistrationStates.waiting_for_update, F.data == "registration_update")
+async def update_registration(callback: CallbackQuery, bot: Bot, state: FSMContext,
+                              registration_writer: Optional['RegistrationWriter'] = None,
+                              group_digest: Optional[GroupDigest] = None,
+                              registration_outbox: Optional[RegistrationOutbox] = None,
+                              registration_journal: Optional[RegistrationJournal] = None,
+                              duplicate_index: Optional[DuplicateIndex] = None):
+    """Продолжает регистрацию как обновление данных: запрашивает email или сразу завершает"""
+    try:
+        logger.info('update_registration: пользователь %s', callback.from_user.id)
+        await state.update_data(update=True)
+        data = await state.get_data()
+        await callback.answer()
+        email = data.get('client_email')
+        if email:
+            # Совпал email: все данные уже введены
+            await callback.message.edit_reply_markup(reply_markup=None)
+            await complete_registration(callback.message, bot, callback.from_user, state, email,
+                                        registration_writer, group_digest, registration_outbox,
+                                        registration_journal, duplicate_index)
+            return
+        # Совпал телефон: продолжаем с ввода email
+        await state.set_state(RegistrationStates.waiting_for_email)
+        await callback.message.edit_text(**screens.cancel_prompt.as_kwargs(
+            text=f"✅ Телефон: <b>{html.escape(data.get('client_phone', ''))}</b>\n\n"
+                 f"Теперь введите вашу электронную почту:",
+            parse_mode=ParseMode.HTML))
+    except Exception as e:
+        logger.error(f'Ошибка в update_registration: {e}', exc_info=True)
         try:
-            await message.answer("Произошла ошибка. Попробуйте еще раз.", reply_markup=get_cancel_kb())
+            await callback.answer("Произошла ошибка", show_alert=True)
         except:
             pass
         try:
@@ -516,23 +717,65 @@ async def process_email(message: Message, bot: Bot, state: FSMContext):
             pass
 
 
+# Повторная регистрация: пользователь оставляет прежние данные
+@router.callback_query(RegistrationStates.waiting_for_update, F.data == "registration_keep")
+async def keep_registration(callback: CallbackQuery, state: FSMContext):
+    """Завершает регистрацию без изменений: в канал ничего не отправляется"""
+    try:
+        logger.info('keep_registration: пользователь %s', callback.from_user.id)
+        await state.clear()
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(**screens.main_menu.as_kwargs())
+        await callback.answer("Данные регистрации не изменены")
+    except Exception as e:
+        logger.error(f'Ошибка в keep_registration: {e}', exc_info=True)
+        try:
+            await callback.answer("Произошла ошибка", show_alert=True)
+        except:
+            pass
+        try:
+            await state.clear()
+        except:
+            pass
+
+
+# Повторная регистрация: пользователь пишет текст вместо нажатия кнопки
+@router.message(RegistrationStates.waiting_for_update)
+async def remind_update_choice(message: Message, bot: Bot, state: FSMContext,
+                               duplicate_index: Optional[DuplicateIndex] = None):
+    """Повторяет вопрос об обновлении данных с кнопками или отменяет регистрацию"""
+    try:
+        logger.info('remind_update_choice: пользователь %s', message.from_user.id)
+        text = (message.text or '').strip()
+        if text.lower() in ['отменить', '❌ отменить', 'cancel']:
+            await cancel_registration_text(message, bot, state)
+            return
+        data = await state.get_data()
+        previous = duplicate_index.find(phone=data.get('client_phone'),
+                                        email=data.get('client_email')) if duplicate_index else None
+        if previous:
+            await ask_update_registration(message, state, previous)
+            return
+        await message.answer(**screens.duplicate_prompt.as_kwargs(
+            text="Выберите кнопкой ниже: обновить данные регистрации или оставить прежние."))
+    except Exception as e:
+        logger.error(f'Ошибка в remind_update_choice: {e}', exc_info=True)
+        try:
+            await state.clear()
+        except:
+            pass
+
+
 # Обработчик текстовой команды "Отменить" из ReplyKeyboard
 async def cancel_registration_text(message: Message, bot: Bot, state: FSMContext):
     """Обработчик отмены регистрации через текстовую команду"""
     try:
-        logger.info(f'cancel_registration_text: пользователь {message.from_user.id}')
+        logger.info('cancel_registration_text: пользователь %s', message.from_user.id)
         await state.clear()
         
-        await message.answer(
-            WELCOME_MESSAGE,
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode=ParseMode.HTML
-        )
-        await message.answer(
-            "Главное меню:",
-            reply_markup=get_main_menu_kb()
-        )
-        logger.info(f'Регистрация отменена пользователем {message.from_user.id}')
+        await message.answer(**screens.welcome_remove_kb.as_kwargs())
+        await message.answer(**screens.main_menu_short.as_kwargs())
+        logger.info('Регистрация отменена пользователем %s', message.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в cancel_registration_text: {e}', exc_info=True)
         try:
@@ -543,29 +786,17 @@ async def cancel_registration_text(message: Message, bot: Bot, state: FSMContext
 
 # Обработчик отмены регистрации
 @router.callback_query(F.data == "cancel_registration")
-async def cancel_registration(callback: CallbackQuery, bot: Bot, state: FSMContext):
+async def cancel_registration(callback: CallbackQuery, bot: Bot, state: FSMContext,
+                              message_cache: Optional[MessageCacheMiddleware] = None):
     """Обработчик отмены регистрации на конференцию"""
     try:
-        logger.info(f'cancel_registration: пользователь {callback.from_user.id}')
+        logger.info('cancel_registration: пользователь %s', callback.from_user.id)
         await state.clear()
         
-        try:
-            await callback.message.edit_text(
-                WELCOME_MESSAGE,
-                reply_markup=get_main_menu_kb(),
-                parse_mode=ParseMode.HTML
-            )
-        except Exception as edit_error:
-            # Если не удалось отредактировать, отправляем новое
-            logger.warning(f'Не удалось отредактировать сообщение при отмене, отправляем новое: {edit_error}')
-            await callback.message.answer(
-                WELCOME_MESSAGE,
-                reply_markup=get_main_menu_kb(),
-                parse_mode=ParseMode.HTML
-            )
+        await show_screen(callback.message, message_cache, **screens.main_menu.as_kwargs())
         
         await callback.answer("Регистрация отменена")
-        logger.info(f'Регистрация отменена пользователем {callback.from_user.id}')
+        logger.info('Регистрация отменена пользователем %s', callback.from_user.id)
     except Exception as e:
         logger.error(f'Ошибка в cancel_registration: {e}', exc_info=True)
         try:
@@ -590,6 +821,6 @@ async def echo(message: Message, bot: Bot, state: FSMContext):
             return
         
         # Игнорируем неизвестные сообщения
-        logger.debug(f'Неизвестное сообщение от пользователя {message.from_user.id}: {message.text}')
+        logger.debug('Неизвестное сообщение от пользователя %s: %s', message.from_user.id, message.text)
     except Exception as e:
         logger.error(e, exc_info=True)
@@ -1,25 +1,29 @@
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from data.project_data import CHANNEL_PARTNERROYAL_URL, ROYAL_CLINIC_SITE_URL, ROYAL_CLINIC_CHANNEL_URL
+from data.project_data import (CHANNEL_PARTNERROYAL_URL, REGISTRATION_BUTTON_TEXT, ROYAL_CLINIC_SITE_URL,
+                               ROYAL_CLINIC_CHANNEL_URL)
 
 
-def get_main_menu_kb() -> InlineKeyboardMarkup:
-    """Создает клавиатуру главного меню"""
+def get_main_menu_kb(registration_button: str = REGISTRATION_BUTTON_TEXT,
+                     channel_url: str = CHANNEL_PARTNERROYAL_URL,
+                     site_url: str = ROYAL_CLINIC_SITE_URL,
+                     clinic_channel_url: str = ROYAL_CLINIC_CHANNEL_URL) -> InlineKeyboardMarkup:
+    """Создает клавиатуру главного меню (тексты и ссылки - из data/content.json)"""
     kb_builder = InlineKeyboardBuilder()
     kb_builder.row(
         InlineKeyboardButton(text="🔸 Наш проект", callback_data="menu_project")
     )
     kb_builder.row(
-        InlineKeyboardButton(text="🔸 Регистрация на 14 марта", callback_data="menu_registration")
+        InlineKeyboardButton(text=registration_button, callback_data="menu_registration")
     )
     kb_builder.row(
-        InlineKeyboardButton(text="🔸 Подписаться на канал \"Объединяем компетенции\"", url=CHANNEL_PARTNERROYAL_URL)
+        InlineKeyboardButton(text="🔸 Подписаться на канал \"Объединяем компетенции\"", url=channel_url)
     )
     kb_builder.row(
-        InlineKeyboardButton(text="🔸 Перейти на сайт ROYAL CLINIC", url=ROYAL_CLINIC_SITE_URL)
+        InlineKeyboardButton(text="🔸 Перейти на сайт ROYAL CLINIC", url=site_url)
     )
     kb_builder.row(
-        InlineKeyboardButton(text="🔸 Подписаться на канал ROYAL CLINIC", url=ROYAL_CLINIC_CHANNEL_URL)
+        InlineKeyboardButton(text="🔸 Подписаться на канал ROYAL CLINIC", url=clinic_channel_url)
     )
     return kb_builder.as_markup()
 
@@ -48,6 +52,18 @@ def get_cancel_kb() -> InlineKeyboardMarkup:
     return kb_builder.as_markup()
 
 
+def get_duplicate_kb() -> InlineKeyboardMarkup:
+    """Создает клавиатуру для повторной регистрации: обновить данные или оставить прежние"""
+    kb_builder = InlineKeyboardBuilder()
+    kb_builder.row(
+        InlineKeyboardButton(text="✏️ Обновить данные", callback_data="registration_update")
+    )
+    kb_builder.row(
+        InlineKeyboardButton(text="✅ Оставить как есть", callback_data="registration_keep")
+    )
+    return kb_builder.as_markup()
+
+
 def get_phone_kb() -> ReplyKeyboardMarkup:
     """Создает клавиатуру с кнопкой поделиться телефоном"""
     kb_builder = ReplyKeyboardBuilder()
@@ -58,3 +74,13 @@ def get_phone_kb() -> ReplyKeyboardMarkup:
         KeyboardButton(text="❌ Отменить")
     )
     return kb_builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
+
+
+def get_media_collections_kb(collections: dict) -> InlineKeyboardMarkup:
+    """Создает клавиатуру выбора коллекции для добавления видео (для админа)"""
+    kb_builder = InlineKeyboardBuilder()
+    for name, title in collections.items():
+        kb_builder.row(
+            InlineKeyboardButton(text=f"➕ {title}", callback_data=f"media_add:{name}")
+        )
+    return kb_builder.as_markup()
@@ -0,0 +1,131 @@
+"""
+Готовые экраны: текст из data/content.json (services/content_store.py) + клавиатура.
+
+Экраны собираются при старте и заново при изменении текстов. Клавиатуры (неизменяемые
+pydantic-модели) хранятся вместе с уже сериализованным JSON, который сессия бота подставляет
+в запрос без повторного model_dump/json.dumps. При пересборке клавиатуры и экраны, входные
+данные которых не изменились, остаются прежними объектами.
+"""
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+import structlog
+from aiogram.enums import ParseMode
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+
+from keyboards.keyboards import get_cancel_kb, get_duplicate_kb, get_main_menu_kb, get_phone_kb, get_project_kb
+from services.content_store import DEFAULT_CONTENT, Content
+
+logger = structlog.get_logger(__name__)
+
+Markup = Union[InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove]
+
+REGISTRATION_START_TEXT = ("📝 Регистрация на конференцию \"Объединяем компетенции - искусство криоконсервации\"\n\n"
+                           "Пожалуйста, введите ваше ФИО:")
+
+
+def _strip_none(value: Any) -> Any:
+    # Так же, как BaseSession.prepare_value: поля со значением None в запрос не попадают
+    if isinstance(value, dict):
+        return {key: _strip_none(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_strip_none(item) for item in value if item is not None]
+    return value
+
+
+def serialize_markup(markup: Markup) -> str:
+    return json.dumps(_strip_none(markup.model_dump(warnings=False)))
+
+
+@dataclass(frozen=True)
+class Screen:
+    text: str
+    reply_markup: Optional[Markup] = None
+    parse_mode: Optional[str] = None
+
+    def as_kwargs(self, **overrides) -> Dict[str, Any]:
+        """Аргументы для message.answer / edit_text / bot.send_message"""
+        kwargs = {'text': self.text, 'reply_markup': self.reply_markup, 'parse_mode': self.parse_mode}
+        kwargs.update(overrides)
+        return kwargs
+
+
+class ScreenRegistry:
+    """Неизменяемый набор экранов, доступ по атрибуту: screens.main_menu"""
+
+    def __init__(self):
+        self._screens: Mapping[str, Screen] = MappingProxyType({})
+        self._serialized: Mapping[int, Tuple[Markup, str]] = MappingProxyType({})
+        self._markups: Dict[str, Markup] = {}
+        self._markup_inputs: Dict[str, Tuple] = {}
+
+    def _markup(self, name: str, factory: Callable[..., Markup], *inputs: Any) -> Markup:
+        """Клавиатура пересоздается, только если изменились ее входные данные"""
+        if name not in self._markups or self._markup_inputs[name] != inputs:
+            self._markups[name] = factory(*inputs)
+            self._markup_inputs[name] = inputs
+        return self._markups[name]
+
+    def build(self, content: Content = DEFAULT_CONTENT) -> List[str]:
+        """Собирает экраны из текстов content, возвращает имена новых и измененных экранов"""
+        main_menu_kb = self._markup('main_menu', get_main_menu_kb, content.registration_button,
+                                    content.channel_partnerroyal_url, content.royal_clinic_site_url,
+                                    content.royal_clinic_channel_url)
+        project_kb = self._markup('project', get_project_kb)
+        cancel_kb = self._markup('cancel', get_cancel_kb)
+        phone_kb = self._markup('phone', get_phone_kb)
+        duplicate_kb = self._markup('duplicate', get_duplicate_kb)
+        remove_kb = self._markup('remove', ReplyKeyboardRemove)
+        screens = {
+            'main_menu': Screen(content.welcome_message, main_menu_kb, ParseMode.HTML),
+            'main_menu_short': Screen("Главное меню:", main_menu_kb),
+            'welcome_remove_kb': Screen(content.welcome_message, remove_kb, ParseMode.HTML),
+            'project': Screen(content.project_description, project_kb, ParseMode.HTML),
+            'project_menu': Screen("🔸 Наш проект\n\nВыберите раздел:", project_kb),
+            'archive_unavailable': Screen("❌ Видео из архива временно недоступны.", project_kb),
+            'reviews_unavailable': Screen("❌ Видео с отзывами временно недоступны.", project_kb),
+            'registration_start': Screen(REGISTRATION_START_TEXT, cancel_kb, ParseMode.HTML),
+            'registration_success': Screen(content.registration_success_message, remove_kb, ParseMode.HTML),
+            # Экраны с динамическим текстом: клавиатура готовая, текст передается в as_kwargs(text=...)
+            'cancel_prompt': Screen("", cancel_kb),
+            'phone_prompt': Screen("", phone_kb),
+            'duplicate_prompt': Screen("", duplicate_kb, ParseMode.HTML),
+        }
+        changed = []
+        for name, screen in screens.items():
+            previous = self._screens.get(name)
+            # Клавиатуры сравниваются по объекту: неизменившаяся клавиатура - тот же объект
+            if (previous is not None and previous.text == screen.text and previous.parse_mode == screen.parse_mode
+                    and previous.reply_markup is screen.reply_markup):
+                screens[name] = previous
+            else:
+                changed.append(name)
+        # Храним сами объекты клавиатур: id() уникален, только пока объект жив
+        serialized = {id(markup): (markup, self.serialized_markup(markup) or serialize_markup(markup))
+                      for markup in self._markups.values()}
+        # Подмена целиком: обработчики видят либо старый набор экранов, либо новый
+        replaced = bool(self._screens)
+        self._screens = MappingProxyType(screens)
+        self._serialized = MappingProxyType(serialized)
+        if replaced and changed:
+            logger.info('Экраны пересобраны: %s', ', '.join(changed))
+        return changed
+
+    def __getattr__(self, name: str) -> Screen:
+        try:
+            return self._screens[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def serialized_markup(self, markup: Any) -> Optional[str]:
+        """Готовый JSON клавиатуры, если она из реестра экранов"""
+        entry = self._serialized.get(id(markup))
+        if entry is not None and entry[0] is markup:
+            return entry[1]
+        return None
+
+
+screens = ScreenRegistry()
+screens.build()
@@ -1,39 +1,431 @@
+import time
+
+STARTED = time.perf_counter()  # До остальных импортов: время импорта попадает в отчет о запуске
+
 import asyncio
+import multiprocessing
+import os
+import secrets
+import signal
+from contextlib import AsyncExitStack
+from dataclasses import replace
+from typing import Coroutine, Optional, Set
 
 import structlog
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
-from config_data.conf import conf
+from config_data import conf as settings
+from config_data.log_queue import log_queue
 from handlers import action_handlers, user_handlers
+from keyboards.screens import screens
+from middlewares.message_cache import MessageCacheMiddleware
+from middlewares.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from middlewares.rate_limiter import RateLimitMiddleware
+from middlewares.throttling import CallbackThrottleMiddleware
+from services.bot_session import create_session
+from services.catch_up import CatchUpReport, catch_up
+from services.content_store import content_store
+from services.dispatch_index import install_dispatch_index
+from services.duplicate_index import DuplicateIndex
+from services.group_digest import GroupDigest
+from services.outbox import RegistrationOutbox
+from services.registration_journal import RegistrationJournal
+from services.json_codec import get_codec
+from services.media_catalog import media_catalog
+from services.fsm_storage import InstrumentedStorage, create_storage, setup_storage_batching
+from services.metrics import metrics, start_metrics_server
+from services.startup_timer import StartupTimer
+from services.update_scheduler import UpdateScheduler
+from services.worker_pool import UpdateIntake, consume, create_update_queue
 
 logger = structlog.get_logger()
-bot: Bot = Bot(token=conf.tg_bot.token)
+bot: Optional[Bot] = None  # Создается в create_bot: импорт модуля не читает .env
+startup_timer = StartupTimer(STARTED)
+startup_timer.add('импорт', STARTED)
 
-async def main():
-    logger.info('Starting bot')
+ALLOWED_UPDATES = ["message", "my_chat_member", "chat_member", "callback_query"]
+
+# Ссылки на фоновые задачи запуска, чтобы их не собрал сборщик мусора
+background_tasks: Set[asyncio.Task] = set()
+
+
+def create_bot() -> Bot:
+    global bot
+    bot = Bot(token=settings.conf.tg_bot.token,
+              session=create_session(settings.conf.session, settings.conf.tg_bot.api_base_url))
+    return bot
+
+
+def run_in_background(coro: Coroutine) -> None:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def notify_admin(report: Optional[CatchUpReport] = None):
+    """Сообщение первому админу о запуске бота"""
+    try:
+        admins = settings.conf.tg_bot.admin_ids
+        if admins:
+            text = 'Бот запущен.'
+            if report and report.updates:
+                text += f'\nОчередь после перезапуска: {report}'
+            await bot.send_message(settings.conf.tg_bot.admin_ids[0], text)
+    except:
+        logger.critical(f'Не могу отправить сообщение', exc_info=True)
+
+
+async def process_backlog(dp: Dispatcher) -> Optional[CatchUpReport]:
+    """Снимает вебхук и обрабатывает накопившиеся апдейты либо сбрасывает их (CATCH_UP=false)"""
+    if not settings.conf.catch_up.enabled:
+        await bot.delete_webhook(drop_pending_updates=True)
+        return None
+    await bot.delete_webhook(drop_pending_updates=False)
+    return await catch_up(bot, dp, ALLOWED_UPDATES, settings.conf.catch_up.callback_ttl,
+                          dp.workflow_data.get('update_scheduler'))
+
+
+async def run_polling(dp: Dispatcher):
+    """Запуск в режиме long polling"""
+    # getMe нужен start_polling: запрашиваем заранее, параллельно с очередью апдейтов
+    report, _ = await asyncio.gather(
+        startup_timer.measure('очередь апдейтов', process_backlog(dp)),
+        startup_timer.measure('getMe', bot.me()),
+    )
+    # Сообщение админу не задерживает первый getUpdates
+    run_in_background(notify_admin(report))
+    logger.info('Бот готов принимать апдейты, %s', startup_timer.report())
+    # С планировщиком апдейты только ставятся в очередь шарда: задача на каждый апдейт не нужна,
+    # а при заполненной очереди getUpdates ждет
+    await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES,
+                           handle_as_tasks=not settings.conf.scheduler.enabled)
+
+
+async def run_webhook(dp: Dispatcher):
+    """Запуск в режиме webhook: aiohttp-сервер принимает апдейты от Telegram"""
+    webhook = settings.conf.webhook
+    if not webhook.base_url:
+        raise ValueError('Для BOT_MODE=webhook нужно указать WEBHOOK_BASE_URL')
+    secret = webhook.secret
+    if not secret:
+        # Без заданного секрета генерируем случайный на время жизни процесса.
+        # Для нескольких реплик за балансировщиком секрет нужно задать в .env
+        secret = secrets.token_urlsafe(32)
+        logger.warning('WEBHOOK_SECRET не задан, используется случайный секрет')
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+    ).register(app, path=webhook.path)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+
+    async def start_server():
+        await runner.setup()
+        site = web.TCPSite(runner, host=webhook.host, port=webhook.port)
+        await site.start()
+        logger.info(f'Web-сервер запущен на {webhook.host}:{webhook.port}')
+
+    # Web-сервер поднимается, пока забирается очередь за время простоя (через getUpdates, вебхук снят)
+    report, _, _ = await asyncio.gather(
+        startup_timer.measure('очередь апдейтов', process_backlog(dp)),
+        startup_timer.measure('web-сервер', start_server()),
+        startup_timer.measure('getMe', bot.me()),
+    )
+    with startup_timer.phase('setWebhook'):
+        await bot.set_webhook(
+            url=webhook.url,
+            secret_token=secret,
+            max_connections=webhook.max_connections,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=not settings.conf.catch_up.enabled,
+        )
+    logger.info(f'Webhook установлен: {webhook.url}, max_connections={webhook.max_connections}')
+    run_in_background(notify_admin(report))
+    logger.info('Бот готов принимать апдейты, %s', startup_timer.report())
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def prepare_db(engine, ready: asyncio.Event, retry_delay: float = 1.0, max_retry_delay: float = 60.0) -> None:
+    """
+    Создание таблиц в фоне: до его окончания регистрации копятся в очереди RegistrationWriter.
+    Если БД недоступна, попытки повторяются с нарастающей паузой, пока не получится
+    """
+    from database.db import init_db
+    with startup_timer.phase('БД'):
+        while True:
+            try:
+                await init_db(engine)
+                break
+            except Exception as e:
+                logger.critical('Не удалось подключиться к БД: %s. Повтор через %.0f с, регистрации ждут в очереди',
+                                e, retry_delay)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, max_retry_delay)
+    ready.set()
 
+
+def worker_path(path: str, worker: Optional[int]) -> str:
+    """Свой файл данных у каждого процесса-обработчика: data/outbox.sqlite3 -> data/outbox-0.sqlite3"""
+    if worker is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{worker}{ext}'
+
+
+async def setup_dispatcher(stack: AsyncExitStack, worker: Optional[int] = None) -> Dispatcher:
+    """
+    Хранилище FSM, роутеры, middlewares и фоновые службы.
+    Остановка служб регистрируется в stack. worker - номер процесса-обработчика при BOT_WORKERS > 0.
+    """
     # Создаем хранилище для FSM
-    storage = MemoryStorage()
+    codec = get_codec(settings.conf.session.json_codec)
+    logger.info(f'JSON-кодек: {codec.name}')
+    storage = create_storage(settings.conf.redis, codec=codec)
+    if settings.conf.metrics.enabled:
+        storage = InstrumentedStorage(storage, metrics.storage_duration)
     dp: Dispatcher = Dispatcher(storage=storage)
+    setup_storage_batching(dp)
     dp.include_router(action_handlers.router)
     dp.include_router(user_handlers.router)
-    
-    await bot.delete_webhook(drop_pending_updates=True)
+    # Обработчики кнопок и состояний FSM ищутся по словарю, а не перебором фильтров
+    if settings.conf.logic.dispatch_index:
+        install_dispatch_index(dp)
+
+    # Очередь исходящих запросов с учетом лимитов Telegram.
+    # Общие лимиты бота (всего и в канал) делятся между процессами-обработчиками
+    if settings.conf.rate_limit.enabled:
+        rate_limit = settings.conf.rate_limit
+        if worker is not None:
+            processes = settings.conf.workers.processes
+            rate_limit = replace(rate_limit, global_rate=rate_limit.global_rate / processes,
+                                 group_per_minute=rate_limit.group_per_minute / processes)
+        rate_limiter = RateLimitMiddleware(rate_limit)
+        bot.session.middleware(rate_limiter)
+        dp['rate_limiter'] = rate_limiter
+
+    # Повторные нажатия кнопок отбрасываются до обработчика
+    if settings.conf.throttle.enabled:
+        callback_throttle = CallbackThrottleMiddleware(settings.conf.throttle)
+        dp.callback_query.outer_middleware(callback_throttle)
+        dp['callback_throttle'] = callback_throttle
+
+    # Последнее сообщение бота в каждом чате: кнопки меню заранее выбирают правку, новое сообщение или пропуск
+    if settings.conf.logic.message_cache:
+        message_cache = MessageCacheMiddleware(settings.conf.logic.message_cache_size)
+        bot.session.middleware(message_cache)
+        dp['message_cache'] = message_cache
+
+    # Метрики: апдейты, обработчики, запросы к Bot API (после лимитера - без учета ожидания в очереди).
+    # У процессов-обработчиков свои порты: METRICS_PORT + 1 + номер
+    if settings.conf.metrics.enabled:
+        dp.update.outer_middleware(UpdateMetricsMiddleware(metrics))
+        handler_metrics = HandlerMetricsMiddleware(metrics)
+        handler_metrics.setup(action_handlers.router)
+        handler_metrics.setup(user_handlers.router)
+        bot.session.middleware(ApiMetricsMiddleware(metrics))
+        port = settings.conf.metrics.port if worker is None else settings.conf.metrics.port + 1 + worker
+        metrics_runner = await start_metrics_server(metrics, settings.conf.metrics.host, port,
+                                                    settings.conf.metrics.path)
+        stack.push_async_callback(metrics_runner.cleanup)
+
+    # Сводки регистраций в канал
+    group_digest = GroupDigest(
+        bot,
+        settings.conf.tg_bot.GROUP_ID,
+        window=settings.conf.digest.window,
+        max_items=settings.conf.digest.max_items,
+        csv_threshold=settings.conf.digest.csv_threshold,
+    )
+    group_digest.start()
+    stack.push_async_callback(group_digest.stop)
+    dp['group_digest'] = group_digest
+
+    # Регистрации сначала пишутся на диск, в канал их отправляет фоновая задача outbox.
+    # У каждого процесса-обработчика свой файл: одну запись не отправят два процесса
+    if settings.conf.outbox.enabled:
+        registration_outbox = RegistrationOutbox(
+            group_digest,
+            worker_path(settings.conf.outbox.path, worker),
+            retry_delay=settings.conf.outbox.retry_delay,
+            max_retry_delay=settings.conf.outbox.max_retry_delay,
+            keep_days=settings.conf.outbox.keep_days,
+            max_attempts=settings.conf.outbox.max_attempts,
+        )
+        await registration_outbox.start()
+        stack.push_async_callback(registration_outbox.stop)
+        dp['registration_outbox'] = registration_outbox
+
+    # Журнал регистраций для выгрузки /export
+    if settings.conf.journal.enabled:
+        journal_path = settings.conf.journal.path
+        registration_journal = RegistrationJournal(worker_path(journal_path, worker), journal_path)
+        registration_journal.open()
+        stack.callback(registration_journal.close)
+        dp['registration_journal'] = registration_journal
+        # Повторные регистрации: индекс строится по всем журналам, записи других процессов
+        # фоновая задача дочитывает в отдельном потоке
+        if settings.conf.journal.check_duplicates:
+            duplicate_index = DuplicateIndex(settings.conf.journal.path)
+            await asyncio.to_thread(duplicate_index.refresh)
+            logger.info('Индекс повторных регистраций: телефонов %d', len(duplicate_index))
+            dp['duplicate_index'] = duplicate_index
+            duplicate_refresher = asyncio.create_task(
+                duplicate_index.run_refresher(settings.conf.journal.duplicate_refresh_interval))
+            stack.callback(duplicate_refresher.cancel)
+
+    # Тексты и ссылки из data/content.json: при изменении файла экраны пересобираются без перезапуска.
+    # Проверяет файл каждый процесс, создает при первом запуске - один
+    content_store.subscribe(screens.build)
+    content_store.load(create=not worker)
+    if settings.conf.logic.content_reload_interval:
+        content_watcher = asyncio.create_task(
+            content_store.run_watcher(settings.conf.logic.content_reload_interval))
+        stack.callback(content_watcher.cancel)
+
+    # Каталог видео и фоновая проверка file_id (одна на все процессы).
+    # Изменения каталога из других процессов фоновая задача подхватывает по времени изменения файла
+    media_catalog.load()
+    if settings.conf.logic.media_reload_interval and worker is not None:
+        media_watcher = asyncio.create_task(media_catalog.run_watcher(settings.conf.logic.media_reload_interval))
+        stack.callback(media_watcher.cancel)
+    if settings.conf.logic.media_validate_interval and not worker:
+        media_validator = asyncio.create_task(
+            media_catalog.run_validator(bot, settings.conf.logic.media_validate_interval))
+        stack.callback(media_validator.cancel)
+
+    # Пул соединений с БД открывается один раз и передается в обработчики через workflow_data.
+    # SQLAlchemy импортируется, только если БД включена
+    if settings.conf.db.use_db:
+        from database.db import create_engine
+        from database.registration_writer import RegistrationWriter
+        engine = create_engine(settings.conf.db)
+        stack.push_async_callback(engine.dispose)
+        tables_ready = asyncio.Event()
+        run_in_background(prepare_db(engine, tables_ready))
+        registration_writer = RegistrationWriter(
+            engine,
+            batch_size=settings.conf.db.batch_size,
+            flush_interval=settings.conf.db.flush_interval,
+            ready=tables_ready,
+        )
+        registration_writer.start()
+        stack.push_async_callback(registration_writer.stop)
+        dp['registration_writer'] = registration_writer
+
+    # Апдейты одного чата по порядку, разных чатов - параллельно
+    if settings.conf.scheduler.enabled:
+        update_scheduler = UpdateScheduler(dp, shards=settings.conf.scheduler.shards,
+                                           queue_size=settings.conf.scheduler.queue_size)
+        update_scheduler.start()
+        stack.push_async_callback(update_scheduler.stop)
+        dp['update_scheduler'] = update_scheduler
+    return dp
 
+
+async def run_worker(index: int, update_queue) -> None:
+    """Процесс-обработчик: апдейты своего раздела очереди через все роутеры"""
+    structlog.contextvars.bind_contextvars(worker=index)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    create_bot()
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(bot.session.close)
+        stack.push_async_callback(update_queue.close)
+        dp = await setup_dispatcher(stack, worker=index)
+        logger.info('Воркер %d запущен', index)
+        await consume(bot, dp, update_queue, index, stop, settings.conf.workers.report_interval)
+    logger.info('Воркер %d остановлен', index)
+
+
+def worker_process(index: int, update_queue) -> None:
     try:
-        admins = conf.tg_bot.admin_ids
-        if admins:
-            await bot.send_message(
-                conf.tg_bot.admin_ids[0], f'Бот запущен.')
-    except:
-        logger.critical(f'Не могу отправить сообщение', exc_info=True)
+        asyncio.run(run_worker(index, update_queue))
+    finally:
+        log_queue.stop()
+
+
+async def run_worker_pool() -> None:
+    """Процесс приема апдейтов и BOT_WORKERS процессов-обработчиков"""
+    workers = settings.conf.workers
+    update_queue = create_update_queue(workers, settings.conf.redis.url)
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=worker_process, args=(index, update_queue), name=f'bot-worker-{index}')
+                 for index in range(workers.processes)]
+    for process in processes:
+        process.start()
+    logger.info('Запущено процессов-обработчиков: %d, очередь: %s', workers.processes, workers.queue)
+
+    intake = UpdateIntake(update_queue, workers.processes, bot.session.json_loads, bot.session.json_dumps)
+    run_in_background(intake.report(workers.report_interval))
+    try:
+        if settings.conf.webhook.use_webhook:
+            secret = settings.conf.webhook.secret or secrets.token_urlsafe(32)
+            app = web.Application()
+            app.router.add_post(settings.conf.webhook.path, intake.webhook_handler(secret))
+            runner = web.AppRunner(app)
+            await runner.setup()
+            webhook = settings.conf.webhook
+            await web.TCPSite(runner, host=webhook.host, port=webhook.port).start()
+            await bot.set_webhook(
+                url=settings.conf.webhook.url,
+                secret_token=secret,
+                max_connections=settings.conf.webhook.max_connections,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=not settings.conf.catch_up.enabled,
+            )
+            logger.info(f'Webhook установлен: {settings.conf.webhook.url}, прием апдейтов в очередь')
+            run_in_background(notify_admin())
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+        else:
+            # Накопившиеся за время простоя апдейты уходят воркерам вместе с новыми
+            await bot.delete_webhook(drop_pending_updates=not settings.conf.catch_up.enabled)
+            run_in_background(notify_admin())
+            logger.info('Прием апдейтов в очередь, %s', startup_timer.report())
+            await intake.poll(bot, ALLOWED_UPDATES)
+    finally:
+        await bot.session.close()
+        await update_queue.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=15)
+
+
+async def main():
+    create_bot()
+    logger.info('Starting bot')
+    if settings.conf.workers.processes:
+        await run_worker_pool()
+        return
 
-    await dp.start_polling(bot, allowed_updates=["message", "my_chat_member", "chat_member", "callback_query"])
+    preparing = time.perf_counter()
+    async with AsyncExitStack() as stack:
+        dp = await setup_dispatcher(stack)
+        startup_timer.add('подготовка', preparing)
+        if settings.conf.webhook.use_webhook:
+            await run_webhook(dp)
+        else:
+            await run_polling(dp)
 
 
 if __name__ == '__main__':
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        logger.info('Bot stopped!')
\ No newline at end of file
+        logger.info('Bot stopped!')
+    finally:
+        log_queue.stop()
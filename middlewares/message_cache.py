@@ -0,0 +1,209 @@
+"""
+Последнее сообщение бота в каждом чате: показать экран редактированием, новым сообщением или не трогать.
+
+Middleware сессии бота смотрит на результаты sendMessage/sendVideo/..., editMessage* и deleteMessage
+и запоминает для чата id последнего сообщения бота, его тип (text, video, photo, ...) и хэши
+текста и клавиатуры. По этой записи обработчик кнопки заранее знает, что делать с экраном:
+- edit - сообщение текстовое, содержимое другое;
+- send - сообщение с медиа, edit_text для него упадет с ошибкой;
+- skip - на экране уже то же самое, editMessageText вернул бы «message is not modified».
+Если чата нет в кэше (перезапуск, вытеснение) или кнопка нажата под старым сообщением,
+тип берется из самого сообщения callback, а правка выполняется как раньше, с отправкой
+нового сообщения при ошибке. Записи хранятся в OrderedDict, сверх max_size вытесняются давно
+не использованные чаты.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+import structlog
+from aiogram import Bot
+from aiogram.client.default import Default
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message
+
+from keyboards.screens import screens, serialize_markup
+
+logger = structlog.get_logger(__name__)
+
+EDIT = 'edit'
+SEND = 'send'
+SKIP = 'skip'
+
+# Запросы, результат которых - новое сообщение бота в чате
+SEND_METHODS = {
+    'sendMessage',
+    'sendVideo',
+    'sendPhoto',
+    'sendDocument',
+    'sendAnimation',
+    'sendAudio',
+    'sendVoice',
+    'sendSticker',
+    'sendMediaGroup',
+    'forwardMessage',
+}
+EDIT_METHODS = {
+    'editMessageText',
+    'editMessageCaption',
+    'editMessageMedia',
+    'editMessageReplyMarkup',
+}
+
+
+def text_hash(text: str, parse_mode: Optional[str]) -> int:
+    return hash((text, parse_mode))
+
+
+def markup_hash(markup: Any) -> int:
+    if markup is None:
+        return hash(None)
+    # У клавиатур из реестра экранов JSON уже готов
+    return hash(screens.serialized_markup(markup) or serialize_markup(markup))
+
+
+@dataclass(frozen=True)
+class CachedMessage:
+    message_id: int
+    kind: str  # content_type сообщения: text, video, photo, ...
+    text_hash: Optional[int] = None  # Только у текстовых сообщений
+    markup_hash: Optional[int] = None
+
+
+class MessageCacheMiddleware(BaseRequestMiddleware):
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._chats: OrderedDict[int, CachedMessage] = OrderedDict()
+        self.hits = 0  # Решение принято по кэшу
+        self.misses = 0  # Чата нет в кэше или кнопка под старым сообщением
+        self.skipped = 0  # Экран уже показан, запрос не отправлялся
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def get(self, chat_id: int) -> Optional[CachedMessage]:
+        cached = self._chats.get(chat_id)
+        if cached is not None:
+            self._chats.move_to_end(chat_id)
+        return cached
+
+    def remember(self, chat_id: int, cached: CachedMessage) -> None:
+        self._chats[chat_id] = cached
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_size:
+            self._chats.popitem(last=False)
+
+    def forget(self, chat_id: Any, message_id: Any) -> None:
+        cached = self._chats.get(chat_id)
+        if cached is not None and cached.message_id == message_id:
+            del self._chats[chat_id]
+
+    def choose(self, message: Message, text: str, reply_markup: Any = None,
+               parse_mode: Optional[str] = None) -> str:
+        """Как показать экран на месте сообщения бота message: EDIT, SEND или SKIP"""
+        cached = self.get(message.chat.id)
+        if cached is None or cached.message_id != message.message_id:
+            self.misses += 1
+            kind = getattr(message, 'content_type', None)  # У InaccessibleMessage типа нет
+            return EDIT if kind in (None, 'text') else SEND
+        self.hits += 1
+        if cached.kind != 'text':
+            return SEND
+        if cached.text_hash == text_hash(text, parse_mode) and cached.markup_hash == markup_hash(reply_markup):
+            self.skipped += 1
+            return SKIP
+        return EDIT
+
+    def stats(self) -> Dict[str, int]:
+        return {'chats': len(self._chats), 'hits': self.hits, 'misses': self.misses, 'skipped': self.skipped}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        api_method = method.__api_method__
+        if api_method not in SEND_METHODS and api_method not in EDIT_METHODS and api_method != 'deleteMessage':
+            return await make_request(bot, method)
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if api_method in EDIT_METHODS:
+                if 'message is not modified' in e.message:
+                    # Содержимое на экране совпадает с запросом
+                    self._edited(bot, method, None)
+                else:
+                    # Сообщение удалено или его нельзя редактировать: следующий показ - новым сообщением
+                    self.forget(method.chat_id, method.message_id)
+            raise
+        if api_method == 'deleteMessage':
+            self.forget(method.chat_id, method.message_id)
+        elif api_method in SEND_METHODS:
+            self._sent(bot, method, result[-1] if isinstance(result, list) else result)
+        elif isinstance(result, Message):  # Для inline-сообщений editMessage* возвращает True
+            self._edited(bot, method, result)
+        return result
+
+    def _sent(self, bot: Bot, method: TelegramMethod, message: Any) -> None:
+        if not isinstance(message, Message):
+            return
+        kind = message.content_type
+        if kind == 'text':
+            self.remember(message.chat.id, CachedMessage(
+                message.message_id, kind,
+                text_hash(method.text, self._parse_mode(bot, method)), markup_hash(method.reply_markup)))
+        else:
+            self.remember(message.chat.id, CachedMessage(message.message_id, kind))
+
+    def _edited(self, bot: Bot, method: TelegramMethod, message: Optional[Message]) -> None:
+        cached = self.get(method.chat_id)
+        if cached is None or cached.message_id != method.message_id:
+            return  # Правка старого сообщения: последнее сообщение чата не меняется
+        api_method = method.__api_method__
+        if api_method == 'editMessageText':
+            cached = CachedMessage(cached.message_id, 'text', text_hash(method.text, self._parse_mode(bot, method)),
+                                   markup_hash(method.reply_markup))
+        elif api_method == 'editMessageReplyMarkup':
+            cached = replace(cached, markup_hash=markup_hash(method.reply_markup))
+        elif message is not None:
+            cached = CachedMessage(cached.message_id, message.content_type)
+        self.remember(method.chat_id, cached)
+
+    @staticmethod
+    def _parse_mode(bot: Bot, method: TelegramMethod) -> Optional[str]:
+        parse_mode = method.parse_mode
+        if isinstance(parse_mode, Default):
+            return bot.default[parse_mode.name]
+        return parse_mode
+
+
+async def show_screen(message: Message, cache: Optional[MessageCacheMiddleware],
+                      delete_media: bool = False, **kwargs: Any) -> None:
+    """
+    Показывает экран (аргументы message.answer) на месте сообщения бота, под которым нажата кнопка.
+    delete_media - сообщение с медиа удалить, а не оставить выше нового
+    """
+    if cache is not None:
+        action = cache.choose(message, kwargs['text'], kwargs.get('reply_markup'), kwargs.get('parse_mode'))
+    else:
+        action = EDIT if getattr(message, 'content_type', 'text') == 'text' else SEND
+    if action == SKIP:
+        return
+    if action == EDIT:
+        try:
+            await message.edit_text(**kwargs)
+            return
+        except TelegramBadRequest as e:
+            if 'message is not modified' in e.message:
+                return
+            logger.warning('Не удалось отредактировать сообщение, отправляем новое: %s', e)
+    elif delete_media:
+        try:
+            await message.delete()
+        except Exception as e:
+            logger.warning('Не удалось удалить сообщение с медиа: %s', e)
+    await message.answer(**kwargs)
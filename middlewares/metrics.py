@@ -0,0 +1,107 @@
+"""
+Сбор метрик: апдейты диспетчера, обработчики, запросы к Bot API.
+
+- UpdateMetricsMiddleware - outer middleware на dp.update: время и исход каждого апдейта по типу.
+- HandlerMetricsMiddleware - inner middleware на событиях роутеров: в data уже есть
+  выбранный обработчик, метки - имя обработчика, тип апдейта и callback_data.
+- ApiMetricsMiddleware - middleware сессии бота: время и ошибки по методу Bot API.
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from aiogram import BaseMiddleware, Bot, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from services.metrics import BotMetrics
+
+# Ограничение числа разных callback_data в метках: данные приходят от клиента
+MAX_CALLBACK_LABELS = 100
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = 'unhandled' if result is UNHANDLED else 'handled'
+            return result
+        finally:
+            self.metrics.update_duration.observe(time.perf_counter() - start, update_type)
+            self.metrics.updates.inc(update_type, status)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+        self._callback_labels: Set[str] = set()
+
+    def _callback_label(self, event: TelegramObject) -> str:
+        if not isinstance(event, CallbackQuery) or event.data is None:
+            return ''
+        if event.data in self._callback_labels:
+            return event.data
+        if len(self._callback_labels) < MAX_CALLBACK_LABELS:
+            self._callback_labels.add(event.data)
+            return event.data
+        return 'other'
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_name = data['handler'].callback.__name__
+        update_type = data['event_update'].event_type
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.metrics.handler_errors.inc(handler_name, update_type, type(e).__name__)
+            raise
+        finally:
+            self.metrics.handler_duration.observe(
+                time.perf_counter() - start, handler_name, update_type, self._callback_label(event))
+
+    def setup(self, router: Router) -> None:
+        """Регистрирует middleware на всех событиях роутера"""
+        for event_name, observer in router.observers.items():
+            if event_name not in ('update', 'error'):
+                observer.middleware(self)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Регистрируется последней, чтобы не учитывать ожидание в очереди лимитера"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        api_method = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.api_errors.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            self.metrics.api_duration.observe(time.perf_counter() - start, api_method)
@@ -0,0 +1,178 @@
+"""
+Ограничение частоты исходящих запросов к Telegram Bot API.
+
+Middleware сессии бота: каждый отправляющий запрос (sendMessage, sendVideo, editMessageText, ...)
+сначала получает токен в бакете своего чата, затем в глобальном бакете.
+Если токена нет — запрос ждет своей очереди, а не падает с 429.
+На TelegramRetryAfter чат ставится на паузу на retry_after секунд и запрос повторяется.
+
+Лимиты Telegram: ~30 сообщений/с всего, 1 сообщение/с в личный чат, 20 сообщений/мин в группу.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Optional, Union
+
+import structlog
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config_data.conf import RateLimitConfig
+
+logger = structlog.get_logger(__name__)
+
+# Методы, на которые распространяются лимиты отправки.
+# deleteMessage в лимиты Telegram не входит: удаления не должны задерживать отправки
+LIMITED_METHODS = {
+    'sendMessage',
+    'sendVideo',
+    'sendPhoto',
+    'sendDocument',
+    'sendMediaGroup',
+    'copyMessage',
+    'forwardMessage',
+    'editMessageText',
+    'editMessageCaption',
+    'editMessageReplyMarkup',
+}
+
+
+class TokenBucket:
+    """
+    Бакет с резервированием: токены могут уйти в минус,
+    тогда reserve() возвращает, сколько ждать своей очереди.
+    Так ожидающие запросы обслуживаются строго по порядку поступления.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Токенов в секунду
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = asyncio.get_running_loop().time()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self) -> float:
+        """Забирает токен и возвращает задержку до момента, когда его можно использовать"""
+        now = asyncio.get_running_loop().time()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает отправку на seconds секунд (после ответа 429)"""
+        now = asyncio.get_running_loop().time()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def try_acquire(self) -> bool:
+        """Забирает токен, только если он есть сейчас, без резервирования"""
+        self._refill(asyncio.get_running_loop().time())
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_idle(self) -> bool:
+        self._refill(asyncio.get_running_loop().time())
+        return self.tokens >= self.capacity
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Планировщик исходящих запросов с глобальным и per-chat бакетами"""
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._waiting: Dict[Union[int, str], int] = defaultdict(int)
+        self._calls_since_prune = 0
+        self.stats_counters = {
+            'requests': 0,  # Запросов через лимитер
+            'delayed': 0,  # Запросов, которые ждали токен
+            'retry_after': 0,  # Получено ответов 429
+            'failed': 0,  # Запросов, не прошедших после всех повторов
+        }
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.config.private_rate, self.config.private_burst)
+            else:
+                bucket = TokenBucket(self.config.group_per_minute / 60, self.config.group_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self) -> None:
+        """Удаляет бакеты простаивающих чатов, чтобы словарь не рос бесконечно"""
+        self._calls_since_prune += 1
+        if self._calls_since_prune < 1000:
+            return
+        self._calls_since_prune = 0
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items()
+                        if bucket.is_idle() and not self._waiting.get(chat_id)]:
+            del self._chats[chat_id]
+
+    async def _acquire(self, chat_id: Union[int, str]) -> None:
+        if self._global is None:
+            self._global = TokenBucket(self.config.global_rate, self.config.global_rate)
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        delay_global = self._global.reserve()
+        if delay_global:
+            await asyncio.sleep(delay_global)
+        if delay or delay_global:
+            self.stats_counters['delayed'] += 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None or method.__api_method__ not in LIMITED_METHODS:
+            return await make_request(bot, method)
+
+        self.stats_counters['requests'] += 1
+        self._prune()
+        self._waiting[chat_id] += 1
+        try:
+            attempt = 0
+            while True:
+                await self._acquire(chat_id)
+                try:
+                    return await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    self.stats_counters['retry_after'] += 1
+                    attempt += 1
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                    if attempt > self.config.max_retries:
+                        self.stats_counters['failed'] += 1
+                        raise
+                    logger.warning(f'{method.__api_method__} в чат {chat_id}: flood control, '
+                                   f'повтор через {e.retry_after} с (попытка {attempt})')
+        finally:
+            self._waiting[chat_id] -= 1
+            if not self._waiting[chat_id]:
+                del self._waiting[chat_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика очереди: сколько запросов ждут сейчас, и накопленные счетчики"""
+        busiest = sorted(self._waiting.items(), key=lambda item: item[1], reverse=True)[:5]
+        return {
+            **self.stats_counters,
+            'queue_depth': sum(self._waiting.values()),
+            'chats_waiting': len(self._waiting),
+            'busiest_chats': busiest,
+            'chat_buckets': len(self._chats),
+        }
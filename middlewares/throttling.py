@@ -0,0 +1,145 @@
+"""
+Защита от повторных нажатий inline-кнопок.
+
+Outer middleware на dp.callback_query, до выбора обработчика:
+- duplicate - такой же callback (пользователь, callback_data) еще обрабатывается или завершился
+  меньше duplicate_window секунд назад. Планировщик апдейтов (services/update_scheduler.py)
+  обрабатывает апдейты чата по одному, поэтому повторное нажатие обычно ждет в очереди чата
+  и доходит сюда сразу после завершения первого - его отсекает окно после завершения;
+- cooldown - callback из cooldowns повторен раньше, чем через заданное число секунд
+  после завершения предыдущего (архив и отзывы заново отправляют все видео);
+- throttled - у пользователя кончились токены в бакете (rate нажатий/с, burst подряд).
+
+Отброшенный callback не доходит до обработчика, на него сразу отвечается answerCallbackQuery,
+чтобы у пользователя пропали «часики» на кнопке. Бакеты и время последних нажатий хранятся
+в TTLCache: записи старше ttl и сверх max_size вытесняются.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+import structlog
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from config_data.conf import ThrottleConfig
+from middlewares.metrics import MAX_CALLBACK_LABELS
+from middlewares.rate_limiter import TokenBucket
+
+logger = structlog.get_logger(__name__)
+
+# Ответы на отброшенные нажатия
+DROP_ANSWERS = {
+    'duplicate': '⏳ Уже загружаем, подождите',
+    'cooldown': '✅ Уже отправлено выше',
+    'throttled': '⏳ Слишком часто, подождите немного',
+}
+
+
+class TTLCache:
+    """Словарь с ограничением размера и временем жизни записей (время последней записи)"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item[0] > self.ttl:
+            del self._items[key]
+            return None
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        self._items[key] = (now, value)
+        self._items.move_to_end(key)
+        # Записи упорядочены по времени записи: устаревшие и лишние - в начале
+        while self._items:
+            oldest_key, (written, _) = next(iter(self._items.items()))
+            if now - written <= self.ttl and len(self._items) <= self.max_size:
+                break
+            del self._items[oldest_key]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class CallbackThrottleMiddleware(BaseMiddleware):
+    def __init__(self, config: ThrottleConfig):
+        self.config = config
+        self._buckets = TTLCache(config.cache_ttl, config.cache_size)
+        self._finished = TTLCache(config.cache_ttl, config.cache_size)
+        self._in_flight: Set[Tuple[int, str]] = set()
+        self.stats_counters = {
+            'passed': 0,  # Дошло до обработчика
+            'duplicate': 0,  # Отброшено: такой же callback еще обрабатывается или только что обработан
+            'cooldown': 0,  # Отброшено: повтор раньше паузы для этой кнопки
+            'throttled': 0,  # Отброшено: слишком частые нажатия пользователя
+        }
+        self.dropped_by_data: Dict[str, int] = {}
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.config.rate, self.config.burst)
+        # Перезапись продлевает жизнь бакета активного пользователя
+        self._buckets.set(user_id, bucket)
+        return bucket
+
+    def _drop_reason(self, key: Tuple[int, str]) -> Optional[str]:
+        if key in self._in_flight:
+            return 'duplicate'
+        finished = self._finished.get(key)
+        if finished is not None:
+            elapsed = time.monotonic() - finished
+            if elapsed < self.config.duplicate_window:
+                return 'duplicate'
+            if elapsed < self.config.cooldowns.get(key[1], 0):
+                return 'cooldown'
+        if not self._bucket(key[0]).try_acquire():
+            return 'throttled'
+        return None
+
+    async def _drop(self, event: CallbackQuery, reason: str) -> None:
+        self.stats_counters[reason] += 1
+        label = event.data if event.data in self.dropped_by_data or \
+            len(self.dropped_by_data) < MAX_CALLBACK_LABELS else 'other'
+        self.dropped_by_data[label] = self.dropped_by_data.get(label, 0) + 1
+        logger.debug('Нажатие %s пользователя %s отброшено: %s', event.data, event.from_user.id, reason)
+        try:
+            await event.answer(DROP_ANSWERS[reason])
+        except Exception as e:
+            logger.debug('Не удалось ответить на отброшенное нажатие: %s', e)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = (event.from_user.id, event.data or '')
+        reason = self._drop_reason(key)
+        if reason:
+            await self._drop(event, reason)
+            return None
+
+        self.stats_counters['passed'] += 1
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+            self._finished.set(key, time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        top = sorted(self.dropped_by_data.items(), key=lambda item: item[1], reverse=True)[:5]
+        return {
+            **self.stats_counters,
+            'in_flight': len(self._in_flight),
+            'users_tracked': len(self._buckets),
+            'top_dropped': top,
+        }
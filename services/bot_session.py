@@ -0,0 +1,161 @@
+"""
+HTTP-сессия бота
+"""
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import InputFile
+from aiohttp import ClientSession, FormData, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+from config_data.conf import SessionConfig
+from keyboards.screens import screens
+from services.json_codec import get_codec
+
+
+class PoolStats:
+    """Загрузка пула соединений по событиям aiohttp TraceConfig"""
+
+    def __init__(self):
+        self.in_flight = 0  # Запросов выполняется сейчас
+        self.max_in_flight = 0
+        self.requests = 0
+        self.created = 0  # Открыто новых соединений
+        self.reused = 0  # Взято готовых keep-alive соединений
+        self.queued = 0  # Запросов ждали свободного соединения (пул занят)
+        self.waiting = 0  # Ждут сейчас
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def trace_config(self) -> TraceConfig:
+        trace = TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_end.append(self._on_request_done)
+        trace.on_request_exception.append(self._on_request_done)
+        trace.on_connection_queued_start.append(self._on_queued_start)
+        trace.on_connection_queued_end.append(self._on_queued_end)
+        trace.on_connection_create_end.append(self._on_create_end)
+        trace.on_connection_reuseconn.append(self._on_reuse)
+        return trace
+
+    async def _on_request_start(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    async def _on_request_done(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        self.in_flight -= 1
+
+    async def _on_queued_start(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        ctx.queued_at = time.perf_counter()
+        self.queued += 1
+        self.waiting += 1
+
+    async def _on_queued_end(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        wait = time.perf_counter() - ctx.queued_at
+        self.waiting -= 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    async def _on_create_end(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        self.created += 1
+
+    async def _on_reuse(self, session: ClientSession, ctx: SimpleNamespace, params: Any) -> None:
+        self.reused += 1
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'requests': self.requests,
+            'created': self.created,
+            'reused': self.reused,
+            'queued': self.queued,
+            'waiting': self.waiting,
+            'wait_avg_ms': self.wait_total / self.queued * 1000 if self.queued else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+
+class ClinicSession(AiohttpSession):
+    """
+    AiohttpSession, которая подставляет в запрос заранее сериализованные
+    клавиатуры из реестра экранов вместо model_dump + json.dumps на каждый вызов.
+
+    Пул соединений настраивается из SessionConfig: лимиты, keep-alive, кеш DNS,
+    таймауты по методам Bot API. Загрузка пула считается в pool_stats.
+    JSON запросов и ответов (в том числе апдейтов getUpdates и webhook) - через json_codec.
+    """
+
+    def __init__(self, config: Optional[SessionConfig] = None, **kwargs: Any):
+        config = config or SessionConfig()
+        codec = get_codec(config.json_codec)
+        kwargs.setdefault('json_loads', codec.loads)
+        kwargs.setdefault('json_dumps', codec.dumps)
+        super().__init__(limit=config.pool_limit, timeout=config.timeout, **kwargs)
+        self._connector_init.update(
+            limit_per_host=config.pool_limit_per_host,
+            keepalive_timeout=config.keepalive_timeout,
+            ttl_dns_cache=config.dns_cache_ttl,
+        )
+        self.method_timeouts = dict(config.method_timeouts)
+        self.pool_stats = PoolStats()
+
+    async def create_session(self) -> ClientSession:
+        # Как AiohttpSession.create_session, но с TraceConfig для статистики пула
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={
+                    USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}",
+                },
+                trace_configs=[self.pool_stats.trace_config()],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        if timeout is None:
+            timeout = self.method_timeouts.get(method.__api_method__)
+        return await super().make_request(bot, method, timeout=timeout)
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod[TelegramType]) -> FormData:
+        markup_json = screens.serialized_markup(getattr(method, 'reply_markup', None))
+        if markup_json is None:
+            return super().build_form_data(bot, method)
+
+        form = FormData(quote_fields=False)
+        files: Dict[str, InputFile] = {}
+        for key, value in method.model_dump(warnings=False, exclude={'reply_markup'}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field('reply_markup', markup_json)
+        for key, value in files.items():
+            form.add_field(
+                key,
+                value.read(bot),
+                filename=value.filename or key,
+            )
+        return form
+
+
+def create_session(config: Optional[SessionConfig] = None, api_base_url: str = '') -> ClinicSession:
+    """Сессия бота. api_base_url - другой сервер Bot API (локальный Bot API или эмулятор)"""
+    if api_base_url:
+        return ClinicSession(config, api=TelegramAPIServer.from_base(api_base_url))
+    return ClinicSession(config)
@@ -0,0 +1,99 @@
+"""
+Обработка апдейтов, накопившихся, пока бот был выключен.
+
+Вместо drop_pending_updates бот при старте забирает очередь через getUpdates пачками по 100
+и передает апдейты в dp.feed_update. С планировщиком апдейтов (services/update_scheduler.py)
+они обрабатываются параллельно по чатам с сохранением порядка внутри чата.
+
+У callback_query нет даты нажатия. Если после нажатия в той же пачке есть апдейт с датой
+(сообщение, chat_member), нажатие было не позже него. Когда и этот апдейт старше callback_ttl,
+ответить на нажатие уже нельзя (Telegram вернет «query is too old»), и оно пропускается
+без вызова обработчика.
+"""
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import structlog
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from services.update_scheduler import UpdateScheduler
+
+logger = structlog.get_logger(__name__)
+
+BATCH_SIZE = 100  # Максимум апдейтов в ответе getUpdates
+
+
+@dataclass
+class CatchUpReport:
+    updates: int = 0  # Апдейтов в очереди при старте
+    skipped_callbacks: int = 0  # Пропущено устаревших нажатий кнопок
+    batches: int = 0  # Запросов getUpdates
+    oldest_age: float = 0.0  # Возраст самого старого апдейта с датой, сек
+    duration: float = 0.0  # Время от первого getUpdates до обработки последнего апдейта, сек
+
+    def __str__(self) -> str:
+        return (f'апдейтов {self.updates} (пачек {self.batches}), пропущено устаревших нажатий '
+                f'{self.skipped_callbacks}, самому старому {self.oldest_age:.0f} с, '
+                f'обработано за {self.duration:.1f} с')
+
+
+def update_time(update: Update) -> Optional[float]:
+    """Время апдейта (unix time), если оно есть"""
+    event = update.message or update.edited_message or update.chat_member or update.my_chat_member
+    return event.date.timestamp() if event else None
+
+
+def stale_callbacks(updates: List[Update], callback_ttl: float, now: float) -> List[bool]:
+    """Для каждого апдейта пачки: True - устаревшее нажатие кнопки"""
+    result = [False] * len(updates)
+    next_date: Optional[float] = None
+    # Идем с конца: для нажатия нужна дата ближайшего следующего апдейта
+    for index in range(len(updates) - 1, -1, -1):
+        update = updates[index]
+        date = update_time(update)
+        if date is not None:
+            next_date = date
+        elif update.callback_query and next_date is not None:
+            result[index] = now - next_date > callback_ttl
+    return result
+
+
+async def catch_up(bot: Bot, dp: Dispatcher, allowed_updates: List[str], callback_ttl: float,
+                   scheduler: Optional[UpdateScheduler] = None) -> CatchUpReport:
+    """
+    Забирает и обрабатывает очередь апдейтов. Вебхук должен быть снят (deleteWebhook без drop_pending_updates).
+    После возврата все полученные апдейты подтверждены, polling или вебхук продолжают с новых.
+    """
+    report = CatchUpReport()
+    started = time.perf_counter()
+    offset: Optional[int] = None
+    while True:
+        updates = await bot.get_updates(offset=offset, limit=BATCH_SIZE, timeout=0,
+                                        allowed_updates=allowed_updates)
+        report.batches += 1
+        if not updates:
+            # Этот запрос с offset подтвердил последнюю пачку
+            break
+        now = time.time()
+        if report.updates == 0:
+            first_date = next((date for date in map(update_time, updates) if date), None)
+            if first_date:
+                report.oldest_age = now - first_date
+        report.updates += len(updates)
+        for update, stale in zip(updates, stale_callbacks(updates, callback_ttl, now)):
+            if stale:
+                report.skipped_callbacks += 1
+                continue
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                logger.exception('Ошибка обработки апдейта %s из очереди', update.update_id)
+        offset = updates[-1].update_id + 1
+    if scheduler:
+        await scheduler.join()
+    report.duration = time.perf_counter() - started
+    if report.updates:
+        logger.info('Очередь апдейтов после перезапуска: %s', report)
+    return report
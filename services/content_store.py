@@ -0,0 +1,131 @@
+"""
+Тексты и ссылки бота из data/content.json с обновлением без перезапуска.
+
+Содержимое файла загружается в неизменяемый снимок Content; обработчики и экраны читают его
+из памяти. Фоновая задача раз в interval секунд сравнивает время изменения и размер файла
+и при изменении читает его заново: новый снимок подменяет старый целиком, после чего
+вызываются подписчики (реестр экранов пересобирает только затронутые экраны).
+Файл с ошибкой не применяется - остается прежний снимок. Ключи, которых нет в файле,
+берутся из data/project_data.py; при первом запуске файл создается из этих значений.
+"""
+import asyncio
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import structlog
+
+from config_data.conf import BASE_DIR
+from data.project_data import (
+    CHANNEL_PARTNERROYAL_URL,
+    PROJECT_DESCRIPTION,
+    REGISTRATION_BUTTON_TEXT,
+    REGISTRATION_SUCCESS_MESSAGE,
+    ROYAL_CLINIC_CHANNEL_URL,
+    ROYAL_CLINIC_SITE_URL,
+    WELCOME_MESSAGE,
+)
+
+logger = structlog.get_logger(__name__)
+
+CONTENT_PATH = BASE_DIR / 'data' / 'content.json'
+
+
+@dataclass(frozen=True)
+class Content:
+    welcome_message: str = WELCOME_MESSAGE
+    project_description: str = PROJECT_DESCRIPTION
+    registration_success_message: str = REGISTRATION_SUCCESS_MESSAGE
+    registration_button: str = REGISTRATION_BUTTON_TEXT  # Кнопка регистрации в главном меню
+    channel_partnerroyal_url: str = CHANNEL_PARTNERROYAL_URL
+    royal_clinic_site_url: str = ROYAL_CLINIC_SITE_URL
+    royal_clinic_channel_url: str = ROYAL_CLINIC_CHANNEL_URL
+
+
+DEFAULT_CONTENT = Content()
+FIELDS = tuple(field.name for field in dataclasses.fields(Content))
+
+
+def parse_content(data: dict) -> Content:
+    """Снимок из JSON. ValueError, если значение не строка или пустое"""
+    if not isinstance(data, dict):
+        raise ValueError('ожидается объект JSON')
+    unknown = sorted(set(data) - set(FIELDS))
+    if unknown:
+        logger.warning('data/content.json: неизвестные ключи пропущены: %s', ', '.join(unknown))
+    values = {name: data[name] for name in FIELDS if name in data}
+    for name, value in values.items():
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'{name}: ожидается непустая строка')
+    return Content(**values)
+
+
+class ContentStore:
+    def __init__(self, path=CONTENT_PATH):
+        self.path = path
+        self.snapshot: Content = DEFAULT_CONTENT
+        self._signature: Optional[Tuple[int, int]] = None  # Время изменения и размер прочитанного файла
+        self._listeners: List[Callable[[Content], object]] = []
+        self.reloads = 0
+
+    def subscribe(self, listener: Callable[[Content], object]) -> None:
+        """listener(content) вызывается после каждой подмены снимка"""
+        self._listeners.append(listener)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, create: bool = False) -> None:
+        """Первая загрузка. create - записать файл из значений по умолчанию, если его нет"""
+        if create and not os.path.exists(self.path):
+            self._save(DEFAULT_CONTENT)
+            logger.info(f'Файл текстов создан из project_data: {self.path}')
+        self.reload()
+
+    def _save(self, content: Content) -> None:
+        # Пишем во временный файл и подменяем, чтобы не оставить битый JSON
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(dataclasses.asdict(content), file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reload(self) -> bool:
+        """Читает файл, если он изменился. True, если снимок подменен"""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                content = parse_content(json.load(file))
+        except (OSError, ValueError) as e:
+            # Файл с ошибкой (в том числе недописанный) не применяем: повтор после следующего изменения
+            logger.error('Не удалось загрузить тексты из %s: %s. Остаются прежние', self.path, e)
+            return False
+        if content == self.snapshot:
+            return False
+        changed = [name for name in FIELDS if getattr(content, name) != getattr(self.snapshot, name)]
+        self.snapshot = content
+        self.reloads += 1
+        logger.info('Тексты загружены из %s, изменены: %s', self.path, ', '.join(changed))
+        for listener in self._listeners:
+            try:
+                listener(content)
+            except Exception:
+                logger.exception('Ошибка подписчика обновления текстов')
+        return True
+
+    async def run_watcher(self, interval: float) -> None:
+        """Фоновая проверка изменений файла"""
+        while True:
+            await asyncio.sleep(interval)
+            self.reload()
+
+
+content_store = ContentStore()
@@ -0,0 +1,149 @@
+"""
+Индекс обработчиков роутеров: кнопки и состояния FSM находятся по словарю, без перебора фильтров.
+
+aiogram проверяет обработчики события по очереди и для каждого вычисляет фильтры, поэтому
+нажатие последней кнопки меню проверяет F.data == "..." всех кнопок перед ней. Для фильтров
+F.data == "строка" (callback_query) и фильтров состояния (RegistrationStates.waiting_for_name)
+результат зависит только от callback_data и состояния, поэтому план строится один раз:
+(callback_data, состояние) -> обработчики-кандидаты в порядке регистрации.
+Остальные фильтры кандидатов (Command, F.contact, F.data.startswith) проверяются как обычно,
+вызывается первый подошедший обработчик - так же, как в aiogram. Обработчики без индексируемых
+фильтров входят в каждый план на своем месте.
+
+Синхронные фильтры aiogram вызывает через asyncio.to_thread (десятки микросекунд на фильтр),
+поэтому оставшиеся магические фильтры F.* индекс вычисляет без перехода в поток.
+"""
+import operator
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters import StateFilter
+from aiogram.fsm.state import State
+from aiogram.types import TelegramObject
+from magic_filter.operations import ComparatorOperation, GetAttributeOperation
+
+logger = structlog.get_logger(__name__)
+
+Candidate = Tuple[HandlerObject, List[FilterObject]]  # Обработчик и фильтры, которые проверяются при вызове
+
+
+def exact_data(filter_: FilterObject) -> Optional[str]:
+    """Значение из фильтра F.data == 'строка'"""
+    operations = getattr(filter_.magic, '_operations', ())
+    if (len(operations) == 2
+            and isinstance(operations[0], GetAttributeOperation) and operations[0].name == 'data'
+            and isinstance(operations[1], ComparatorOperation) and operations[1].comparator is operator.eq
+            and isinstance(operations[1].right, str)):
+        return operations[1].right
+    return None
+
+
+def exact_state(filter_: FilterObject) -> Optional[str]:
+    """Состояние из фильтра State или StateFilter с одним состоянием (кроме «любого» и «без состояния»)"""
+    state = filter_.callback
+    if isinstance(state, StateFilter) and len(state.states) == 1:
+        state = state.states[0]
+    if isinstance(state, State):
+        state = state.state
+    if isinstance(state, str) and state != '*':
+        return state
+    return None
+
+
+class ObserverIndex:
+    """Подменяет trigger одного observer: кандидаты берутся из плана по (callback_data, состоянию)"""
+
+    def __init__(self, observer: TelegramEventObserver):
+        self.observer = observer
+        self._size = -1
+        self.data_keys: frozenset = frozenset()
+        self.state_keys: frozenset = frozenset()
+        self._plans: Dict[Tuple[Optional[str], Optional[str]], List[Candidate]] = {}
+
+    def build(self) -> None:
+        """План на каждое сочетание известных callback_data и состояния (None - любое другое значение)"""
+        entries = []
+        for handler in self.observer.handlers:
+            data = state = None
+            rest = []
+            for filter_ in handler.filters or ():
+                filter_data = exact_data(filter_) if self.observer.event_name == 'callback_query' else None
+                filter_state = exact_state(filter_)
+                if data is None and filter_data is not None:
+                    data = filter_data
+                elif state is None and filter_state is not None:
+                    state = filter_state
+                else:
+                    rest.append(filter_)
+            entries.append((handler, rest, data, state))
+        self.data_keys = frozenset(data for _, _, data, _ in entries if data is not None)
+        self.state_keys = frozenset(state for _, _, _, state in entries if state is not None)
+        self._plans = {
+            (data_key, state_key): [(handler, rest) for handler, rest, data, state in entries
+                                    if data in (None, data_key) and state in (None, state_key)]
+            for data_key in (*self.data_keys, None)
+            for state_key in (*self.state_keys, None)
+        }
+        self._size = len(self.observer.handlers)
+
+    def plan(self, event: TelegramObject, raw_state: Optional[str]) -> List[Candidate]:
+        if self._size != len(self.observer.handlers):
+            # Обработчик зарегистрирован после установки индекса
+            self.build()
+        data = getattr(event, 'data', None) if self.data_keys else None
+        return self._plans[(data if data in self.data_keys else None,
+                            raw_state if raw_state in self.state_keys else None)]
+
+    async def trigger(self, event: TelegramObject, **kwargs: Any) -> Any:
+        # Как TelegramEventObserver.trigger, но только по кандидатам из плана
+        for handler, filters in self.plan(event, kwargs.get('raw_state')):
+            kwargs['handler'] = handler
+            result, data = await check(filters, event, kwargs)
+            if result:
+                kwargs.update(data)
+                try:
+                    wrapped_inner = self.observer.outer_middleware.wrap_middlewares(
+                        self.observer._resolve_middlewares(),
+                        handler.call,
+                    )
+                    return await wrapped_inner(event, kwargs)
+                except SkipHandler:
+                    continue
+        return UNHANDLED
+
+
+async def check(filters: List[FilterObject], event: TelegramObject,
+                kwargs: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+    # Как HandlerObject.check, но по оставшимся фильтрам. Магические фильтры (F.contact, F.data.startswith)
+    # вычисляются на месте: FilterObject.call выполняет синхронный фильтр через asyncio.to_thread
+    kwargs = dict(kwargs)
+    for filter_ in filters:
+        if filter_.magic is not None:
+            result = filter_.magic.resolve(event)
+        else:
+            result = await filter_.call(event, **kwargs)
+        if not result:
+            return False, kwargs
+        if isinstance(result, dict):
+            kwargs.update(result)
+    return True, kwargs
+
+
+def install_dispatch_index(router: Router) -> List[ObserverIndex]:
+    """Индексирует observers роутера и вложенных роутеров, где есть кнопки или состояния"""
+    indexes = []
+    for child in router.chain_tail:
+        for name, observer in child.observers.items():
+            index = ObserverIndex(observer)
+            index.build()
+            if not index.data_keys and not index.state_keys:
+                continue
+            observer.trigger = index.trigger
+            indexes.append(index)
+            logger.debug('Индекс обработчиков %s.%s: кнопок %d, состояний %d',
+                         child.name, name, len(index.data_keys), len(index.state_keys))
+    return indexes
@@ -0,0 +1,87 @@
+"""
+Поиск повторной регистрации по телефону и email.
+
+Индекс в памяти: нормализованный телефон -> последняя регистрация и email в нижнем регистре ->
+последняя регистрация, поиск - обращение к словарю. При старте индекс строится по журналам
+регистраций (services/registration_journal.py). Регистрации своего процесса добавляются сразу,
+записанные другими процессами-обработчиками - фоновой задачей: раз в interval секунд она в отдельном
+потоке дочитывает только новые строки журналов. Поиск файлы не трогает.
+"""
+import asyncio
+import os
+import re
+from typing import Dict, Optional
+
+import structlog
+
+from services.group_digest import RegistrationNotice
+from services.registration_journal import journal_paths, load_record
+
+logger = structlog.get_logger(__name__)
+
+
+def phone_key(phone: str) -> str:
+    """+7 (999) 123-45-67, 79991234567 и 8 999 123 45 67 дают один ключ"""
+    digits = re.sub(r'[^\d+]', '', phone).lstrip('+')
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+
+def email_key(email: str) -> str:
+    return email.strip().lower()
+
+
+class DuplicateIndex:
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._phones: Dict[str, RegistrationNotice] = {}
+        self._emails: Dict[str, RegistrationNotice] = {}
+        self._offsets: Dict[str, int] = {}  # Сколько байт каждого журнала уже в индексе
+
+    def __len__(self) -> int:
+        return len(self._phones)
+
+    def add(self, notice: RegistrationNotice) -> None:
+        self._phones[phone_key(notice.phone)] = notice
+        self._emails[email_key(notice.email)] = notice
+
+    def refresh(self) -> int:
+        """Добавляет в индекс записи, дописанные в журналы с прошлого вызова. Возвращает их число"""
+        added = 0
+        for path in journal_paths(self.journal_path):
+            offset = self._offsets.get(path, 0)
+            if os.path.getsize(path) <= offset:
+                continue
+            with open(path, 'rb') as file:
+                file.seek(offset)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break  # Запись еще дописывается, прочитаем в следующий раз
+                    offset += len(line)
+                    try:
+                        self.add(load_record(line))
+                        added += 1
+                    except ValueError:
+                        continue
+            self._offsets[path] = offset
+        return added
+
+    async def run_refresher(self, interval: float) -> None:
+        """Фоновое чтение журналов других процессов"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except OSError as e:
+                logger.error('Не удалось дочитать журналы регистраций: %s', e)
+
+    def find(self, phone: Optional[str] = None, email: Optional[str] = None) -> Optional[RegistrationNotice]:
+        """Последняя регистрация с этим телефоном или email"""
+        if phone:
+            notice = self._phones.get(phone_key(phone))
+            if notice:
+                return notice
+        if email:
+            return self._emails.get(email_key(email))
+        return None
@@ -0,0 +1,233 @@
+"""
+Хранилище FSM в Redis.
+
+Состояние регистрации (RegistrationStates, client_name, client_phone) хранится в Redis,
+поэтому переживает рестарт и доступно нескольким репликам бота.
+
+В рамках одного апдейта чтение состояния и данных выполняется одним MGET,
+а все изменения (set_state / update_data / clear) копятся и записываются
+одним pipeline после обработчика. Итого один запрос на чтение и не больше
+одного на запись за шаг регистрации вместо 4-5 отдельных запросов.
+"""
+import contextvars
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import structlog
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+from redis.asyncio.client import Redis
+
+from config_data.conf import RedisConfig
+from services.json_codec import JsonCodec, STDLIB_CODEC
+from services.metrics import Histogram
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class _BatchEntry:
+    """Снимок состояния и данных одного ключа FSM в рамках апдейта"""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    state_dirty: bool = False
+    data_dirty: bool = False
+
+
+_batch: contextvars.ContextVar[Optional[Dict[StorageKey, _BatchEntry]]] = contextvars.ContextVar(
+    'fsm_batch', default=None
+)
+
+
+def in_batch() -> bool:
+    """Идет апдейт с batch: операции FSM обслуживаются из памяти, Redis - только MGET и pipeline"""
+    return _batch.get() is not None
+
+
+class BatchedRedisStorage(RedisStorage):
+    """RedisStorage с чтением одним MGET и отложенной записью одним pipeline"""
+
+    histogram: Optional[Histogram] = None  # Время запросов batch к Redis (mget, pipeline), задает InstrumentedStorage
+
+    def _observe(self, start: float, operation: str) -> None:
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - start, operation)
+
+    @asynccontextmanager
+    async def batch(self):
+        """Контекст одного апдейта: все изменения FSM пишутся в Redis при выходе"""
+        if _batch.get() is not None:
+            yield
+            return
+        token = _batch.set({})
+        try:
+            yield
+        finally:
+            entries = _batch.get()
+            _batch.reset(token)
+            await self._flush(entries)
+
+    async def _load(self, key: StorageKey) -> _BatchEntry:
+        entries = _batch.get()
+        entry = entries.get(key)
+        if entry is None:
+            state_key = self.key_builder.build(key, 'state')
+            data_key = self.key_builder.build(key, 'data')
+            start = time.perf_counter()
+            try:
+                state, data = await self.redis.mget(state_key, data_key)
+            finally:
+                self._observe(start, 'mget')
+            if isinstance(state, bytes):
+                state = state.decode('utf-8')
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
+            entry = _BatchEntry(state=state, data=self.json_loads(data) if data else {})
+            entries[key] = entry
+        return entry
+
+    async def _flush(self, entries: Dict[StorageKey, _BatchEntry]) -> None:
+        dirty = [(key, entry) for key, entry in entries.items() if entry.state_dirty or entry.data_dirty]
+        if not dirty:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, entry in dirty:
+                if entry.state_dirty:
+                    state_key = self.key_builder.build(key, 'state')
+                    if entry.state is None:
+                        pipe.delete(state_key)
+                    else:
+                        pipe.set(state_key, entry.state, ex=self.state_ttl)
+                if entry.data_dirty:
+                    data_key = self.key_builder.build(key, 'data')
+                    if not entry.data:
+                        pipe.delete(data_key)
+                    else:
+                        pipe.set(data_key, self.json_dumps(entry.data), ex=self.data_ttl)
+            start = time.perf_counter()
+            try:
+                await pipe.execute()
+            finally:
+                self._observe(start, 'pipeline')
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if _batch.get() is None:
+            return await super().set_state(key, state)
+        entry = await self._load(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.state_dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        if _batch.get() is None:
+            return await super().get_state(key)
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if _batch.get() is None:
+            return await super().set_data(key, data)
+        entry = await self._load(key)
+        entry.data = dict(data)
+        entry.data_dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        if _batch.get() is None:
+            return await super().get_data(key)
+        return dict((await self._load(key)).data)
+
+
+class InstrumentedStorage(BaseStorage):
+    """
+    Прокси хранилища FSM, замеряющий время операций.
+    Внутри batch операции BatchedRedisStorage не ходят в Redis: замеряются сами запросы
+    (mget при первом чтении, pipeline при записи), а не обращения к словарю
+    """
+
+    def __init__(self, storage: BaseStorage, histogram: Histogram):
+        self.storage = storage
+        self.histogram = histogram
+        if isinstance(storage, BatchedRedisStorage):
+            storage.histogram = histogram
+
+    async def _timed(self, operation: str, call: Awaitable) -> Any:
+        if in_batch():
+            return await call
+        start = time.perf_counter()
+        try:
+            return await call
+        finally:
+            self.histogram.observe(time.perf_counter() - start, operation)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        return await self._timed('set_state', self.storage.set_state(key, state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._timed('get_state', self.storage.get_state(key))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        return await self._timed('set_data', self.storage.set_data(key, data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return await self._timed('get_data', self.storage.get_data(key))
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+class FSMBatchMiddleware(BaseMiddleware):
+    """Открывает batch хранилища на время обработки апдейта"""
+
+    def __init__(self, storage: BatchedRedisStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.storage.batch():
+            return await handler(event, data)
+
+
+def create_storage(config: RedisConfig, redis: Optional[Redis] = None,
+                   codec: JsonCodec = STDLIB_CODEC) -> BaseStorage:
+    """
+    Создает хранилище FSM по конфигу.
+
+    redis можно передать явно — например, fakeredis.aioredis.FakeRedis() или клиент
+    к любому серверу с протоколом Redis для тестов. codec - JSON для данных FSM в Redis.
+    """
+    if not config.use_redis and redis is None:
+        return MemoryStorage()
+    if redis is None:
+        redis = Redis.from_url(config.url)
+    logger.info(f'FSM хранится в Redis: prefix={config.prefix}, state_ttl={config.state_ttl}, data_ttl={config.data_ttl}')
+    return BatchedRedisStorage(
+        redis=redis,
+        key_builder=DefaultKeyBuilder(prefix=config.prefix, with_destiny=True),
+        state_ttl=config.state_ttl or None,
+        data_ttl=config.data_ttl or None,
+        json_loads=codec.loads,
+        json_dumps=codec.dumps,
+    )
+
+
+def setup_storage_batching(dp: Dispatcher) -> None:
+    """
+    Подключает FSMBatchMiddleware перед FSMContextMiddleware,
+    чтобы начальное чтение состояния тоже попадало в batch.
+    """
+    storage = dp.storage
+    if isinstance(storage, InstrumentedStorage):
+        storage = storage.storage
+    if not isinstance(storage, BatchedRedisStorage):
+        return
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(FSMBatchMiddleware(storage))
+    dp.update.outer_middleware(dp.fsm)
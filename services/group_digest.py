@@ -0,0 +1,203 @@
+"""
+Сводная отправка регистраций в канал GROUP_ID.
+
+Вместо отдельного сообщения на каждую регистрацию уведомления копятся
+window секунд (или до max_items штук) и уходят одним сообщением.
+Длинная сводка режется по лимиту Telegram 4096 символов (слишком длинная заявка обрезается),
+большая пачка (от csv_threshold, больше max_items - такие бывают после простоя) отправляется CSV-файлом.
+"""
+import asyncio
+import csv
+import datetime
+import html
+import io
+import re
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable, List, Optional
+
+import structlog
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.types import BufferedInputFile
+
+logger = structlog.get_logger(__name__)
+
+MESSAGE_LIMIT = 4096
+
+
+@dataclass(frozen=True)
+class RegistrationNotice:
+    """Данные регистрации для уведомления в канал"""
+    full_name: str
+    phone: str
+    email: str
+    registered_at: datetime.datetime
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    updated: bool = False  # Участник обновил данные ранее отправленной регистрации
+
+
+def format_notice(notice: RegistrationNotice) -> str:
+    prefix = "✏️ <i>Обновление данных регистрации</i>\n" if notice.updated else ""
+    return (f"{prefix}👤 ФИО: {html.escape(notice.full_name)}\n"
+            f"📞 Телефон: {html.escape(notice.phone)}\n"
+            f"📧 Email: {html.escape(notice.email)}\n"
+            f"🕐 Время регистрации: {notice.registered_at.strftime('%d.%m.%Y %H:%M')}")
+
+
+def truncate_html(text: str, limit: int) -> str:
+    """Обрезает текст до limit символов, не разрывая HTML-сущность (&amp; и т. п.) в конце"""
+    if len(text) <= limit:
+        return text
+    return re.sub(r'&[#\w]*$', '', text[:limit - 1]) + '…'
+
+
+def build_messages(notices: List[RegistrationNotice]) -> List[str]:
+    """Собирает сводку и режет ее на сообщения не длиннее MESSAGE_LIMIT"""
+    if len(notices) == 1:
+        return [truncate_html(f"📋 <b>Новая регистрация на конференцию</b>\n\n{format_notice(notices[0])}",
+                              MESSAGE_LIMIT)]
+    messages = []
+    current = header = f"📋 <b>Новые регистрации на конференцию: {len(notices)}</b>"
+    for num, notice in enumerate(notices, 1):
+        # Заявка всегда помещается в одно сообщение вместе с заголовком
+        block = truncate_html(f"\n\n<b>{num}.</b>\n{format_notice(notice)}", MESSAGE_LIMIT - len(header))
+        if len(current) + len(block) > MESSAGE_LIMIT:
+            messages.append(current)
+            current = block.lstrip()
+        else:
+            current += block
+    messages.append(current)
+    return messages
+
+
+CSV_HEADER = ['ФИО', 'Телефон', 'Email', 'Время регистрации', 'Telegram ID', 'Username', 'Обновление']
+
+
+def csv_row(notice: RegistrationNotice) -> List[object]:
+    return [
+        notice.full_name,
+        notice.phone,
+        notice.email,
+        notice.registered_at.strftime('%d.%m.%Y %H:%M'),
+        notice.user_id or '',
+        notice.username or '',
+        'да' if notice.updated else '',
+    ]
+
+
+def build_csv(notices: List[RegistrationNotice]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(CSV_HEADER)
+    writer.writerows(csv_row(notice) for notice in notices)
+    # utf-8-sig, чтобы Excel корректно открывал кириллицу
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+class GroupDigest:
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        window: float = 5.0,
+        max_items: int = 20,
+        csv_threshold: int = 50,
+        retry_delay: float = 10.0,
+        max_attempts: int = 5,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.window = window
+        self.max_items = max_items
+        self.csv_threshold = csv_threshold
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._buffer: List[RegistrationNotice] = []
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: List[Callable[[], Awaitable]] = []  # Еще не отправленные части текущей сводки
+
+    def add(self, notice: RegistrationNotice) -> None:
+        """Добавляет регистрацию в сводку. Не ждет отправки"""
+        self._buffer.append(notice)
+        self._has_items.set()
+        if len(self._buffer) >= self.max_items:
+            self._full.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='group_digest')
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и отправляет то, что осталось"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Сводка, отправка которой прервана остановкой, и то, что еще копилось
+        batch, self._buffer = self._buffer, []
+        self._in_flight.extend(self.parts(batch) if batch else [])
+        if self._in_flight:
+            try:
+                await self._send_in_flight()
+            except Exception as e:
+                logger.error(f'Не удалось отправить сводку при остановке: {e}. '
+                             f'Регистрации: {batch}')
+            self._in_flight = []
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_items.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self._buffer = self._buffer, []
+            self._has_items.clear()
+            self._full.clear()
+            await self._post_with_retry(batch)
+
+    async def _post_with_retry(self, batch: List[RegistrationNotice]) -> None:
+        # Повтор продолжает с неотправленной части: уже доставленные сообщения сводки не дублируются
+        self._in_flight = self.parts(batch)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._send_in_flight()
+                logger.info(f'Сводка отправлена в канал: регистраций {len(batch)}')
+                return
+            except Exception as e:
+                logger.error(f'Ошибка отправки сводки в канал (попытка {attempt}): {e}')
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay)
+        self._in_flight = []
+        logger.critical(f'Сводка не отправлена после {self.max_attempts} попыток. Регистрации: {batch}')
+
+    async def _send_in_flight(self) -> None:
+        while self._in_flight:
+            await self._in_flight[0]()
+            self._in_flight.pop(0)
+
+    def parts(self, batch: List[RegistrationNotice]) -> List[Callable[[], Awaitable]]:
+        """Запросы, из которых состоит сводка: CSV-файл или сообщения по лимиту длины"""
+        if len(batch) >= self.csv_threshold:
+            now = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            return [partial(
+                self.bot.send_document,
+                chat_id=self.chat_id,
+                document=BufferedInputFile(build_csv(batch), filename=f'registrations_{now}.csv'),
+                caption=f"📋 <b>Новые регистрации на конференцию: {len(batch)}</b>",
+                parse_mode=ParseMode.HTML,
+            )]
+        return [partial(self.bot.send_message, chat_id=self.chat_id, text=text, parse_mode=ParseMode.HTML)
+                for text in build_messages(batch)]
+
+    async def post(self, batch: List[RegistrationNotice]) -> None:
+        for part in self.parts(batch):
+            await part()
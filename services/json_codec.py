@@ -0,0 +1,45 @@
+"""
+JSON-кодек для запросов к Bot API, приема апдейтов и хранилища FSM.
+
+По умолчанию используется orjson, если он установлен, иначе стандартный json.
+Выбор задается JSON_CODEC=auto|orjson|json.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import structlog
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него работает стандартный json
+    orjson = None
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class JsonCodec:
+    name: str
+    loads: Callable[[Any], Any]
+    dumps: Callable[[Any], str]
+
+
+def _orjson_dumps(value: Any) -> str:
+    # aiogram и aiohttp ожидают str, orjson возвращает bytes
+    return orjson.dumps(value).decode()
+
+
+STDLIB_CODEC = JsonCodec('json', json.loads, json.dumps)
+ORJSON_CODEC = JsonCodec('orjson', orjson.loads, _orjson_dumps) if orjson else None
+
+
+def get_codec(name: str = 'auto') -> JsonCodec:
+    name = name.lower()
+    if name == 'json':
+        return STDLIB_CODEC
+    if ORJSON_CODEC is None:
+        if name == 'orjson':
+            logger.warning('JSON_CODEC=orjson, но orjson не установлен: используется стандартный json')
+        return STDLIB_CODEC
+    return ORJSON_CODEC
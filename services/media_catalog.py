@@ -0,0 +1,210 @@
+"""
+Каталог видео (file_id) по коллекциям: архив мероприятий, отзывы участников.
+
+Хранится в data/media_catalog.json, при первом запуске заполняется из
+ARCHIVE_VIDEOS / REVIEWS_VIDEOS. Обработчики читают готовый кортеж живых file_id
+из памяти. Неработающие file_id помечаются dead (при ошибке отправки или фоновой
+проверкой) и больше не отправляются пользователям.
+
+Файл общий для процессов-обработчиков (BOT_WORKERS). Чтение файл не трогает: фоновая задача
+раз в interval секунд сравнивает время изменения и размер файла с прочитанными и при расхождении
+загружает его заново, так видео, добавленные админом, и пометки dead из другого процесса видны везде.
+Изменение выполняется под блокировкой файла {path}.lock: каталог перечитывается, меняется
+и записывается через временный файл, поэтому одновременные изменения из разных процессов не теряются.
+"""
+import asyncio
+import datetime
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from config_data.conf import BASE_DIR
+from data.project_data import ARCHIVE_VIDEOS, REVIEWS_VIDEOS
+
+logger = structlog.get_logger(__name__)
+
+CATALOG_PATH = BASE_DIR / 'data' / 'media_catalog.json'
+
+# Коллекции и их названия для админа
+COLLECTIONS = {
+    'archive': 'Архив прошедших мероприятий',
+    'reviews': 'Отзывы участников',
+}
+
+
+def is_dead_file_error(error: TelegramBadRequest) -> bool:
+    """Ошибка означает, что file_id больше недействителен"""
+    text = error.message.lower()
+    return ('wrong' in text and 'identifier' in text) or 'invalid file' in text
+
+
+class MediaCatalog:
+    def __init__(self, path=CATALOG_PATH, defaults: Optional[Dict[str, List[str]]] = None):
+        self.path = path
+        self.defaults = defaults if defaults is not None else {
+            'archive': ARCHIVE_VIDEOS,
+            'reviews': REVIEWS_VIDEOS,
+        }
+        self._collections: Optional[Dict[str, List[dict]]] = None
+        self._index: Dict[str, Tuple[str, ...]] = {}
+        self._signature: Optional[Tuple[int, int]] = None  # Время изменения и размер прочитанного файла
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ensure_loaded(self) -> Dict[str, List[dict]]:
+        if self._collections is None:
+            self.load()
+        return self._collections
+
+    def reload(self) -> bool:
+        """Загружает файл заново, если его изменил другой процесс. True, если каталог перечитан"""
+        if self._collections is not None and self._stat() in (None, self._signature):
+            return False
+        self.load()
+        return True
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Изменения редкие (админ, пометка dead), блокировка держится на время чтения и записи файла
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _update(self, change: Callable[[Dict[str, List[dict]]], bool]) -> bool:
+        """change меняет актуальный каталог и возвращает True, если его нужно записать"""
+        with self._locked():
+            self.reload()
+            changed = change(self._collections)
+            if changed:
+                self._save()
+                self._rebuild_index()
+        return changed
+
+    def load(self) -> None:
+        if os.path.exists(self.path):
+            signature = self._stat()
+            with open(self.path, encoding='utf-8') as file:
+                self._collections = json.load(file)['collections']
+            self._signature = signature
+        else:
+            now = datetime.datetime.now().isoformat(timespec='seconds')
+            self._collections = {
+                name: [{'file_id': file_id, 'dead': False, 'added_at': now} for file_id in file_ids if file_id]
+                for name, file_ids in self.defaults.items()
+            }
+            self._save()
+            logger.info(f'Каталог видео создан из project_data: {self.path}')
+        for name in COLLECTIONS:
+            self._collections.setdefault(name, [])
+        self._rebuild_index()
+
+    def _save(self) -> None:
+        # Пишем во временный файл своего процесса и подменяем, чтобы не оставить битый JSON
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'collections': self._collections}, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._signature = self._stat()
+
+    def _rebuild_index(self) -> None:
+        self._index = {
+            name: tuple(item['file_id'] for item in items if not item.get('dead'))
+            for name, items in self._collections.items()
+        }
+
+    def videos(self, collection: str) -> Tuple[str, ...]:
+        """Живые file_id коллекции в порядке показа"""
+        self._ensure_loaded()
+        return self._index.get(collection, ())
+
+    def add(self, collection: str, file_id: str, position: Optional[int] = None) -> bool:
+        """Добавляет видео в коллекцию (в конец или на позицию). False, если уже есть"""
+        def change(collections: Dict[str, List[dict]]) -> bool:
+            items = collections.setdefault(collection, [])
+            for item in items:
+                if item['file_id'] == file_id:
+                    if not item.get('dead'):
+                        return False
+                    item['dead'] = False  # Повторно добавленное видео снова считаем живым
+                    return True
+            item = {'file_id': file_id, 'dead': False,
+                    'added_at': datetime.datetime.now().isoformat(timespec='seconds')}
+            if position is None:
+                items.append(item)
+            else:
+                items.insert(position, item)
+            return True
+
+        added = self._update(change)
+        if added:
+            logger.info(f'Видео добавлено в коллекцию {collection}: {file_id[:40]}...')
+        return added
+
+    def mark_dead(self, file_id: str, reason: str = '') -> None:
+        """Помечает file_id недействительным во всех коллекциях"""
+        def change(collections: Dict[str, List[dict]]) -> bool:
+            changed = False
+            for items in collections.values():
+                for item in items:
+                    if item['file_id'] == file_id and not item.get('dead'):
+                        item['dead'] = True
+                        item['dead_reason'] = reason
+                        changed = True
+            return changed
+
+        if self._update(change):
+            logger.warning(f'file_id помечен недействительным: {file_id[:40]}... {reason}')
+
+    async def validate(self, bot: Bot, delay: float = 1.0) -> int:
+        """Проверяет живые file_id через getFile. Возвращает число найденных недействительных"""
+        dead = 0
+        file_ids = {file_id for name in self._ensure_loaded() for file_id in self.videos(name)}
+        for file_id in file_ids:
+            try:
+                await bot.get_file(file_id)
+            except TelegramBadRequest as e:
+                if is_dead_file_error(e):
+                    self.mark_dead(file_id, e.message)
+                    dead += 1
+                # Остальные ошибки (например, file is too big для больших видео) не означают,
+                # что file_id недействителен
+            except Exception as e:
+                logger.warning(f'Не удалось проверить file_id {file_id[:40]}...: {e}')
+            await asyncio.sleep(delay)
+        return dead
+
+    async def run_validator(self, bot: Bot, interval: float) -> None:
+        """Фоновая периодическая проверка каталога"""
+        while True:
+            try:
+                dead = await self.validate(bot)
+                logger.info(f'Проверка каталога видео завершена, недействительных: {dead}')
+            except Exception as e:
+                logger.error(f'Ошибка проверки каталога видео: {e}', exc_info=True)
+            await asyncio.sleep(interval)
+
+    async def run_watcher(self, interval: float) -> None:
+        """Фоновая проверка изменений файла другими процессами"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                logger.error('Не удалось перечитать каталог видео: %s', e)
+
+
+media_catalog = MediaCatalog()
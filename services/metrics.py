@@ -0,0 +1,141 @@
+"""
+Метрики бота в текстовом формате Prometheus.
+
+Счетчики и гистограммы хранятся в памяти процесса, запись - словарь по кортежу
+меток и bisect по границам бакетов, без блокировок (все пишется из event loop).
+Отдаются локальным HTTP-сервером: GET /metrics.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+import structlog
+from aiohttp import web
+
+logger = structlog.get_logger(__name__)
+
+# Границы бакетов латентности, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_values, value in self._values.items():
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # По меткам: [счетчики по бакетам (последний - +Inf), сумма]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                bucket_labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class BotMetrics(MetricsRegistry):
+    """Набор метрик бота"""
+
+    def __init__(self):
+        super().__init__()
+        self.updates = self.counter(
+            'bot_updates_total', 'Обработанные апдейты', ('update_type', 'status'))
+        self.update_duration = self.histogram(
+            'bot_update_duration_seconds', 'Время обработки апдейта', ('update_type',))
+        self.handler_duration = self.histogram(
+            'bot_handler_duration_seconds', 'Время работы обработчика',
+            ('handler', 'update_type', 'callback_data'))
+        self.handler_errors = self.counter(
+            'bot_handler_errors_total', 'Исключения в обработчиках', ('handler', 'update_type', 'error'))
+        self.api_duration = self.histogram(
+            'bot_api_request_duration_seconds', 'Время запроса к Telegram Bot API', ('method',))
+        self.api_errors = self.counter(
+            'bot_api_errors_total', 'Ошибки запросов к Telegram Bot API', ('method', 'error'))
+        self.storage_duration = self.histogram(
+            'bot_fsm_storage_duration_seconds', 'Время операции хранилища FSM', ('operation',),
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int,
+                               path: str = '/metrics') -> web.AppRunner:
+    """Поднимает локальный HTTP-сервер с метриками. Остановка: await runner.cleanup()"""
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get(path, handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f'Метрики доступны на http://{host}:{port}{path}')
+    return runner
+
+
+metrics = BotMetrics()
@@ -0,0 +1,260 @@
+"""
+Надежная очередь (outbox) уведомлений о регистрациях для канала GROUP_ID.
+
+Обработчик сначала фиксирует регистрацию в SQLite (режим WAL, коммит на диск) и сразу
+подтверждает ее пользователю, не дожидаясь Telegram. Фоновая задача собирает неотправленные
+записи в сводку (окно и размер как у GroupDigest), отправляет в канал и отмечает отправленными.
+При ошибке запись остается в базе и повторяется со своей нарастающей паузой, вместе с остальными
+записями в сводке. Если Telegram отклонил сводку (400), записи отправляются по одной, чтобы
+запись, которую канал не принимает, не задерживала остальные. После
+max_attempts неудачных попыток запись больше не отправляется (остается в базе с текстом ошибки).
+После перезапуска бота все неотправленное отправляется заново.
+
+SQLite вызывается в отдельном потоке, чтобы не блокировать цикл событий.
+"""
+import asyncio
+import dataclasses
+import datetime
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+import structlog
+from aiogram.exceptions import TelegramBadRequest
+
+from services.group_digest import GroupDigest, RegistrationNotice
+
+logger = structlog.get_logger(__name__)
+
+BATCH_LIMIT = 1000  # Максимум записей в одной сводке (большая пачка после простоя уйдет CSV-файлом)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (next_attempt_at) WHERE sent_at IS NULL;
+"""
+
+
+def dump_notice(notice: RegistrationNotice) -> str:
+    data = dataclasses.asdict(notice)
+    data['registered_at'] = notice.registered_at.isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def load_notice(payload: str) -> RegistrationNotice:
+    data = json.loads(payload)
+    data['registered_at'] = datetime.datetime.fromisoformat(data['registered_at'])
+    return RegistrationNotice(**data)
+
+
+class RegistrationOutbox:
+    def __init__(
+        self,
+        digest: GroupDigest,
+        path: str,
+        retry_delay: float = 10.0,
+        max_retry_delay: float = 600.0,
+        keep_days: float = 30,
+        max_attempts: int = 30,
+    ):
+        self.digest = digest  # Оформление и отправка сводки (GroupDigest.post)
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.keep_days = keep_days
+        self.max_attempts = max_attempts
+        # Один поток: соединение SQLite используется только из него
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        self._db: Optional[sqlite3.Connection] = None
+        self._added = asyncio.Event()
+        self._full = asyncio.Event()
+        self._new = 0  # Добавлено с последней отправки
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+
+    async def _call(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Работа с SQLite (выполняется в потоке outbox)
+
+    def _open(self) -> int:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # FULL: запись переживает не только падение процесса, но и отключение питания
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.executescript(SCHEMA)
+        if self.keep_days:
+            with self._db:
+                self._db.execute('DELETE FROM outbox WHERE sent_at < ?', (time.time() - self.keep_days * 86400,))
+        return self._pending()
+
+    def _insert(self, payload: str) -> int:
+        now = time.time()
+        with self._db:
+            cursor = self._db.execute('INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)',
+                                      (payload, now, now))
+        return cursor.lastrowid
+
+    def _due(self, now: float) -> List[Tuple[int, str, int]]:
+        """Неотправленные записи, срок отправки которых наступил, по порядку"""
+        return self._db.execute('SELECT id, payload, attempts FROM outbox WHERE sent_at IS NULL AND attempts < ? '
+                                'AND next_attempt_at <= ? ORDER BY id LIMIT ?',
+                                (self.max_attempts, now, BATCH_LIMIT)).fetchall()
+
+    def _due_in(self) -> Optional[float]:
+        """Через сколько секунд наступит ближайший повтор, None - отправлять нечего"""
+        row = self._db.execute('SELECT min(next_attempt_at) FROM outbox WHERE sent_at IS NULL AND attempts < ?',
+                               (self.max_attempts,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _mark_sent(self, ids: List[int]) -> None:
+        now = time.time()
+        with self._db:
+            self._db.executemany('UPDATE outbox SET sent_at = ?, last_error = NULL WHERE id = ?',
+                                 [(now, row_id) for row_id in ids])
+
+    def _mark_failed(self, rows: List[Tuple[int, float]], error: str) -> None:
+        """rows - (id, время следующей попытки)"""
+        with self._db:
+            self._db.executemany('UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, '
+                                 'last_error = ? WHERE id = ?',
+                                 [(next_attempt_at, error, row_id) for row_id, next_attempt_at in rows])
+
+    def _pending(self) -> int:
+        return self._db.execute('SELECT count(*) FROM outbox WHERE sent_at IS NULL AND attempts < ?',
+                                (self.max_attempts,)).fetchone()[0]
+
+    def _dead(self) -> int:
+        return self._db.execute('SELECT count(*) FROM outbox WHERE sent_at IS NULL AND attempts >= ?',
+                                (self.max_attempts,)).fetchone()[0]
+
+    def _close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # Асинхронный интерфейс
+
+    async def add(self, notice: RegistrationNotice) -> int:
+        """Фиксирует регистрацию на диске. После возврата она будет доставлена, даже если бот упадет"""
+        row_id = await self._call(self._insert, dump_notice(notice))
+        self._new += 1
+        self._added.set()
+        if self._new >= self.digest.max_items:
+            self._full.set()
+        return row_id
+
+    async def pending(self) -> int:
+        return await self._call(self._pending)
+
+    async def dead(self) -> int:
+        """Записи, не отправленные за max_attempts попыток"""
+        return await self._call(self._dead)
+
+    async def start(self) -> None:
+        """Открывает базу и запускает отправку, в том числе записей, оставшихся с прошлого запуска"""
+        if self._task is not None:
+            return
+        pending = await self._call(self._open)
+        if pending:
+            logger.info('В outbox неотправленных регистраций: %d, отправляем', pending)
+        self._task = asyncio.create_task(self._run(), name='registration_outbox')
+
+    async def stop(self) -> None:
+        """Останавливает отправку. Последняя попытка без повторов, неотправленное остается на диске"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        pending = await self.pending()
+        if pending:
+            logger.warning('В outbox осталось неотправленных регистраций: %d, отправка после перезапуска', pending)
+        await self._call(self._close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self) -> None:
+        while True:
+            due_in = await self._call(self._due_in)
+            if due_in is None or due_in > 0:
+                try:
+                    await asyncio.wait_for(self._added.wait(), due_in)
+                except asyncio.TimeoutError:
+                    pass
+            if self._added.is_set():
+                # Новая регистрация: ждем остальные в окне сводки
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.digest.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._added.clear()
+            self._full.clear()
+            self._new = 0
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Ошибка outbox регистраций')
+                await asyncio.sleep(self.retry_delay)
+
+    async def flush(self) -> None:
+        """
+        Одна попытка отправить записи, срок отправки которых наступил, - одной сводкой, и новые,
+        и повторные. Если Telegram отклонил сводку как некорректную (400), записи отправляются
+        по одной: запись, которую канал не принимает, не задерживает остальные
+        """
+        rows = await self._call(self._due, time.time())
+        if not rows:
+            return
+        try:
+            await self._send(rows)
+        except TelegramBadRequest as e:
+            if len(rows) == 1:
+                await self._failed(rows, e)
+                return
+            logger.warning('Telegram отклонил сводку из %d регистраций: %s. Отправка по одной', len(rows), e)
+            for row in rows:
+                try:
+                    await self._send([row])
+                except Exception as e:
+                    await self._failed([row], e)
+        except Exception as e:
+            # Недоступен Telegram или сеть, превышен лимит: повтор всей пачки после паузы
+            await self._failed(rows, e)
+
+    async def _send(self, rows: List[Tuple[int, str, int]]) -> None:
+        await self.digest.post([load_notice(payload) for _, payload, _ in rows])
+        self.sent += len(rows)
+        await self._call(self._mark_sent, [row_id for row_id, _, _ in rows])
+        logger.info('Регистрации отправлены в канал из outbox: %d', len(rows))
+
+    async def _failed(self, rows: List[Tuple[int, str, int]], error: Exception) -> None:
+        # Сводка из нескольких сообщений при повторе может прийти в канал частично повторно
+        self.failed += len(rows)
+        now = time.time()
+        await self._call(self._mark_failed, [
+            (row_id, now + min(self.retry_delay * 2 ** attempts, self.max_retry_delay))
+            for row_id, _, attempts in rows
+        ], str(error))
+        dead = [row_id for row_id, _, attempts in rows if attempts + 1 >= self.max_attempts]
+        if dead:
+            logger.critical('Регистрации не отправлены в канал за %d попыток и больше не повторяются: '
+                            'id %s в %s', self.max_attempts, dead, self.path)
+        logger.error('Ошибка отправки регистраций в канал: %s. Записей: %d', error, len(rows))
@@ -0,0 +1,192 @@
+"""
+Локальный журнал регистраций и выгрузка для админов (/export).
+
+Каждая регистрация дописывается строкой JSON в конец файла (append-only), записи идут по времени.
+Рядом лежит индекс {журнал}.idx: для каждого дня - смещение первой записи этого дня в журнале.
+Выгрузка за период по индексу сразу переходит к началу первого дня и читает файл построчно
+до конца последнего, поэтому не перечитывает всю историю и не держит записи в памяти.
+
+У процессов-обработчиков (BOT_WORKERS) свои журналы с номером: registrations-0.jsonl, ...
+Выгрузка читает все журналы и объединяет их по времени регистрации.
+"""
+import bisect
+import csv
+import datetime
+import glob
+import heapq
+import json
+import os
+import tempfile
+from typing import IO, Iterator, List, Optional, Tuple
+
+import structlog
+
+from services.group_digest import CSV_HEADER, RegistrationNotice, csv_row
+
+logger = structlog.get_logger(__name__)
+
+DATE_FORMAT = '%d.%m.%Y'
+
+
+def index_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.idx'
+
+
+def journal_paths(path: str) -> List[str]:
+    """Журнал основного процесса и журналы процессов-обработчиков"""
+    root, ext = os.path.splitext(path)
+    return sorted(p for p in [path, *glob.glob(f'{glob.escape(root)}-*{ext}')] if os.path.exists(p))
+
+
+def dump_record(notice: RegistrationNotice) -> bytes:
+    record = [notice.registered_at.isoformat(), notice.user_id, notice.username,
+              notice.full_name, notice.phone, notice.email]
+    if notice.updated:
+        record.append(1)
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def load_record(line: bytes) -> RegistrationNotice:
+    registered_at, user_id, username, full_name, phone, email, *updated = json.loads(line)
+    return RegistrationNotice(full_name=full_name, phone=phone, email=email,
+                              registered_at=datetime.datetime.fromisoformat(registered_at),
+                              user_id=user_id, username=username, updated=bool(updated))
+
+
+def read_index(path: str) -> List[Tuple[str, int]]:
+    """(день ISO, смещение) по возрастанию дня"""
+    entries = []
+    try:
+        with open(index_path(path), encoding='ascii') as file:
+            for line in file:
+                day, _, offset = line.partition(' ')
+                if offset.strip().isdigit():
+                    entries.append((day, int(offset)))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def parse_period(args: Optional[str]) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """Аргументы /export: «» - все, «01.03.2026» - с даты, «01.03.2026 31.03.2026» - период"""
+    parts = (args or '').split()
+    if len(parts) > 2:
+        raise ValueError(args)
+    dates = [datetime.datetime.strptime(part, DATE_FORMAT).date() for part in parts]
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+    if date_from and date_to and date_from > date_to:
+        raise ValueError(args)
+    return date_from, date_to
+
+
+def read_journal(path: str, date_from: Optional[datetime.date],
+                 date_to: Optional[datetime.date]) -> Iterator[RegistrationNotice]:
+    """Записи одного журнала за период, начиная со смещения из индекса"""
+    offset = 0
+    if date_from:
+        index = read_index(path)
+        position = bisect.bisect_left(index, (date_from.isoformat(), -1))
+        if position == len(index):
+            return
+        offset = index[position][1]
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b'\n'):
+                break  # Запись, которую сейчас дописывает другой процесс
+            try:
+                notice = load_record(line)
+            except ValueError:
+                logger.warning('Журнал регистраций %s: поврежденная строка пропущена', path)
+                continue
+            day = notice.registered_at.date()
+            if date_to and day > date_to:
+                break
+            if date_from and day < date_from:
+                continue
+            yield notice
+
+
+class RegistrationJournal:
+    def __init__(self, path: str, base_path: Optional[str] = None):
+        self.path = path
+        # Путь без номера процесса: по нему выгрузка находит журналы всех процессов-обработчиков
+        self.base_path = base_path or path
+        self._file: Optional[IO[bytes]] = None
+        self._index: Optional[IO[str]] = None
+        self._last_day: Optional[str] = None
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and not os.path.exists(index_path(self.path)):
+            self._rebuild_index()
+        self._file = open(self.path, 'ab')
+        if self._file.tell():
+            with open(self.path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    # Хвост записи, оборванной при падении: новая запись начнется с новой строки
+                    self._file.write(b'\n')
+                    self._file.flush()
+        index = read_index(self.path)
+        self._last_day = index[-1][0] if index else None
+        self._index = open(index_path(self.path), 'a', encoding='ascii')
+
+    def _rebuild_index(self) -> None:
+        """Индекс по существующему журналу (если файл индекса удален)"""
+        logger.info('Журнал регистраций %s: строим индекс', self.path)
+        last_day = None
+        offset = 0
+        with open(self.path, 'rb') as file, open(index_path(self.path), 'w', encoding='ascii') as index:
+            for line in file:
+                try:
+                    day = load_record(line).registered_at.date().isoformat()
+                except ValueError:
+                    day = None
+                if day and day != last_day:
+                    index.write(f'{day} {offset}\n')
+                    last_day = day
+                offset += len(line)
+
+    def append(self, notice: RegistrationNotice) -> bool:
+        """Дописывает регистрацию в журнал. Ошибка записи не мешает регистрации"""
+        try:
+            day = notice.registered_at.date().isoformat()
+            if day != self._last_day:
+                # Индекс пишется до записи: смещение указывает на первую запись этого дня или более позднюю
+                self._index.write(f'{day} {self._file.tell()}\n')
+                self._index.flush()
+                self._last_day = day
+            self._file.write(dump_record(notice))
+            self._file.flush()
+            return True
+        except Exception as e:
+            logger.error(f'Не удалось записать регистрацию в журнал: {e}. Регистрация: {notice}')
+            return False
+
+    def close(self) -> None:
+        for file in (self._file, self._index):
+            if file is not None:
+                file.close()
+        self._file = self._index = None
+
+    def export_csv(self, date_from: Optional[datetime.date] = None,
+                   date_to: Optional[datetime.date] = None) -> Tuple[str, int]:
+        """
+        Пишет регистрации за период во временный CSV-файл, возвращает путь и число записей.
+        Файл удаляет вызывающий. Выполняется в отдельном потоке (asyncio.to_thread)
+        """
+        journals = [read_journal(path, date_from, date_to) for path in journal_paths(self.base_path)]
+        count = 0
+        descriptor, path = tempfile.mkstemp(prefix='registrations_', suffix='.csv')
+        # utf-8-sig, чтобы Excel корректно открывал кириллицу
+        with open(descriptor, 'w', encoding='utf-8-sig', newline='') as file:
+            writer = csv.writer(file, delimiter=';')
+            writer.writerow(CSV_HEADER)
+            for notice in heapq.merge(*journals, key=lambda notice: notice.registered_at):
+                writer.writerow(csv_row(notice))
+                count += 1
+        return path, count
@@ -0,0 +1,42 @@
+"""
+Замер этапов запуска бота: импорт модулей, подготовка, очередь апдейтов, подключение к Telegram.
+
+Этапы могут идти параллельно, поэтому для каждого пишется своя длительность,
+а «всего» - время от начала импорта до начала приема апдейтов.
+Подробный разбор импорта по модулям: python -X importtime main.py 2> import.log
+или python benchmarks/bench_startup.py.
+"""
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class StartupTimer:
+    def __init__(self, started: float):
+        self.started = started  # time.perf_counter() в начале импорта main.py
+        self.phases: List[Tuple[str, float]] = []
+
+    def add(self, name: str, since: float) -> None:
+        self.phases.append((name, time.perf_counter() - since))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Замер этапа, который выполняется параллельно с другими (через asyncio.gather)"""
+        with self.phase(name):
+            return await awaitable
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        phases = ', '.join(f'{name} {duration:.2f} с' for name, duration in self.phases)
+        return f'запуск за {self.total():.2f} с: {phases}'
@@ -0,0 +1,132 @@
+"""
+Планировщик апдейтов: по порядку внутри чата, параллельно между чатами.
+
+Апдейт попадает в шард hash(chat_id) % shards, у каждого шарда своя очередь и один воркер.
+Поэтому апдейты одного чата обрабатываются строго друг за другом (шаги регистрации не обгоняют
+друг друга и не портят данные FSM), а разные чаты - параллельно, не больше shards одновременно.
+Медленный обработчик (рассылка видео из архива) задерживает только чаты своего шарда.
+
+Очереди шардов ограничены queue_size: при переполнении прием апдейтов ждет,
+в режиме polling это приостанавливает getUpdates.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+logger = structlog.get_logger(__name__)
+
+
+class Shard:
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        self.queue: asyncio.Queue[Tuple[Bot, Update, Dict[str, Any], float]] = asyncio.Queue(queue_size)
+        self.worker: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'shard': self.index,
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'errors': self.errors,
+            'wait_avg_ms': self.wait_total / self.processed * 1000 if self.processed else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+
+class UpdateScheduler:
+    """
+    Подменяет dp.feed_update: апдейт ставится в очередь шарда своего чата,
+    а воркер шарда вызывает исходный feed_update. Работает и для polling, и для webhook.
+    """
+
+    def __init__(self, dp: Dispatcher, shards: int = 16, queue_size: int = 100):
+        self.dp = dp
+        self.shards = [Shard(index, queue_size) for index in range(max(1, shards))]
+        self._feed_update = None
+
+    @staticmethod
+    def chat_key(update: Update) -> int:
+        """Чат апдейта, для апдейтов без чата (inline и т.п.) - пользователь"""
+        context = UserContextMiddleware.resolve_event_context(update)
+        if context.chat:
+            return context.chat.id
+        if context.user:
+            return context.user.id
+        return 0
+
+    def shard_for(self, update: Update) -> Shard:
+        return self.shards[hash(self.chat_key(update)) % len(self.shards)]
+
+    def start(self) -> None:
+        self._feed_update = self.dp.feed_update
+        self.dp.feed_update = self.feed_update
+        for shard in self.shards:
+            shard.worker = asyncio.create_task(self._work(shard))
+        logger.info('Планировщик апдейтов: шардов %d, очередь шарда %d',
+                    len(self.shards), self.shards[0].queue.maxsize)
+
+    async def join(self) -> None:
+        """Ждет, пока будут обработаны все принятые апдейты"""
+        await asyncio.gather(*(shard.queue.join() for shard in self.shards))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дорабатывает уже принятые апдейты (не дольше timeout) и возвращает исходный feed_update"""
+        if self._feed_update is None:
+            return
+        self.dp.feed_update = self._feed_update
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Планировщик апдейтов остановлен, не обработано апдейтов: %d',
+                           sum(shard.queue.qsize() for shard in self.shards))
+        for shard in self.shards:
+            shard.worker.cancel()
+        await asyncio.gather(*(shard.worker for shard in self.shards), return_exceptions=True)
+        self._feed_update = None
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> None:
+        shard = self.shard_for(update)
+        await shard.queue.put((bot, update, kwargs, time.perf_counter()))
+        shard.max_depth = max(shard.max_depth, shard.queue.qsize())
+
+    async def _work(self, shard: Shard) -> None:
+        while True:
+            bot, update, kwargs, enqueued_at = await shard.queue.get()
+            wait = time.perf_counter() - enqueued_at
+            shard.wait_total += wait
+            shard.wait_max = max(shard.wait_max, wait)
+            try:
+                await self._feed_update(bot, update, **kwargs)
+            except Exception:
+                shard.errors += 1
+                logger.exception('Ошибка обработки апдейта %s', update.update_id)
+            finally:
+                shard.processed += 1
+                shard.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Сумма по шардам и самые загруженные шарды"""
+        shards: List[Dict[str, float]] = [shard.as_dict() for shard in self.shards]
+        processed = sum(shard['processed'] for shard in shards)
+        wait_total = sum(shard.wait_total for shard in self.shards)
+        return {
+            'shards': len(shards),
+            'depth': sum(shard['depth'] for shard in shards),
+            'processed': processed,
+            'errors': sum(shard['errors'] for shard in shards),
+            'wait_avg_ms': wait_total / processed * 1000 if processed else 0.0,
+            'wait_max_ms': max(shard['wait_max_ms'] for shard in shards),
+            'busiest_shards': sorted(shards, key=lambda shard: (shard['depth'], shard['wait_max_ms']),
+                                     reverse=True)[:3],
+        }
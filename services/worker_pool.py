@@ -0,0 +1,209 @@
+"""
+Несколько процессов-обработчиков апдейтов (BOT_WORKERS > 0).
+
+Процесс приема (polling или webhook) не разбирает апдейты в модели aiogram: он кладет JSON апдейта
+в очередь раздела chat_id % BOT_WORKERS. Каждый воркер читает только свой раздел и передает апдейты
+в диспетчер со всеми роутерами из handlers/, поэтому апдейты одного чата всегда обрабатывает один
+процесс в порядке поступления, а состояние FSM чата не делится между процессами.
+
+Очереди:
+- local - multiprocessing.Queue на раздел, для воркеров, запущенных процессом приема;
+- redis - списки {prefix}:{раздел} в Redis (RPUSH/BLPOP): переживают перезапуск процессов.
+"""
+import asyncio
+import multiprocessing
+import queue
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+from aiogram import Bot, Dispatcher
+from aiohttp import ClientError, ClientTimeout, web
+
+from config_data.conf import WorkersConfig
+
+logger = structlog.get_logger(__name__)
+
+POLL_TIMEOUT = 30  # Long polling getUpdates, сек
+GET_TIMEOUT = 1  # Ожидание апдейта воркером, после которого проверяется остановка, сек
+
+# Апдейты, в которых чат указан напрямую
+CHAT_UPDATES = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'chat_member', 'my_chat_member', 'chat_join_request')
+
+
+def raw_chat_id(update: Dict[str, Any]) -> int:
+    """Чат апдейта по сырому JSON, без разбора в модели aiogram"""
+    for key in CHAT_UPDATES:
+        if key in update:
+            return update[key]['chat']['id']
+    callback = update.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        return message['chat']['id'] if message else callback['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return 0
+
+
+class LocalUpdateQueue:
+    """Очереди multiprocessing: передаются воркерам при запуске процессов"""
+
+    def __init__(self, partitions: int, maxsize: int):
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue(maxsize) for _ in range(partitions)]
+
+    async def put(self, partition: int, raw: str) -> None:
+        try:
+            self.queues[partition].put_nowait(raw)
+        except queue.Full:
+            # Воркер не успевает: прием ждет, getUpdates приостанавливается
+            await asyncio.get_running_loop().run_in_executor(None, self.queues[partition].put, raw)
+
+    async def get(self, partition: int) -> Optional[str]:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.queues[partition].get, True, GET_TIMEOUT)
+        except queue.Empty:
+            return None
+
+    async def depth(self, partition: int) -> int:
+        return self.queues[partition].qsize()
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisUpdateQueue:
+    """Списки Redis. Клиент создается в каждом процессе при первом обращении"""
+
+    def __init__(self, url: str, prefix: str):
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from redis.asyncio import Redis
+            self._redis = Redis.from_url(self.url)
+        return self._redis
+
+    def _key(self, partition: int) -> str:
+        return f'{self.prefix}:{partition}'
+
+    async def put(self, partition: int, raw: str) -> None:
+        await self.redis.rpush(self._key(partition), raw)
+
+    async def get(self, partition: int) -> Optional[bytes]:
+        item = await self.redis.blpop([self._key(partition)], timeout=GET_TIMEOUT)
+        return item[1] if item else None
+
+    async def depth(self, partition: int) -> int:
+        return await self.redis.llen(self._key(partition))
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # В процесс воркера передаются только настройки, без клиента
+        return {'url': self.url, 'prefix': self.prefix, '_redis': None}
+
+
+def create_update_queue(config: WorkersConfig, redis_url: str):
+    if config.queue == 'redis':
+        return RedisUpdateQueue(redis_url, config.prefix)
+    return LocalUpdateQueue(config.processes, config.queue_size)
+
+
+class UpdateIntake:
+    """Прием апдейтов: раскладывает сырой JSON по разделам очереди"""
+
+    def __init__(self, update_queue, partitions: int, loads: Callable, dumps: Callable):
+        self.queue = update_queue
+        self.partitions = partitions
+        self.loads = loads
+        self.dumps = dumps
+        self.pushed = [0] * partitions
+
+    async def push(self, update: Dict[str, Any]) -> None:
+        partition = raw_chat_id(update) % self.partitions
+        await self.queue.put(partition, self.dumps(update))
+        self.pushed[partition] += 1
+
+    async def poll(self, bot: Bot, allowed_updates: List[str]) -> None:
+        """Long polling getUpdates без разбора апдейтов в модели (вебхук должен быть снят)"""
+        session = await bot.session.create_session()
+        url = bot.session.api.api_url(token=bot.token, method='getUpdates')
+        offset = None
+        backoff = 1.0
+        while True:
+            params = {'timeout': POLL_TIMEOUT, 'allowed_updates': allowed_updates}
+            if offset is not None:
+                params['offset'] = offset
+            try:
+                async with session.post(url, data=self.dumps(params), headers={'Content-Type': 'application/json'},
+                                        timeout=ClientTimeout(total=POLL_TIMEOUT + 10)) as response:
+                    data = self.loads(await response.read())
+            except (ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning('getUpdates: %s, повтор через %.0f с', e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            if not data.get('ok'):
+                retry_after = data.get('parameters', {}).get('retry_after', backoff)
+                logger.warning('getUpdates: %s, повтор через %s с', data.get('description'), retry_after)
+                await asyncio.sleep(retry_after)
+                continue
+            backoff = 1.0
+            for update in data['result']:
+                await self.push(update)
+            if data['result']:
+                offset = data['result'][-1]['update_id'] + 1
+
+    def webhook_handler(self, secret: str) -> Callable:
+        """Обработчик вебхука: проверяет секрет и кладет апдейт в очередь"""
+
+        async def handle(request: web.Request) -> web.Response:
+            if request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                return web.Response(status=401)
+            await self.push(self.loads(await request.read()))
+            return web.Response()
+
+        return handle
+
+    async def report(self, interval: float) -> None:
+        """Периодически пишет в лог, сколько апдейтов ушло в каждый раздел и глубину очередей"""
+        last = list(self.pushed)
+        while True:
+            await asyncio.sleep(interval)
+            rates = [(pushed - before) / interval for pushed, before in zip(self.pushed, last)]
+            last = list(self.pushed)
+            depths = [await self.queue.depth(partition) for partition in range(self.partitions)]
+            logger.info('Прием апдейтов: %s',
+                        ', '.join(f'воркер {index}: {rate:.1f} апд/с, в очереди {depth}'
+                                  for index, (rate, depth) in enumerate(zip(rates, depths))))
+
+
+async def consume(bot: Bot, dp: Dispatcher, update_queue, partition: int, stop: asyncio.Event,
+                  report_interval: float) -> None:
+    """Цикл воркера: апдейты своего раздела передаются в диспетчер до события stop"""
+    processed = 0
+    reported, reported_at = 0, time.perf_counter()
+    while not stop.is_set():
+        raw = await update_queue.get(partition)
+        if raw is not None:
+            # feed_raw_update пробрасывает исключение обработчика: ловим здесь, чтобы воркер не остановился.
+            # С планировщиком он только ставит апдейт в очередь шарда
+            try:
+                await dp.feed_raw_update(bot, bot.session.json_loads(raw))
+            except Exception:
+                logger.exception('Воркер %d: ошибка обработки апдейта', partition)
+            processed += 1
+        now = time.perf_counter()
+        if now - reported_at >= report_interval:
+            logger.info('Воркер %d: %.1f апд/с, всего %d', partition,
+                        (processed - reported) / (now - reported_at), processed)
+            reported, reported_at = processed, now
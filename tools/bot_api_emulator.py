@@ -0,0 +1,455 @@
+"""
+Локальный эмулятор Telegram Bot API для нагрузочных тестов и проверки обработки ошибок.
+
+Реализует методы, которыми пользуется бот: getMe, getUpdates, setWebhook, deleteWebhook,
+sendMessage, sendVideo, sendDocument, editMessageText, deleteMessage, answerCallbackQuery, getFile.
+Виртуальные пользователи проходят сценарий /start -> "Наш проект" -> "Назад" -> регистрация
+(ФИО, телефон, email) и ждут ответа бота на каждый шаг. Апдейты отдаются через getUpdates
+или отправляются на webhook бота, если он установлен через setWebhook.
+
+Ошибки задаются долями запросов (ключи запуска или POST /_control с JSON):
+задержка ответа, 429 с retry_after, 400 "message is not modified", 5xx.
+Неизменившийся editMessageText и редактирование текста у сообщения с видео дают 400, как в Telegram.
+Статистика: GET /_stats.
+
+Запуск:
+    python tools/bot_api_emulator.py --port 8081 --users 1000 --ramp 60 --rate-429 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+BOT_ID = 4200000000
+INT_FIELDS = {'chat_id', 'message_id', 'from_chat_id', 'offset', 'limit', 'timeout', 'max_connections'}
+# Методы управления: ошибки в них не внедряются
+CONTROL_METHODS = {'getme', 'getupdates', 'setwebhook', 'deletewebhook', 'getwebhookinfo'}
+
+
+class ApiError(Exception):
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+    def as_response(self) -> web.Response:
+        payload: Dict[str, Any] = {'ok': False, 'error_code': self.code, 'description': self.description}
+        if self.retry_after is not None:
+            payload['parameters'] = {'retry_after': self.retry_after}
+        return web.json_response(payload, status=self.code)
+
+
+@dataclass
+class FaultConfig:
+    latency: float = 0.0  # Задержка ответа, сек
+    jitter: float = 0.0  # Случайная добавка к задержке, сек
+    rate_429: float = 0.0  # Доля ответов 429
+    retry_after: int = 1  # retry_after в ответах 429
+    rate_not_modified: float = 0.0  # Доля ответов 400 "message is not modified" на editMessageText
+    rate_5xx: float = 0.0  # Доля ответов 500/502
+    methods: List[str] = field(default_factory=list)  # Только эти методы (пусто - все, кроме управляющих)
+    dead_file_ids: List[str] = field(default_factory=list)  # file_id, на которые отвечать "wrong file identifier"
+
+
+class BotApiEmulator:
+    def __init__(self, faults: FaultConfig, seed: Optional[int] = None):
+        self.faults = faults
+        self.random = random.Random(seed)
+        self.update_id = 0
+        self._updates: Deque[dict] = deque()
+        self._new_updates = asyncio.Event()
+        self.webhook_url = ''
+        self.webhook_secret = ''
+        self.webhook_connections = 40
+        self._webhook_task: Optional[asyncio.Task] = None
+        # Бот начал получать апдейты (getUpdates или setWebhook): до этого пользователи не стартуют,
+        # иначе их апдейты сбросит deleteWebhook(drop_pending_updates=True) при запуске бота
+        self.bot_connected = asyncio.Event()
+        # (chat_id, message_id) -> сообщение бота или пользователя
+        self.messages: Dict[Tuple[int, int], dict] = {}
+        self.last_bot_message: Dict[int, dict] = {}
+        self._message_ids: Dict[int, int] = defaultdict(int)
+        # Ожидание ответа бота в чате: момент отправки апдейта и событие для виртуального пользователя
+        self._waiting_since: Dict[int, float] = {}
+        self._replied: Dict[int, asyncio.Event] = defaultdict(asyncio.Event)
+        self.calls: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.response_times: Deque[float] = deque(maxlen=100000)
+        self.users_done = 0
+        self.users_failed = 0
+
+    # --- Апдейты ---
+
+    def next_message_id(self, chat_id: int) -> int:
+        self._message_ids[chat_id] += 1
+        return self._message_ids[chat_id]
+
+    def push_update(self, update: dict) -> None:
+        self.update_id += 1
+        update['update_id'] = self.update_id
+        self._updates.append(update)
+        self._new_updates.set()
+
+    async def get_updates(self, offset: int = 0, limit: int = 100, timeout: int = 0) -> List[dict]:
+        # Как в Telegram: апдейты до offset считаются подтвержденными
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [self._updates[i] for i in range(min(limit or 100, len(self._updates)))]
+
+    async def _push_to_webhook(self) -> None:
+        semaphore = asyncio.Semaphore(self.webhook_connections)
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret} if self.webhook_secret else {}
+        async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+
+            async def deliver(update: dict) -> None:
+                async with semaphore:
+                    for _ in range(5):
+                        try:
+                            async with session.post(self.webhook_url, json=update, headers=headers) as resp:
+                                if resp.status < 500:
+                                    return
+                        except Exception:
+                            pass
+                        await asyncio.sleep(1)
+                    self.injected['webhook_undelivered'] += 1
+
+            tasks: Set[asyncio.Task] = set()
+            while True:
+                if not self._updates:
+                    self._new_updates.clear()
+                    await self._new_updates.wait()
+                    continue
+                task = asyncio.create_task(deliver(self._updates.popleft()))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    # --- Сообщения бота ---
+
+    def _chat(self, chat_id: int) -> dict:
+        if chat_id > 0:
+            return {'id': chat_id, 'type': 'private', 'first_name': f'User{chat_id}'}
+        return {'id': chat_id, 'type': 'supergroup', 'title': f'Chat{chat_id}'}
+
+    @staticmethod
+    def _inline_markup(markup: Any) -> Optional[dict]:
+        # В объекте Message Telegram возвращает только inline-клавиатуру
+        return markup if isinstance(markup, dict) and 'inline_keyboard' in markup else None
+
+    def _bot_message(self, chat_id: int, **content) -> dict:
+        content['reply_markup'] = self._inline_markup(content.get('reply_markup'))
+        message = {
+            'message_id': self.next_message_id(chat_id),
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Emulator', 'username': 'emulator_bot'},
+            **{key: value for key, value in content.items() if value is not None},
+        }
+        self.messages[(chat_id, message['message_id'])] = message
+        self.last_bot_message[chat_id] = message
+        self._bot_replied(chat_id)
+        return message
+
+    def _bot_replied(self, chat_id: int) -> None:
+        since = self._waiting_since.pop(chat_id, None)
+        if since is not None:
+            self.response_times.append(time.perf_counter() - since)
+            self._replied[chat_id].set()
+
+    def _check_file_id(self, file_id: Any) -> None:
+        if file_id in self.faults.dead_file_ids:
+            raise ApiError(400, 'Bad Request: wrong file identifier/HTTP URL specified')
+
+    # --- Методы Bot API ---
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        name = method.lower()
+        if name == 'getme':
+            return {'id': BOT_ID, 'is_bot': True, 'first_name': 'Emulator', 'username': 'emulator_bot',
+                    'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+        if name == 'getupdates':
+            self.bot_connected.set()
+            return await self.get_updates(params.get('offset', 0), params.get('limit', 100), params.get('timeout', 0))
+        if name == 'setwebhook':
+            self.webhook_url = params['url']
+            self.webhook_secret = params.get('secret_token', '')
+            self.webhook_connections = params.get('max_connections', 40)
+            if self._webhook_task is None:
+                self._webhook_task = asyncio.create_task(self._push_to_webhook())
+            self.bot_connected.set()
+            return True
+        if name == 'deletewebhook':
+            self.webhook_url = ''
+            if self._webhook_task is not None:
+                self._webhook_task.cancel()
+                self._webhook_task = None
+            if params.get('drop_pending_updates') in (True, 'true'):
+                self._updates.clear()
+            return True
+        if name == 'getwebhookinfo':
+            return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': len(self._updates)}
+        if name == 'sendmessage':
+            return self._bot_message(params['chat_id'], text=params.get('text'), reply_markup=params.get('reply_markup'))
+        if name == 'sendvideo':
+            file_id = params.get('video')
+            self._check_file_id(file_id)
+            video = {'file_id': str(file_id), 'file_unique_id': f'u{abs(hash(file_id))}',
+                     'width': 1280, 'height': 720, 'duration': 60}
+            return self._bot_message(params['chat_id'], video=video, caption=params.get('caption'),
+                                     reply_markup=params.get('reply_markup'))
+        if name == 'senddocument':
+            document = {'file_id': f'doc{self.update_id}', 'file_unique_id': f'udoc{self.update_id}'}
+            return self._bot_message(params['chat_id'], document=document, caption=params.get('caption'))
+        if name == 'editmessagetext':
+            chat_id, message_id = params['chat_id'], params['message_id']
+            message = self.messages.get((chat_id, message_id))
+            if message is None:
+                raise ApiError(400, 'Bad Request: message to edit not found')
+            if 'text' not in message:
+                raise ApiError(400, 'Bad Request: there is no text in the message to edit')
+            if (message['text'] == params.get('text')
+                    and message.get('reply_markup') == self._inline_markup(params.get('reply_markup'))):
+                raise ApiError(400, 'Bad Request: message is not modified: specified new message content '
+                                    'and reply markup are exactly the same as a current content and reply markup '
+                                    'of the message')
+            message['text'] = params.get('text')
+            message['reply_markup'] = self._inline_markup(params.get('reply_markup'))
+            message['edit_date'] = int(time.time())
+            self.last_bot_message[chat_id] = message
+            self._bot_replied(chat_id)
+            return {key: value for key, value in message.items() if value is not None}
+        if name == 'deletemessage':
+            if self.messages.pop((params['chat_id'], params['message_id']), None) is None:
+                raise ApiError(400, 'Bad Request: message to delete not found')
+            return True
+        if name == 'answercallbackquery':
+            return True
+        if name == 'getfile':
+            self._check_file_id(params.get('file_id'))
+            return {'file_id': params['file_id'], 'file_unique_id': f'u{abs(hash(params["file_id"]))}',
+                    'file_size': 1024, 'file_path': f'videos/{params["file_id"]}.mp4'}
+        raise ApiError(404, 'Not Found: method not found')
+
+    async def inject_faults(self, method: str) -> None:
+        faults = self.faults
+        name = method.lower()
+        if name in CONTROL_METHODS or (faults.methods and method not in faults.methods):
+            return
+        if faults.latency or faults.jitter:
+            await asyncio.sleep(faults.latency + self.random.random() * faults.jitter)
+        roll = self.random.random()
+        if roll < faults.rate_429:
+            self.injected['429'] += 1
+            raise ApiError(429, f'Too Many Requests: retry after {faults.retry_after}', faults.retry_after)
+        roll -= faults.rate_429
+        if roll < faults.rate_5xx:
+            self.injected['5xx'] += 1
+            raise ApiError(self.random.choice((500, 502)), 'Internal Server Error')
+        roll -= faults.rate_5xx
+        if name == 'editmessagetext' and roll < faults.rate_not_modified:
+            self.injected['not_modified'] += 1
+            raise ApiError(400, 'Bad Request: message is not modified: specified new message content '
+                                'and reply markup are exactly the same as a current content and reply markup '
+                                'of the message')
+
+    # --- HTTP ---
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == 'application/json':
+            raw = await request.json()
+        else:
+            raw = dict(await request.post())
+        params: Dict[str, Any] = {}
+        for key, value in raw.items():
+            if isinstance(value, str):
+                if key in INT_FIELDS and value.lstrip('-').isdigit():
+                    value = int(value)
+                elif value[:1] in ('{', '['):
+                    value = json.loads(value)
+            elif isinstance(value, web.FileField):
+                value = value.filename
+            params[key] = value
+        return params
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        try:
+            params = await self._read_params(request)
+            await self.inject_faults(method)
+            result = await self.call(method, params)
+        except ApiError as e:
+            return e.as_response()
+        except KeyError as e:
+            return ApiError(400, f'Bad Request: parameter {e} is required').as_response()
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_control(self, request: web.Request) -> web.Response:
+        if request.method == 'POST':
+            for key, value in (await request.json()).items():
+                if hasattr(self.faults, key):
+                    setattr(self.faults, key, value)
+        return web.json_response(asdict(self.faults))
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        times = sorted(self.response_times)
+        return {
+            'calls': dict(self.calls),
+            'injected': dict(self.injected),
+            'updates_pushed': self.update_id,
+            'updates_pending': len(self._updates),
+            'users_done': self.users_done,
+            'users_failed': self.users_failed,
+            'response_p50_ms': round(statistics.median(times) * 1000, 1) if times else None,
+            'response_p99_ms': round(times[int(len(times) * 0.99)] * 1000, 1) if times else None,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        app.router.add_get('/bot{token}/{method}', self.handle_method)
+        app.router.add_route('*', '/_control', self.handle_control)
+        app.router.add_get('/_stats', self.handle_stats)
+        return app
+
+    # --- Виртуальные пользователи ---
+
+    def user_message(self, user_id: int, text: str) -> dict:
+        message = {
+            'message_id': self.next_message_id(user_id),
+            'date': int(time.time()),
+            'chat': self._chat(user_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'message': message}
+
+    def user_callback(self, user_id: int, data: str) -> dict:
+        return {'callback_query': {
+            'id': f'{user_id}{self.update_id}',
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'},
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': self.last_bot_message[user_id],
+        }}
+
+    async def virtual_user(self, user_id: int, think: float, step_timeout: float) -> None:
+        steps = [
+            ('message', '/start'),
+            ('callback', 'menu_project'),
+            ('callback', 'back_to_menu'),
+            ('callback', 'menu_registration'),
+            ('message', f'Пользователь Нагрузочный {user_id}'),
+            ('message', f'+7999{user_id % 10000000:07d}'),
+            ('message', f'user{user_id}@example.com'),
+        ]
+        for kind, payload in steps:
+            replied = self._replied[user_id]
+            replied.clear()
+            self._waiting_since[user_id] = time.perf_counter()
+            if kind == 'message':
+                self.push_update(self.user_message(user_id, payload))
+            else:
+                self.push_update(self.user_callback(user_id, payload))
+            try:
+                await asyncio.wait_for(replied.wait(), timeout=step_timeout)
+            except asyncio.TimeoutError:
+                self._waiting_since.pop(user_id, None)
+                self.users_failed += 1
+                return
+            if think:
+                await asyncio.sleep(self.random.uniform(0, 2 * think))
+        self.users_done += 1
+
+    async def run_users(self, count: int, ramp: float, think: float, step_timeout: float,
+                        first_user_id: int = 100000) -> None:
+        tasks = []
+        for i in range(count):
+            tasks.append(asyncio.create_task(self.virtual_user(first_user_id + i, think, step_timeout)))
+            if ramp:
+                await asyncio.sleep(ramp / count)
+        await asyncio.gather(*tasks)
+        self._replied.clear()
+
+
+async def main(args: argparse.Namespace) -> None:
+    faults = FaultConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        rate_not_modified=args.rate_not_modified,
+        rate_5xx=args.rate_5xx,
+        methods=args.methods or [],
+        dead_file_ids=args.dead_file_ids or [],
+    )
+    emulator = BotApiEmulator(faults, seed=args.seed)
+    runner = web.AppRunner(emulator.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=args.host, port=args.port).start()
+    print(f'Эмулятор Bot API: http://{args.host}:{args.port} (TELEGRAM_API_URL для бота)')
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print(json.dumps(emulator.stats(), ensure_ascii=False))
+
+    reporter = asyncio.create_task(report())
+    try:
+        if args.users:
+            print('Ожидание подключения бота...')
+            await emulator.bot_connected.wait()
+            started = time.perf_counter()
+            await emulator.run_users(args.users, args.ramp, args.think, args.step_timeout)
+            elapsed = time.perf_counter() - started
+            print(f'Виртуальные пользователи завершили сценарий за {elapsed:.1f} с')
+            print(json.dumps(emulator.stats(), ensure_ascii=False, indent=2))
+        await asyncio.Event().wait()
+    finally:
+        reporter.cancel()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--users', type=int, default=0, help='виртуальных пользователей')
+    parser.add_argument('--ramp', type=float, default=0, help='за сколько секунд запустить всех пользователей')
+    parser.add_argument('--think', type=float, default=1.0, help='средняя пауза пользователя между шагами, сек')
+    parser.add_argument('--step-timeout', type=float, default=60, help='сколько ждать ответа бота на шаг, сек')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответов API, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, сек')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, сек')
+    parser.add_argument('--rate-not-modified', type=float, default=0.0,
+                        help='доля ответов "message is not modified" на editMessageText')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='доля ответов 5xx')
+    parser.add_argument('--methods', nargs='*', help='внедрять ошибки только в эти методы (sendMessage ...)')
+    parser.add_argument('--dead-file-ids', nargs='*', help='file_id, на которые отвечать "wrong file identifier"')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--report-interval', type=float, default=10, help='период вывода статистики, сек')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass